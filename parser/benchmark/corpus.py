@@ -0,0 +1,220 @@
+import enum
+import pathlib
+import random
+from typing import Type
+
+from parser.game.constants import (
+    AnimationType,
+    AudioSample,
+    BuildingKind,
+    Character,
+    CharacterType,
+    FIGUREN_COD,
+    Formation,
+    HAEUSER_COD,
+    InfrastructureLevel,
+    OreSize,
+    Resource,
+    Ruins,
+)
+from parser.io.cod import write_cod
+
+# all enums the loaders resolve identifiers against
+_ENUMS = (
+    Resource,
+    InfrastructureLevel,
+    BuildingKind,
+    AudioSample,
+    Ruins,
+    Character,
+    OreSize,
+    CharacterType,
+    Formation,
+    AnimationType,
+)
+
+
+def generate_haeuser(num_objects: int, seed: int = 0) -> str:
+    """
+    Generate a script resembling HAEUSER.COD with num_objects HAUS objects,
+    for HaeuserCodLoader. It covers variables (absolute, relative, and
+    redefined within objects), "@Nummer", relative properties, forward and
+    backward ObjFill, nested HAUS_PRODLIST objects, and enum references.
+    """
+    rng = random.Random(seed)
+    kinds = _member_names(BuildingKind)
+    resources = _member_names(Resource)
+    characters = _member_names(Character)
+    lines = [
+        "; generated HAEUSER.COD-like script",
+        "IDHAUS = 20000",
+        "GFXHAUS = 0",
+        "LAGER = 4",
+        "@LAGER = +1",
+        "",
+        "Objekt: HAUS",
+        "    @Nummer: 0",
+        "    Id: IDHAUS+0",
+        "    Gfx: GFXHAUS",
+        f"    Kind: {kinds[0]}",
+        "    Size: 1, 1",
+        "    Rotate: 1",
+        "    Baukost: 0",
+        "    ObjFill: 0,MAXHAUS",
+    ]
+    for i in range(1, num_objects):
+        lines.append("")
+        if i % 10 == 0:
+            lines.append(f"    GFXHAUS = GFXHAUS+{rng.randrange(50, 100)}")
+        lines += [
+            "    @Nummer: +1",
+            f"    Id: IDHAUS+{i}",
+        ]
+        if i % 10 == 0:
+            lines.append("    Gfx: GFXHAUS")
+        else:
+            lines.append(f"    @Gfx: +{rng.randrange(1, 9)}")
+        lines.append(f"    Kind: {rng.choice(kinds)}")
+        if rng.random() < 0.3:
+            lines.append(f"    Size: {rng.randrange(1, 5)}, {rng.randrange(1, 5)}")
+        if rng.random() < 0.2:
+            lines.append(f"    @Baukost: +{rng.randrange(1, 100)}")
+        if rng.random() < 0.1:
+            lines.append(f"    ObjFill: {rng.randrange(i)}")
+        if rng.random() < 0.4:
+            for _ in range(rng.randrange(1, 3)):
+                lines += [
+                    "    Objekt: HAUS_PRODLIST",
+                    f"        Ware: {rng.choice(resources)}",
+                    f"        Rohstoff: {rng.choice(resources)}",
+                    "        Maxlager: LAGER",
+                    f"        Figurnr: {rng.choice(characters)}",
+                    f"        Interval: {rng.randrange(10, 500)}, {rng.random():.2f}",
+                    "    EndObj;",
+                ]
+    lines.append("EndObj;")
+
+    lines += ["", "Objekt: BAUINFRA"]
+    for name in _member_names(InfrastructureLevel):
+        lines += [
+            f"    Nummer: {name}",
+            f"    BGruppe: {rng.randrange(4)}",
+            f"    Minwohn: {rng.randrange(0, 2000, 25)}",
+        ]
+    lines.append("EndObj;")
+    return "\n".join(lines) + "\n"
+
+
+def generate_figuren(num_objects: int, seed: int = 0) -> str:
+    """
+    Generate a script resembling FIGUREN.COD with num_objects FIGUR objects,
+    for FigurenCodLoader. Figures are numbered by Character (and by integers
+    once all characters are used), and each has a family of ANIM objects.
+    """
+    rng = random.Random(seed)
+    characters = _member_names(Character)
+    character_types = _member_names(CharacterType)
+    animation_types = _member_names(AnimationType)
+    lines = ["; generated FIGUREN.COD-like script", "GFXFIGUR = 0", "", "Objekt: FIGUR"]
+    for i in range(num_objects):
+        number = characters[i] if i < len(characters) else str(1000 + i)
+        lines += [
+            f"    Nummer: {number}",
+            f"    Id: {i}",
+            "    Gfx: GFXFIGUR",
+            f"    Kind: {rng.choice(character_types)}",
+            f"    Rotate: {rng.choice((1, 4, 8))}",
+        ]
+        if i == 0:
+            lines += ["    Speedtyp: 0", "    ObjFill: 0,MAXFIGUR"]
+        lines.append("    Objekt: ANIM")
+        for j in range(rng.randrange(1, 5)):
+            if j == 0:
+                lines += [
+                    "        Nummer: 0",
+                    "        AnimOffs: 0",
+                    f"        AnimAnz: {rng.randrange(1, 16)}",
+                    f"        AnimSpeed: {rng.randrange(50, 200)}",
+                    f"        Kind: {rng.choice(animation_types)}",
+                    "        ObjFill: 0,MAXANIM",
+                ]
+            else:
+                lines += [
+                    "        @Nummer: +1",
+                    f"        @AnimOffs: +{rng.randrange(1, 16)}",
+                ]
+        lines += ["    EndObj;", f"    GFXFIGUR = GFXFIGUR+{rng.randrange(8, 64)}"]
+    lines.append("EndObj;")
+    return "\n".join(lines) + "\n"
+
+
+def generate_gad(num_objects: int, seed: int = 0) -> str:
+    """
+    Generate a script resembling a GAD file (interface layouts) with
+    num_objects GADGET objects, for CodGadLoader.
+    """
+    rng = random.Random(seed)
+    lines = [
+        "; generated GAD-like script",
+        "POSX = 10",
+        "POSY = 20",
+        "",
+        "Objekt: GADGET",
+    ]
+    for i in range(num_objects):
+        lines += [
+            f"    Nummer: {i}",
+            f"    Id: {30000 + i}",
+        ]
+        if i == 0:
+            lines += [
+                "    Pos: POSX, POSY",
+                "    Size: 32, 32",
+                "    ObjFill: 0,MAXGADGET",
+            ]
+        else:
+            lines += [
+                f"    Pos: {rng.randrange(0, 640)}, {rng.randrange(0, 480)}",
+                f"    Gfx: {rng.randrange(0, 500)}",
+            ]
+        if rng.random() < 0.2:
+            lines += [
+                "    Objekt: TEXT",
+                f"        Font: {rng.randrange(4)}",
+                f"        Posoffs: {rng.randrange(-8, 8)}, {rng.randrange(-8, 8)}",
+                "    EndObj;",
+            ]
+    lines.append("EndObj;")
+    return "\n".join(lines) + "\n"
+
+
+def write_corpus(
+    directory: pathlib.Path, num_objects: int, num_gad_files: int = 10, seed: int = 0
+) -> list[pathlib.Path]:
+    """
+    Write a synthetic install to a directory: HAEUSER.COD and FIGUREN.COD
+    (encoded), and GAD files in a "Gaddata" subdirectory, all with
+    num_objects numbered objects. Return the paths of the files.
+    """
+    paths = [directory / HAEUSER_COD.upper(), directory / FIGUREN_COD.upper()]
+    write_cod(paths[0], generate_haeuser(num_objects, seed))
+    write_cod(paths[1], generate_figuren(num_objects, seed))
+    gad_dir = directory / "Gaddata"
+    gad_dir.mkdir(parents=True, exist_ok=True)
+    for i in range(num_gad_files):
+        path = gad_dir / f"GEN{i:03}.GAD"
+        path.write_text(generate_gad(num_objects, seed + i), encoding="cp1252")
+        paths.append(path)
+    return paths
+
+
+def _member_names(enum_cls: Type[enum.IntEnum]) -> list[str]:
+    """
+    Names of the members of an enum which are not members of any other enum
+    as well, so that they resolve to the same member in any loader.
+    """
+    others = set()
+    for other in _ENUMS:
+        if other is not enum_cls:
+            others.update(other.__members__)
+    return [name for name in enum_cls.__members__ if name not in others]
@@ -0,0 +1,228 @@
+import argparse
+import gc
+import math
+import pathlib
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Callable, Sequence
+from typing import Any, NamedTuple, Optional
+
+from parser.benchmark.corpus import write_corpus
+from parser.io.cod import read_cod
+from parser.io.script.loader import CodGadLoader, FigurenCodLoader, HaeuserCodLoader
+
+# phases of interpreting a script file, timed separately
+READ_COD = "read_cod"
+PARSE = "parse"
+INTERPRET = "interpret"
+PHASES = (READ_COD, PARSE, INTERPRET)
+
+# phases whose time grows faster than size**SUPERLINEAR_EXPONENT are flagged
+SUPERLINEAR_EXPONENT = 1.15
+
+DEFAULT_SCALES = (100, 200, 400)
+
+
+class PhaseResult(NamedTuple):
+    phase: str
+    # number of numbered objects per generated file
+    scale: int
+    # size of the input of the phase, summed over all files
+    bytes: int
+    lines: int
+    # best time out of all repeats
+    seconds: float
+    # peak of memory allocated during the phase, over all files
+    peak_bytes: int
+
+    @property
+    def mb_per_second(self) -> float:
+        return self.bytes / self.seconds / 1e6
+
+    @property
+    def lines_per_second(self) -> float:
+        return self.lines / self.seconds
+
+
+def run_suite(
+    scales: Sequence[int] = DEFAULT_SCALES,
+    repeat: int = 3,
+    num_gad_files: int = 2,
+    seed: int = 0,
+) -> list[PhaseResult]:
+    """
+    Benchmark interpreting a synthetic install (see `write_corpus`) at
+    several scales. For each scale, the phases of interpreting its files are
+    timed separately: decoding COD files (`read_cod`), parsing scripts
+    (`CodGadLoader.parse`) and interpreting parse trees
+    (`ScriptInterpreter.visit`). Times are the best of `repeat` runs, with
+    garbage collection disabled. Peak memory is measured in a separate run,
+    since tracing allocations slows down every phase.
+
+    :param scales: numbers of numbered objects per generated file
+    :param repeat: number of timed runs per phase
+    :param num_gad_files: number of GAD files per scale
+    :param seed: seed of the generated scripts
+    """
+    loaders = {
+        "HAEUSER.COD": HaeuserCodLoader(),
+        "FIGUREN.COD": FigurenCodLoader(),
+    }
+    gad_loader = CodGadLoader()
+    results = []
+    for scale in scales:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            paths = write_corpus(pathlib.Path(tmp_dir), scale, num_gad_files, seed)
+            cod_paths = [path for path in paths if path.suffix == ".COD"]
+            scripts = [
+                (
+                    loaders.get(path.name, gad_loader),
+                    read_cod(path) if path in cod_paths else path.read_text("cp1252"),
+                )
+                for path in paths
+            ]
+            cod_scripts = [script for _, script in scripts[: len(cod_paths)]]
+            trees = [(loader, loader.parse(script)) for loader, script in scripts]
+
+            phases = [
+                (READ_COD, cod_scripts, [lambda p=p: read_cod(p) for p in cod_paths]),
+                (
+                    PARSE,
+                    [script for _, script in scripts],
+                    [lambda l=l, s=s: l.parse(s) for l, s in scripts],
+                ),
+                (
+                    INTERPRET,
+                    [script for _, script in scripts],
+                    [
+                        lambda l=l, t=t: l._create_interpreter().visit(t)
+                        for l, t in trees
+                    ],
+                ),
+            ]
+            for phase, inputs, runs in phases:
+                results.append(
+                    PhaseResult(
+                        phase,
+                        scale,
+                        sum(len(script.encode("cp1252")) for script in inputs),
+                        sum(script.count("\n") for script in inputs),
+                        min(_time(runs) for _ in range(repeat)),
+                        _peak_memory(runs),
+                    )
+                )
+    return results
+
+
+def scaling_exponents(results: Sequence[PhaseResult]) -> dict[str, float]:
+    """
+    Estimate how the time of each phase grows with the size of its input, as
+    the slope of a least-squares fit of log(seconds) over log(bytes): 1 is
+    linear, 2 quadratic. Phases need results at two or more scales.
+    """
+    exponents = {}
+    for phase in dict.fromkeys(result.phase for result in results):
+        points = [
+            (math.log(result.bytes), math.log(result.seconds))
+            for result in results
+            if result.phase == phase and result.bytes and result.seconds
+        ]
+        if len(points) < 2:
+            continue
+        mean_x = sum(x for x, _ in points) / len(points)
+        mean_y = sum(y for _, y in points) / len(points)
+        var_x = sum((x - mean_x) ** 2 for x, _ in points)
+        if not var_x:
+            continue
+        cov = sum((x - mean_x) * (y - mean_y) for x, y in points)
+        exponents[phase] = cov / var_x
+    return exponents
+
+
+def format_report(results: Sequence[PhaseResult]) -> str:
+    """
+    Format benchmark results as a table, followed by the scaling exponent of
+    each phase. Phases scaling superlinearly are flagged.
+    """
+    lines = [
+        f"{'phase':<10} {'scale':>6} {'MB':>7} {'lines':>8} {'seconds':>9} "
+        f"{'MB/s':>7} {'lines/s':>9} {'peak MB':>8}"
+    ]
+    for r in results:
+        lines.append(
+            f"{r.phase:<10} {r.scale:>6} {r.bytes / 1e6:>7.2f} {r.lines:>8} "
+            f"{r.seconds:>9.4f} {r.mb_per_second:>7.2f} "
+            f"{r.lines_per_second:>9.0f} {r.peak_bytes / 1e6:>8.2f}"
+        )
+    exponents = scaling_exponents(results)
+    if exponents:
+        lines.append("")
+        lines.append("scaling exponents (time ~ size**k):")
+        for phase, exponent in exponents.items():
+            flag = "  SUPERLINEAR" if exponent > SUPERLINEAR_EXPONENT else ""
+            lines.append(f"  {phase:<10} k = {exponent:.2f}{flag}")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    arg_parser = argparse.ArgumentParser(
+        prog="python -m parser.benchmark",
+        description="Benchmark interpreting a synthetic 1602 install.",
+    )
+    arg_parser.add_argument(
+        "--scales",
+        type=int,
+        nargs="+",
+        default=list(DEFAULT_SCALES),
+        help="numbers of numbered objects per generated file",
+    )
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    arg_parser.add_argument("--gad-files", type=int, default=2)
+    arg_parser.add_argument("--seed", type=int, default=0)
+    args = arg_parser.parse_args(argv)
+
+    results = run_suite(args.scales, args.repeat, args.gad_files, args.seed)
+    print(format_report(results))
+    exponents = scaling_exponents(results)
+    superlinear = any(k > SUPERLINEAR_EXPONENT for k in exponents.values())
+    return 1 if superlinear else 0
+
+
+def _time(runs: list[Callable[[], Any]]) -> float:
+    # like timeit, disable garbage collection while timing, whose cost would
+    # otherwise depend on all objects alive, such as the parse trees of all
+    # files
+    gc.collect()
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        for run in runs:
+            run()
+        return time.perf_counter() - start
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def _peak_memory(runs: list[Callable[[], Any]]) -> int:
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    try:
+        peak = 0
+        for run in runs:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            run()
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - baseline)
+        return peak
+    finally:
+        if not tracing:
+            tracemalloc.stop()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
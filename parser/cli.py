@@ -0,0 +1,210 @@
+import argparse
+import concurrent.futures
+import json
+import os
+import pathlib
+import sys
+from collections.abc import Iterator, Sequence
+from typing import Any, Optional, TextIO
+
+from parser.io.dataset import DEFAULT_LOADERS, LoaderFactory, init_worker, load_file
+from parser.io.export import ScriptEncoder
+
+# output formats
+# one JSON document per file
+JSON = "json"
+# one line per numbered object (and per other top-level item)
+NDJSON = "ndjson"
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """
+    Convert script files (or all files of an install) to JSON or NDJSON.
+    Returns the exit status: 0 if all files were converted, 1 otherwise.
+    """
+    arg_parser = argparse.ArgumentParser(
+        prog="python -m parser",
+        description="Interpret 1602 script files and convert them to JSON.",
+    )
+    arg_parser.add_argument(
+        "paths",
+        type=pathlib.Path,
+        nargs="+",
+        help="script files (labeled by their name), or directories to search "
+        "for script files, such as an install (labeled by their relative path)",
+    )
+    arg_parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="number of files converted in parallel (default: number of CPUs)",
+    )
+    arg_parser.add_argument(
+        "-f",
+        "--format",
+        choices=(JSON, NDJSON),
+        default=JSON,
+        help="JSON: one document, mapping paths to scripts (one file per "
+        "script with --output); NDJSON: one line per numbered object",
+    )
+    arg_parser.add_argument(
+        "-o",
+        "--output",
+        type=pathlib.Path,
+        help="directory to write one file per script to, instead of stdout",
+    )
+    arg_parser.add_argument(
+        "--enum-values",
+        action="store_true",
+        help="write enum members as their values instead of their names",
+    )
+    args = arg_parser.parse_args(argv)
+    if args.jobs < 1:
+        arg_parser.error("--jobs must be at least 1")
+
+    routing_loaders = [factory() for factory in DEFAULT_LOADERS]
+    files = []
+    failed = False
+    for path, label, explicit in _find_files(args.paths):
+        for i, loader in enumerate(routing_loaders):
+            if loader.accepts(path):
+                files.append((i, path, label))
+                break
+        else:
+            # files in directories are skipped unless some loader accepts them
+            if explicit:
+                print(f"{label}: no loader accepts this file", file=sys.stderr)
+                failed = True
+
+    convert = _Converter(args.format, not args.enum_values, args.output)
+    if args.output is not None:
+        args.output.mkdir(parents=True, exist_ok=True)
+    out = (
+        _JSONStream(sys.stdout) if args.output is None and args.format == JSON else None
+    )
+    results = _run(files, convert, args.jobs, DEFAULT_LOADERS)
+    try:
+        for label, result in results:
+            if isinstance(result, BaseException):
+                print(f"{label}: {result}", file=sys.stderr)
+                failed = True
+            elif out is not None:
+                out.write(label, result)
+            elif result is not None:
+                sys.stdout.write(result)
+        if out is not None:
+            out.close()
+        sys.stdout.flush()
+    except BrokenPipeError:
+        # e.g. piped into head, stop converting
+        results.close()
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+    return 1 if failed else 0
+
+
+class _Converter:
+    """
+    Interprets a file with one of the loaders of the current process (see
+    `dataset.init_worker`) and encodes it. Picklable, so that it can be run
+    in worker processes.
+    """
+
+    def __init__(self, fmt: str, enum_names: bool, output_dir: Optional[pathlib.Path]):
+        self.fmt = fmt
+        self.enum_names = enum_names
+        self.output_dir = output_dir
+
+    def __call__(
+        self, loader_index: int, path: pathlib.Path, label: str
+    ) -> Optional[str]:
+        """
+        Return the encoded file, or write it to the output directory and
+        return None.
+        """
+        obj = load_file(loader_index, path)
+        encoder = ScriptEncoder(self.enum_names)
+        if self.fmt == NDJSON:
+            text = "".join(line + "\n" for line in encoder.iter_lines(obj, label))
+        else:
+            text = encoder.encode(obj)
+            if self.output_dir is not None:
+                text += "\n"
+        if self.output_dir is None:
+            return text
+        out_path = self.output_dir / f"{label}.{self.fmt}"
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        out_path.write_text(text, encoding="utf8")
+        return None
+
+
+class _JSONStream:
+    """
+    Writes a JSON object mapping paths to encoded scripts, one script at a
+    time as they are converted.
+    """
+
+    def __init__(self, f: TextIO):
+        self.f = f
+        self.empty = True
+
+    def write(self, label: str, encoded: str) -> None:
+        self.f.write("{\n" if self.empty else ",\n")
+        self.f.write(f"{json.dumps(label, ensure_ascii=False)}:{encoded}")
+        self.empty = False
+
+    def close(self) -> None:
+        self.f.write("{}\n" if self.empty else "\n}\n")
+
+
+def _find_files(
+    paths: Sequence[pathlib.Path],
+) -> Iterator[tuple[pathlib.Path, str, bool]]:
+    """
+    Yield files, their labels, and whether they were given explicitly. Files
+    in directories are labeled by their path relative to the directory,
+    other files by their name.
+    """
+    for path in paths:
+        if path.is_dir():
+            for file_path in sorted(path.rglob("*")):
+                if file_path.is_file():
+                    yield file_path, file_path.relative_to(path).as_posix(), False
+        else:
+            yield path, path.name, True
+
+
+def _run(
+    files: list[tuple[int, pathlib.Path, str]],
+    convert: _Converter,
+    jobs: int,
+    loaders: Sequence[LoaderFactory],
+) -> Iterator[tuple[str, Any]]:
+    """
+    Convert files, yield their labels and results (or exceptions) in the
+    order in which they finish.
+    """
+    if jobs == 1 or len(files) <= 1:
+        init_worker(tuple(loaders))
+        for loader_index, path, label in files:
+            try:
+                yield label, convert(loader_index, path, label)
+            except Exception as e:
+                yield label, e
+        return
+
+    executor = concurrent.futures.ProcessPoolExecutor(
+        max_workers=jobs, initializer=init_worker, initargs=(tuple(loaders),)
+    )
+    try:
+        futures = {
+            executor.submit(convert, loader_index, path, label): label
+            for loader_index, path, label in files
+        }
+        for future in concurrent.futures.as_completed(futures):
+            error = future.exception()
+            yield futures[future], future.result() if error is None else error
+    finally:
+        # files not started yet are dropped if iteration stops early
+        executor.shutdown(cancel_futures=True)
@@ -1,4 +1,6 @@
 import enum
+import threading
+from typing import Type
 
 # script filenames
 FIGUREN_COD = "figuren.cod"
@@ -7,10 +9,12 @@ HAEUSER_COD = "haeuser.cod"
 # This section contains enums and constants referenced in the HAEUSER.COD and
 # FIGUREN.COD script files.
 
-# original game files refer to these as "Ware"
-Resource = enum.IntEnum(
-    "Resource",
-    [
+# Members of the enums of this module, by enum name. Each enum is created on
+# first access (see __getattr__), since creating all of them takes longer than
+# importing the rest of the package up to the point of parsing.
+_ENUM_MEMBERS = {
+    # original game files refer to these as "Ware"
+    "Resource": [
         "NOWARE",
         "ALLWARE",
         "EISENERZ",
@@ -50,12 +54,8 @@ Resource = enum.IntEnum(
         "WILD",
         "FISCHE",
     ],
-)
-
-# original game files refer to these as "Bauinfra"
-InfrastructureLevel = enum.IntEnum(
-    "InfrastructureLevel",
-    [
+    # original game files refer to these as "Bauinfra"
+    "InfrastructureLevel": [
         "INFRA_NIX",
         "INFRA_MARKT",
         "INFRA_KAPELLE",
@@ -90,12 +90,8 @@ InfrastructureLevel = enum.IntEnum(
         "INFRA_STUFE_5A",
         "INFRA_STUFE_5B",
     ],
-)
-
-# original game files refer to these as "Kind"
-BuildingKind = enum.IntEnum(
-    "BuildingKind",
-    [
+    # original game files refer to these as "Kind"
+    "BuildingKind": [
         "UNUSED",
         "BADEHAUS",
         "BERGWERK",
@@ -163,12 +159,8 @@ BuildingKind = enum.IntEnum(
         "WMUEHLE",
         "WOHNUNG",
     ],
-)
-
-# original game files refer to these as "Bausample"
-AudioSample = enum.IntEnum(
-    "AudioSample",
-    [
+    # original game files refer to these as "Bausample"
+    "AudioSample": [
         "WAV_NIX",
         "WAV_SHOTKAN1",
         "WAV_SHOTKAN2",
@@ -262,12 +254,8 @@ AudioSample = enum.IntEnum(
         "WAV_SHIPMOVE3",
         "WAV_SHIPMOVE4",
     ],
-)
-
-# original game files refer to these as "Ruinenr"
-Ruins = enum.IntEnum(
-    "Ruins",
-    [
+    # original game files refer to these as "Ruinenr"
+    "Ruins": [
         "NORUINE",
         "RUINE_FELD",
         "RUINE_HOLZ",
@@ -280,13 +268,9 @@ Ruins = enum.IntEnum(
         "RUINE_ROAD_STEIN",
         "RUINE_STEIN",
     ],
-)
-
-# original game files refer to these as "Figurnr", "Rauchfignr", "Hitfignr", and more
-
-Character = enum.IntEnum(
-    "Character",
-    [
+    # original game files refer to these as "Figurnr", "Rauchfignr", "Hitfignr",
+    # and more
+    "Character": [
         "UNUSED",
         # SOLDAT.BSH
         "SOLDAT1",
@@ -407,14 +391,10 @@ Character = enum.IntEnum(
         "VOGELSND",
         "STRANDSND",
     ],
-)
-# original game files refer to these as "Rauchfignr"
-OreSize = enum.IntEnum("OreSize", ["ERZBERG_GROSS", "ERZBERG_KLEIN"])
-
-# original game files refer to these as "Kind" (in FIGUREN.COD)
-CharacterType = enum.IntEnum(
-    "CharacterType",
-    [
+    # original game files refer to these as "Rauchfignr"
+    "OreSize": ["ERZBERG_GROSS", "ERZBERG_KLEIN"],
+    # original game files refer to these as "Kind" (in FIGUREN.COD)
+    "CharacterType": [
         "UNUSED",
         "FIGTYP_KANONIER",
         "FIGTYP_KANONTURM",
@@ -423,19 +403,19 @@ CharacterType = enum.IntEnum(
         "FIGTYP_PIRATSHIP",
         "FIGTYP_SCHWERT",
     ],
-)
-
-# military formations
-Formation = enum.IntEnum(
-    "Formation",
-    ["FORM_HORI", "FORM_VERT", "FORM_QUAD", "FORM_DIA1", "FORM_DIA2", "FORM_PFEIL"],
-)
-
-# original game files refer to these as "Kind"
-# "TIMENEVER" is used for the "AnimTime" property
-AnimationType = enum.IntEnum(
-    "AnimationType", ["TIMENEVER", "ENDLESS", "JUMPTO", "RANDOM"]
-)
+    # military formations
+    "Formation": [
+        "FORM_HORI",
+        "FORM_VERT",
+        "FORM_QUAD",
+        "FORM_DIA1",
+        "FORM_DIA2",
+        "FORM_PFEIL",
+    ],
+    # original game files refer to these as "Kind"
+    # "TIMENEVER" is used for the "AnimTime" property
+    "AnimationType": ["TIMENEVER", "ENDLESS", "JUMPTO", "RANDOM"],
+}
 
 NOOBJEKT = "NOOBJEKT"
 MAXPRODCNT = "MAXPRODCNT"
@@ -447,3 +427,25 @@ RADIUS_MARKT = "RADIUS_MARKT"
 # Number of rotated perspectives available for an object. HAEUSER mostly have
 # 1 or 4, FIGUREN mostly have 8.
 PROPERTY_NUM_ROTATIONS = "Rotate"
+
+_enums_lock = threading.Lock()
+
+
+def __getattr__(name: str) -> Type[enum.IntEnum]:
+    """
+    Create the enum with the given name, e.g. Resource or Character.
+    """
+    members = _ENUM_MEMBERS.get(name)
+    if members is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    with _enums_lock:
+        # another thread may have created the enum in the meantime, and each
+        # enum must only exist once
+        enum_cls = globals().get(name)
+        if enum_cls is None:
+            enum_cls = globals()[name] = enum.IntEnum(name, members, module=__name__)
+    return enum_cls
+
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(_ENUM_MEMBERS))
@@ -0,0 +1,116 @@
+import asyncio
+import concurrent.futures
+import os
+import pathlib
+from collections.abc import AsyncIterator, Iterable, Sequence
+from typing import Any, Optional
+
+from parser.io.dataset import (
+    DEFAULT_LOADERS,
+    LoaderFactory,
+    init_worker,
+    load_file,
+)
+
+
+class AsyncScriptLoader:
+    """
+    asyncio front-end for interpreting script files.
+
+    Files are read, decoded and interpreted on a pool of worker processes
+    (like in GameDataSet), so the event loop never blocks on them. Files are
+    routed to the first loader accepting them. At most `max_concurrency`
+    files are handed to the pool at a time; others wait in the event loop,
+    so cancelling them drops them without any work done. Cancelling a file
+    that was handed to the pool but has not started yet cancels it there as
+    well.
+    """
+
+    def __init__(
+        self,
+        loaders: Sequence[LoaderFactory] = DEFAULT_LOADERS,
+        max_workers: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+    ):
+        """
+        :param loaders: factories of loaders to route files to, in order of
+                        precedence
+        :param max_workers: number of worker processes, defaults to the number
+                            of CPUs
+        :param max_concurrency: number of files handed to the pool at a time,
+                                defaults to the number of workers
+        """
+        self._routing_loaders = [factory() for factory in loaders]
+        max_workers = max_workers or os.cpu_count() or 1
+        self._executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=max_workers,
+            initializer=init_worker,
+            initargs=(tuple(loaders),),
+        )
+        self._semaphore = asyncio.Semaphore(max_concurrency or max_workers)
+
+    async def aparse_interpret(self, path: pathlib.Path) -> Any:
+        """
+        Interpret a script file, like `CodGadLoader.parse_interpret`.
+        """
+        loader_index = self._route(path)
+        async with self._semaphore:
+            future = self._executor.submit(load_file, loader_index, path)
+            try:
+                return await asyncio.wrap_future(future)
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+
+    async def gather(self, paths: Iterable[pathlib.Path]) -> dict[pathlib.Path, Any]:
+        """
+        Interpret several script files, return the interpreted scripts by
+        path. If any file fails, the others are cancelled.
+        """
+        return {path: obj async for path, obj in self.as_completed(paths)}
+
+    async def as_completed(
+        self, paths: Iterable[pathlib.Path]
+    ) -> AsyncIterator[tuple[pathlib.Path, Any]]:
+        """
+        Interpret several script files, yield paths and interpreted scripts
+        in the order in which they finish. Raises the exception of the first
+        failed file. Files not finished yet are cancelled once iteration
+        stops.
+        """
+        tasks = {
+            asyncio.ensure_future(self.aparse_interpret(path)): path for path in paths
+        }
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    yield tasks[task], task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.wait(pending)
+
+    async def aclose(self) -> None:
+        """
+        Shut down the worker processes, cancelling files not started yet.
+        """
+        await asyncio.get_running_loop().run_in_executor(
+            None, lambda: self._executor.shutdown(cancel_futures=True)
+        )
+
+    async def __aenter__(self) -> "AsyncScriptLoader":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    def _route(self, path: pathlib.Path) -> int:
+        for i, loader in enumerate(self._routing_loaders):
+            if loader.accepts(path):
+                return i
+        raise ValueError(f"No loader accepts '{path}'.")
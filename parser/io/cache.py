@@ -0,0 +1,25 @@
+import os
+import pathlib
+
+# environment variable to override the location of on-disk caches
+CACHE_DIR_ENV_VAR = "ANNO1602_PARSER_CACHE_DIR"
+
+
+def get_cache_dir() -> pathlib.Path:
+    """
+    Return the directory for on-disk caches (compiled parsers, parse results),
+    creating it if necessary. Defaults to a subdirectory of $XDG_CACHE_HOME
+    (or ~/.cache), and can be overridden with $ANNO1602_PARSER_CACHE_DIR.
+    """
+    if env_dir := os.environ.get(CACHE_DIR_ENV_VAR):
+        cache_dir = pathlib.Path(env_dir)
+    else:
+        xdg_cache_home = os.environ.get("XDG_CACHE_HOME")
+        base_dir = (
+            pathlib.Path(xdg_cache_home)
+            if xdg_cache_home
+            else pathlib.Path.home() / ".cache"
+        )
+        cache_dir = base_dir / "anno1602-script-parser"
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    return cache_dir
@@ -1,15 +1,157 @@
+import mmap
+import os
 import pathlib
+from typing import TYPE_CHECKING, BinaryIO, Iterator
 
-import numpy as np
+if TYPE_CHECKING:
+    import numpy as np
+
+# COD files store each byte of a script negated (modulo 256)
+_DECODE_TABLE = bytes((256 - b) & 0xFF for b in range(256))
+ENCODED_NEWLINE = "\n".encode("cp1252").translate(_DECODE_TABLE)
+
+# size of the chunks `iter_cod` decodes at once
+DEFAULT_CHUNK_SIZE = 1 << 20
 
 
 def read_cod(path: pathlib.Path) -> str:
     """
     Read a COD binary file and return its contents as a string.
+
+    The file is mapped copy-on-write and decoded in place, so besides the
+    returned string, decoding only needs memory for one copy of the file.
     """
+    # NumPy is imported on first use, so that importing this module is cheap
+    import numpy as np
+
     with path.open("rb") as f:
-        cod_bytes = f.read()
-    cod_uint16 = np.frombuffer(cod_bytes, count=len(cod_bytes) // 2, dtype=np.uint16)
-    cod_uint16_decode = 256 - cod_uint16
-    cod_str = cod_uint16_decode.tobytes().decode("cp1252", errors="ignore")
+        if _is_empty(f):
+            return ""
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY) as mm:
+            cod_uint8 = np.frombuffer(mm, dtype=np.uint8)
+            np.negative(cod_uint8, out=cod_uint8)
+            # release the buffer before the map is closed
+            del cod_uint8
+            cod_str = str(mm, "cp1252", errors="ignore")
     return cod_str
+
+
+def read_script(path: pathlib.Path) -> str:
+    """
+    Read a script file, decoding COD files.
+    """
+    if path.suffix.lower() == ".cod":
+        return read_cod(path)
+    return path.read_text(encoding="cp1252")
+
+
+def decode_cod(cod_bytes: bytes) -> str:
+    """
+    Decode the contents of a COD file held in memory.
+    """
+    return cod_bytes.translate(_DECODE_TABLE).decode("cp1252", errors="ignore")
+
+
+def encode_cod(script: str) -> bytes:
+    """
+    Inverse of `decode_cod`.
+    """
+    return script.encode("cp1252").translate(_DECODE_TABLE)
+
+
+def write_cod(path: pathlib.Path, script: str) -> None:
+    """
+    Write a script to a COD binary file, applying the inverse of `read_cod`.
+    """
+    path.write_bytes(encode_cod(script))
+
+
+def iter_cod(path: pathlib.Path, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[str]:
+    """
+    Decode a COD binary file chunk by chunk. Chunks end at line boundaries
+    (lines longer than chunk_size are never split), so each one is a
+    sequence of complete lines, except for a last line without line break.
+    Memory use is bounded by the chunk size, not by the size of the file.
+    """
+    with path.open("rb") as f:
+        if _is_empty(f):
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            size = len(mm)
+            start = 0
+            while start < size:
+                end = min(start + chunk_size, size)
+                if end < size:
+                    # end the chunk after the last line break in it, or after
+                    # the first one following it
+                    newline = mm.rfind(ENCODED_NEWLINE, start, end)
+                    if newline == -1:
+                        newline = mm.find(ENCODED_NEWLINE, end)
+                    end = size if newline == -1 else newline + 1
+                yield decode_cod(mm[start:end])
+                start = end
+
+
+class LineIndex:
+    """
+    Maps between byte offsets in a COD file and the (1-based) line and
+    column numbers of the decoded script, as reported in parse errors by
+    lark and ScriptInterpreter. Columns count bytes, which only differs from
+    the decoded script on lines with bytes cp1252 leaves undefined.
+    """
+
+    def __init__(self, line_starts: "np.ndarray", size: int):
+        """
+        :param line_starts: byte offset of the first byte of each line
+        :param size: size of the file in bytes
+        """
+        self.line_starts = line_starts
+        self.size = size
+
+    @classmethod
+    def from_cod(
+        cls, path: pathlib.Path, chunk_size: int = DEFAULT_CHUNK_SIZE
+    ) -> "LineIndex":
+        """
+        Index the lines of a COD binary file, reading it in chunks.
+        """
+        import numpy as np
+
+        line_starts = [np.zeros(1, dtype=np.int64)]
+        with path.open("rb") as f:
+            if _is_empty(f):
+                return cls(line_starts[0], 0)
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                size = len(mm)
+                for start in range(0, size, chunk_size):
+                    chunk = np.frombuffer(mm[start : start + chunk_size], np.uint8)
+                    newlines = np.flatnonzero(chunk == ENCODED_NEWLINE[0])
+                    line_starts.append(newlines + (start + 1))
+        return cls(np.concatenate(line_starts), size)
+
+    def __len__(self) -> int:
+        return len(self.line_starts)
+
+    def line_column(self, offset: int) -> tuple[int, int]:
+        """
+        Return line and column of the byte at an offset.
+        """
+        import numpy as np
+
+        if not 0 <= offset <= self.size:
+            raise IndexError(f"Offset {offset} is outside of the file.")
+        line = int(np.searchsorted(self.line_starts, offset, side="right"))
+        return line, offset - int(self.line_starts[line - 1]) + 1
+
+    def offset(self, line: int, column: int = 1) -> int:
+        """
+        Return the byte offset of a line and column.
+        """
+        if not 1 <= line <= len(self.line_starts):
+            raise IndexError(f"Line {line} is outside of the file.")
+        return int(self.line_starts[line - 1]) + column - 1
+
+
+def _is_empty(f: BinaryIO) -> bool:
+    # empty files cannot be mapped
+    return os.fstat(f.fileno()).st_size == 0
@@ -0,0 +1,257 @@
+import enum
+from collections.abc import Mapping
+from typing import TYPE_CHECKING, Any, Optional, Type
+
+if TYPE_CHECKING:
+    import numpy as np
+
+from parser.game.constants import NUMMER
+
+# separator for the names of columns holding properties of nested objects,
+# e.g. "HAUS_PRODLIST.Ware"
+COLUMN_SEPARATOR = "."
+# name of the column referring to the number of the parent object in tables
+# of nested numbered objects (e.g. the FIGUR of an ANIM)
+PARENT = "Parent"
+
+
+class ColumnarTable:
+    """
+    Struct-of-arrays representation of a family of numbered objects (such as
+    all HAUS or all FIGUR objects), with one row per numbered object:
+
+    - scalar properties are stored in one NumPy array per property,
+    - tuple-typed properties of fixed length (e.g. "Pos") in 2-d arrays,
+    - enum-valued properties as their integer values, with the enum class
+      available in `enum_types`,
+    - anything else (e.g. repeated sub-objects) in object arrays.
+
+    Properties of non-numbered sub-objects are flattened into columns named
+    "<object>.<property>". Objects lacking a property are marked in the
+    property's validity mask (their value in the column is 0).
+    """
+
+    def __init__(
+        self,
+        numbers: "np.ndarray",
+        columns: "dict[str, np.ndarray]",
+        masks: "dict[str, np.ndarray]",
+        enum_types: dict[str, Type[enum.IntEnum]],
+    ):
+        """
+        :param numbers: the "Nummer" of each row
+        :param columns: property name -> values
+        :param masks: property name -> boolean array, True where the
+                      property is defined
+        :param enum_types: property name (or NUMMER, for the numbers) -> enum
+                           class of enum-coded columns
+        """
+        self.numbers = numbers
+        self.columns = columns
+        self.masks = masks
+        self.enum_types = enum_types
+
+    def __len__(self) -> int:
+        return len(self.numbers)
+
+    def __getitem__(self, prop: str) -> "np.ndarray":
+        return self.columns[prop]
+
+    def __contains__(self, prop: str) -> bool:
+        return prop in self.columns
+
+    def mask(self, prop: str, value: Any) -> "np.ndarray":
+        """
+        Return a boolean array which is True for rows where the property is
+        defined and equal to the given value. Rows of 2-d columns match if
+        all elements are equal.
+        """
+        import numpy as np
+
+        column = self.columns[prop]
+        if column.dtype == object:
+            matches = np.fromiter(
+                (v == value for v in column), dtype=bool, count=len(column)
+            )
+        elif column.ndim == 2:
+            matches = (column == np.asarray(value)).all(axis=1)
+        else:
+            matches = column == value
+        return matches & self.masks[prop]
+
+    def where(self, conditions: dict[str, Any]) -> "np.ndarray":
+        """
+        Return the numbers of all rows whose properties are equal to the
+        given values, e.g. `where({"Kind": BuildingKind.HWFERTIG})`.
+        """
+        import numpy as np
+
+        selected = np.ones(len(self), dtype=bool)
+        for prop, value in conditions.items():
+            selected &= self.mask(prop, value)
+        return self.numbers[selected]
+
+    def row(self, i: int) -> dict[str, Any]:
+        """
+        Return the (flattened) properties of a single row.
+        """
+        row = {}
+        for prop, column in self.columns.items():
+            if not self.masks[prop][i]:
+                continue
+            value = column[i]
+            if column.ndim == 2:
+                value = tuple(value.tolist())
+            elif column.dtype != object:
+                value = value.item()
+            if prop in self.enum_types:
+                value = self.enum_types[prop](value)
+            row[prop] = value
+        return row
+
+
+def to_columnar(obj: Mapping) -> dict[str, ColumnarTable]:
+    """
+    Convert all families of numbered objects in the output of
+    `CodGadLoader.parse_interpret` into columnar tables. Families of nested
+    numbered objects are converted into separate tables named
+    "<object>.<nested object>", with a PARENT column holding the number of
+    the object they are nested in. For FIGUREN.COD, this results in the
+    tables "FIGUR" and "FIGUR.ANIM".
+    """
+    tables = {}
+    for ident, value in obj.items():
+        if is_numbered_family(value):
+            _collect_tables(ident, value, None, tables)
+    return {
+        name: _build_table(numbers, records)
+        for name, (numbers, records) in tables.items()
+    }
+
+
+def is_numbered_family(value: Any) -> bool:
+    """
+    Return whether a value of an interpreted script is a family of numbered
+    objects, i.e. a non-empty mapping with integer keys only.
+    """
+    return (
+        isinstance(value, Mapping)
+        and bool(value)
+        and all(isinstance(k, int) for k in value)
+    )
+
+
+def _collect_tables(
+    name: str,
+    family: Mapping,
+    parent: Optional[int],
+    tables: dict[str, tuple[list, list]],
+) -> None:
+    numbers, records = tables.setdefault(name, ([], []))
+    for number, obj in family.items():
+        record = {} if parent is None else {PARENT: parent}
+        nested_families = _flatten(obj, "", record)
+        numbers.append(number)
+        records.append(record)
+        for ident, nested_family in nested_families:
+            _collect_tables(
+                name + COLUMN_SEPARATOR + ident, nested_family, number, tables
+            )
+
+
+def _flatten(obj: Mapping, prefix: str, record: dict) -> list[tuple[str, Mapping]]:
+    """
+    Add the properties of an object and its non-numbered sub-objects to
+    record. Return any nested families of numbered objects.
+    """
+    nested_families = []
+    for key, value in obj.items():
+        if is_numbered_family(value):
+            nested_families.append((prefix + key, value))
+        elif isinstance(value, Mapping):
+            nested_families += _flatten(value, prefix + key + COLUMN_SEPARATOR, record)
+        else:
+            record[prefix + key] = value
+    return nested_families
+
+
+def _build_table(numbers: list, records: list[dict]) -> ColumnarTable:
+    # NumPy is imported on first use, so that importing this module is cheap
+    import numpy as np
+
+    enum_types = {}
+    numbers_enum = _common_enum_type(numbers)
+    if numbers_enum is not None:
+        enum_types[NUMMER] = numbers_enum
+
+    # collect properties in order of appearance
+    props = {}
+    for record in records:
+        props.update(dict.fromkeys(record))
+
+    columns = {}
+    masks = {}
+    for prop in props:
+        values = [record.get(prop) for record in records]
+        mask = np.fromiter(
+            (v is not None for v in values), dtype=bool, count=len(values)
+        )
+        column, enum_type = _build_column([v for v in values if v is not None], mask)
+        columns[prop] = column
+        masks[prop] = mask
+        if enum_type is not None:
+            enum_types[prop] = enum_type
+    return ColumnarTable(np.array(numbers, dtype=np.int64), columns, masks, enum_types)
+
+
+def _build_column(
+    present: list, mask: "np.ndarray"
+) -> "tuple[np.ndarray, Optional[Type[enum.IntEnum]]]":
+    """
+    Build a column from the values of all rows where a property is present.
+    """
+    import numpy as np
+
+    types = {type(v) for v in present}
+    n = len(mask)
+
+    if types <= {int, float} or all(issubclass(t, int) for t in types):
+        dtype = np.float64 if float in types else np.int64
+        column = np.zeros(n, dtype=dtype)
+        column[mask] = present
+        return column, _common_enum_type(present)
+
+    if types == {tuple}:
+        lengths = {len(v) for v in present}
+        element_types = {type(e) for v in present for e in v}
+        if len(lengths) == 1 and (
+            element_types <= {int, float}
+            or all(issubclass(t, int) for t in element_types)
+        ):
+            dtype = np.float64 if float in element_types else np.int64
+            column = np.zeros((n, lengths.pop()), dtype=dtype)
+            column[mask] = present
+            return column, None
+
+    column = np.empty(n, dtype=object)
+    column[mask] = _object_array(present)
+    return column, None
+
+
+def _object_array(values: list) -> "np.ndarray":
+    import numpy as np
+
+    # avoid NumPy turning sequences into additional dimensions
+    array = np.empty(len(values), dtype=object)
+    for i, v in enumerate(values):
+        array[i] = v
+    return array
+
+
+def _common_enum_type(values: list) -> Optional[Type[enum.IntEnum]]:
+    types = {type(v) for v in values}
+    if len(types) == 1:
+        (type_,) = types
+        if issubclass(type_, enum.IntEnum):
+            return type_
+    return None
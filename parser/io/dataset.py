@@ -0,0 +1,167 @@
+import concurrent.futures
+import pathlib
+from collections.abc import Callable, Iterator, Mapping, Sequence
+from typing import Any, Optional
+
+from parser.io.script.loader import CodGadLoader, HaeuserCodLoader, FigurenCodLoader
+
+# creates a loader, must be picklable (e.g. a loader class, or a
+# functools.partial of one)
+LoaderFactory = Callable[[], CodGadLoader]
+
+# the first loader accepting a file is used for it
+DEFAULT_LOADERS: tuple[LoaderFactory, ...] = (
+    HaeuserCodLoader,
+    FigurenCodLoader,
+    CodGadLoader,
+)
+
+# loaders of the current worker process, see init_worker
+_worker_loaders: list[CodGadLoader] = []
+
+
+class GameDataSet(Mapping):
+    """
+    All script files of a 1602 install, interpreted in parallel.
+
+    On construction, the install is scanned for files accepted by any of the
+    loaders, and all files are submitted to a pool of worker processes, each
+    of which creates its loaders (and thereby the parser) once. The data set
+    is a mapping from paths relative to the install root to interpreted
+    scripts, which is filled lazily: accessing a file waits for its result
+    only, and raises the exception interpreting it raised, if any.
+    """
+
+    def __init__(
+        self,
+        root: pathlib.Path,
+        loaders: Sequence[LoaderFactory] = DEFAULT_LOADERS,
+        max_workers: Optional[int] = None,
+    ):
+        """
+        :param root: root directory of the install
+        :param loaders: factories of loaders to route files to, in order of
+                        precedence
+        :param max_workers: number of worker processes, defaults to the number
+                            of CPUs
+        """
+        self.root = root
+        routing_loaders = [factory() for factory in loaders]
+        # relative path -> index of the loader for the file
+        self._routes: dict[pathlib.Path, int] = {}
+        for path in sorted(root.rglob("*")):
+            if not path.is_file():
+                continue
+            for i, loader in enumerate(routing_loaders):
+                if loader.accepts(path):
+                    self._routes[path.relative_to(root)] = i
+                    break
+
+        self._executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=max_workers,
+            initializer=init_worker,
+            initargs=(tuple(loaders),),
+        )
+        self._futures: dict[pathlib.Path, concurrent.futures.Future] = {
+            rel_path: self._executor.submit(load_file, i, root / rel_path)
+            for rel_path, i in self._routes.items()
+        }
+        self._results: dict[pathlib.Path, Any] = {}
+
+    def __getitem__(self, rel_path: pathlib.Path | str) -> Any:
+        rel_path = pathlib.Path(rel_path)
+        try:
+            return self._results[rel_path]
+        except KeyError:
+            pass
+        future = self._futures[rel_path]
+        try:
+            result = self._results[rel_path] = future.result()
+        except KeyError as e:
+            # a KeyError interpreting the file would be taken for a missing
+            # file, e.g. by get()
+            raise RuntimeError(f"{rel_path}: {e!r}") from e
+        return result
+
+    def __contains__(self, rel_path: object) -> bool:
+        # without waiting for the file, or raising its exception
+        try:
+            return pathlib.Path(rel_path) in self._routes
+        except TypeError:
+            return False
+
+    def __iter__(self) -> Iterator[pathlib.Path]:
+        return iter(self._routes)
+
+    def __len__(self) -> int:
+        return len(self._routes)
+
+    def as_completed(self) -> Iterator[tuple[pathlib.Path, Any]]:
+        """
+        Iterate over relative paths and interpreted scripts in the order in
+        which they finish. Raises the exception of the first failed file.
+        """
+        rel_paths = {future: rel_path for rel_path, future in self._futures.items()}
+        for future in concurrent.futures.as_completed(rel_paths):
+            rel_path = rel_paths[future]
+            yield rel_path, self[rel_path]
+
+    def errors(self) -> dict[pathlib.Path, BaseException]:
+        """
+        Wait for all files, return those which could not be interpreted and
+        their exceptions.
+        """
+        concurrent.futures.wait(self._futures.values())
+        return {
+            rel_path: future.exception()
+            for rel_path, future in self._futures.items()
+            if not future.cancelled() and future.exception() is not None
+        }
+
+    def close(self) -> None:
+        """
+        Shut down the worker processes, cancelling files not started yet.
+        """
+        self._executor.shutdown(cancel_futures=True)
+
+    def __enter__(self) -> "GameDataSet":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def init_worker(loaders: tuple[LoaderFactory, ...]) -> None:
+    """
+    Set up the loaders of the current process, for `load_file`. Meant as the
+    initializer of worker processes (see GameDataSet), may also be called in
+    the main process to load files there.
+
+    :param loaders: factories of the loaders, in the order `load_file` refers
+                    to them
+    """
+    _worker_loaders[:] = [factory() for factory in loaders]
+    # loaders create their parsers lazily, do so before the first file
+    for loader in _worker_loaders:
+        loader.warm_up()
+
+
+def load_file(loader_index: int, path: pathlib.Path) -> Any:
+    """
+    Interpret a file with one of the loaders set up by `init_worker`. Parse
+    errors are raised as plain ParseErrors, which can be sent between
+    processes.
+
+    :param loader_index: index of the loader to use
+    :param path: path of the file
+    :return: interpreted script
+    """
+    from lark import ParseError, UnexpectedInput
+
+    loader = _worker_loaders[loader_index]
+    try:
+        return loader.load(path)
+    except UnexpectedInput as e:
+        # lark's exceptions refer to the parser state, which cannot be sent
+        # back to the main process
+        raise ParseError(f"{path}: {e}") from None
@@ -0,0 +1,248 @@
+from collections.abc import Iterator, Mapping
+from typing import Any, NamedTuple, Union
+
+# A path to a value of an interpreted script: the keys (identifiers of
+# objects and properties, numbers of numbered objects, or indices of lists)
+# leading to it from the top level.
+KeyPath = tuple
+
+# hashed subtree: the hash of a leaf, or the hash of a mapping or list and
+# the hashed subtrees of its children
+_Node = Union[int, tuple[int, Union[dict, list]]]
+
+# distinguish mappings from lists from tuples with the same items
+_MAPPING = "mapping"
+_LIST = "list"
+_TUPLE = "tuple"
+# salt of the hashes of values hashed like -1, see _leaf_hash
+_MINUS_ONE = "minus_one"
+# types of values hashed as they are (tuples hold scalars only)
+_LEAF_TYPES = frozenset((str, int, float, bool, type(None), tuple))
+
+
+class PatchError(Exception):
+    pass
+
+
+class Patch(NamedTuple):
+    """
+    Differences between two versions of an interpreted script, see `diff`.
+    Each kind of difference maps the paths of values to them.
+    """
+
+    # values of the new version only
+    added: dict[KeyPath, Any]
+    # values of the old version only
+    removed: dict[KeyPath, Any]
+    # values of both versions, as (old value, new value)
+    changed: dict[KeyPath, tuple[Any, Any]]
+
+    def __len__(self) -> int:
+        return len(self.added) + len(self.removed) + len(self.changed)
+
+    def __bool__(self) -> bool:
+        return len(self) > 0
+
+    def paths(self) -> Iterator[KeyPath]:
+        """
+        Yield the paths of all differences.
+        """
+        yield from self.changed
+        yield from self.removed
+        yield from self.added
+
+
+class HashedScript:
+    """
+    Interpreted script along with hashes of all of its subtrees (Merkle
+    tree), computed once. Diffing two hashed scripts skips subtrees with
+    equal hashes, so hash a base version once to diff many variants of it.
+
+    Hashes are Python hashes, so they are only valid within one process, and
+    values are considered the same if they are equal (an IntEnum member and
+    its value, for instance). Differences are missed only if the hashes of
+    two unequal subtrees collide (Python hashes -1 like -2, which is taken
+    care of).
+    """
+
+    __slots__ = ("obj", "_root")
+
+    def __init__(self, obj: Mapping):
+        """
+        :param obj: interpreted script, e.g. returned by
+                    `CodGadLoader.parse_interpret`. Must not be modified
+                    afterwards.
+        """
+        self.obj = obj
+        self._root = _hash(obj)
+
+    @property
+    def digest(self) -> int:
+        """
+        Hash of the whole script.
+        """
+        return self._root[0]
+
+
+def diff(old: Union[Mapping, HashedScript], new: Union[Mapping, HashedScript]) -> Patch:
+    """
+    Compute the differences between two versions of an interpreted script,
+    down to single properties. Objects and numbered objects are compared by
+    key, lists of the same length by index. Other values (including lists of
+    different lengths) are compared as a whole.
+
+    :param old: base version, or hashed base version (to reuse its hashes)
+    :param new: other version, or hashed other version
+    :return: patch turning the old version into the new one
+    """
+    if not isinstance(old, HashedScript):
+        old = HashedScript(old)
+    if not isinstance(new, HashedScript):
+        new = HashedScript(new)
+    patch = Patch({}, {}, {})
+    _diff((), old.obj, old._root, new.obj, new._root, patch)
+    return patch
+
+
+def apply_patch(obj: Mapping, patch: Patch, check: bool = True) -> dict:
+    """
+    Apply a patch (see `diff`) to a version of an interpreted script. The
+    given script is not modified: mappings and lists along the paths of
+    the patch are copied (as dicts and lists), everything else is shared
+    with the new version.
+
+    :param obj: version to patch
+    :param patch: differences to apply
+    :param check: if True, raise a PatchError unless the values the patch
+                  removes and changes are those found in the script, and
+                  the values it adds are not present yet
+    :return: patched version
+    """
+    root = dict(obj)
+    # containers copied already, by id of the copy
+    copied = {id(root)}
+
+    def parent(path: KeyPath) -> Any:
+        container = root
+        for key in path[:-1]:
+            try:
+                child = container[key]
+            except (KeyError, IndexError, TypeError):
+                raise PatchError(f"Path {path!r} does not exist.") from None
+            if id(child) not in copied:
+                if isinstance(child, Mapping):
+                    child = dict(child)
+                elif type(child) is list:
+                    child = list(child)
+                else:
+                    raise PatchError(f"Path {path!r} does not exist.")
+                container[key] = child
+                copied.add(id(child))
+            container = child
+        return container
+
+    # only mappings gain or lose items, lists are changed by index or
+    # replaced as a whole, so the order of paths does not matter
+    for path, (old_value, new_value) in patch.changed.items():
+        container = parent(path)
+        if check and _get(container, path) != old_value:
+            raise PatchError(f"Value at {path!r} differs from the patch.")
+        container[path[-1]] = new_value
+    for path, old_value in patch.removed.items():
+        container = parent(path)
+        if check and _get(container, path) != old_value:
+            raise PatchError(f"Value at {path!r} differs from the patch.")
+        del container[path[-1]]
+    for path, new_value in patch.added.items():
+        container = parent(path)
+        if check and path[-1] in container:
+            raise PatchError(f"Value at {path!r} exists already.")
+        container[path[-1]] = new_value
+    return root
+
+
+def _get(container: Any, path: KeyPath) -> Any:
+    try:
+        return container[path[-1]]
+    except (KeyError, IndexError):
+        raise PatchError(f"Path {path!r} does not exist.") from None
+
+
+def _hash(value: Any) -> _Node:
+    # This runs for every value of a script, hence leaves are hashed inline
+    # rather than by recursing (falling back to _leaf_hash where needed).
+    leaf_types = _LEAF_TYPES
+    type_ = type(value)
+    if type_ is dict or (type_ not in leaf_types and isinstance(value, Mapping)):
+        children = {}
+        items = []
+        for k, v in value.items():
+            if type(v) in leaf_types:
+                digest = hash(v)
+                if digest == -2 or type(v) is tuple:
+                    digest = _leaf_hash(v)
+                children[k] = digest
+            else:
+                child = children[k] = _hash(v)
+                digest = child if type(child) is int else child[0]
+            key_digest = hash(k)
+            if key_digest == -2 or type(k) is tuple:
+                key_digest = _leaf_hash(k)
+            items.append((key_digest, digest))
+        return hash((_MAPPING, frozenset(items))), children
+    elif type_ is list:
+        children = [_hash(v) for v in value]
+        digests = tuple(c if type(c) is int else c[0] for c in children)
+        return hash((_LIST, digests)), children
+    # IntEnum members and other scalars
+    return _leaf_hash(value)
+
+
+def _leaf_hash(value: Any) -> int:
+    # Hashes of containers combine the hashes of their items, in which -1 is
+    # replaced by -2 (hash(-1) == hash(-2) == -2, likewise for -1.0), so
+    # values hashed like that are told apart here. The result is a hash, and
+    # thus never -1 itself.
+    if type(value) is tuple:
+        return hash((_TUPLE, tuple(_leaf_hash(v) for v in value)))
+    digest = hash(value)
+    if digest == -2:
+        return hash((_MINUS_ONE, value == -1))
+    return digest
+
+
+def _diff(
+    path: KeyPath, old: Any, old_node: _Node, new: Any, new_node: _Node, patch: Patch
+) -> None:
+    old_is_leaf = type(old_node) is int
+    new_is_leaf = type(new_node) is int
+    if old_is_leaf and new_is_leaf:
+        if old_node != new_node or old != new:
+            patch.changed[path] = (old, new)
+        return
+    if old_is_leaf or new_is_leaf:
+        patch.changed[path] = (old, new)
+        return
+    old_digest, old_children = old_node
+    new_digest, new_children = new_node
+    if old_digest == new_digest:
+        return
+    if type(old_children) is dict and type(new_children) is dict:
+        for key, old_child in old_children.items():
+            new_child = new_children.get(key)
+            if new_child is None:
+                patch.removed[path + (key,)] = old[key]
+            else:
+                _diff(path + (key,), old[key], old_child, new[key], new_child, patch)
+        for key in new_children:
+            if key not in old_children:
+                patch.added[path + (key,)] = new[key]
+    elif (
+        type(old_children) is list
+        and type(new_children) is list
+        and len(old_children) == len(new_children)
+    ):
+        for i, (old_child, new_child) in enumerate(zip(old_children, new_children)):
+            _diff(path + (i,), old[i], old_child, new[i], new_child, patch)
+    else:
+        patch.changed[path] = (old, new)
@@ -0,0 +1,109 @@
+import enum
+import json
+from collections.abc import Callable, Iterator, Mapping
+from typing import Any, Optional
+
+from parser.io.columnar import is_numbered_family
+
+# types the json module encodes as they are
+_PLAIN_TYPES = frozenset((str, int, float, bool, type(None)))
+
+
+class ScriptEncoder:
+    """
+    Encodes interpreted scripts as JSON. IntEnum members, which the json
+    module would encode as plain integers (both as keys and as values), are
+    encoded as their names, or as their values if `enum_names` is False.
+    Tuples become arrays, and any mappings (such as LayeredDicts) objects.
+
+    Scripts are converted into plain dicts, lists and scalars in one pass
+    first, so that the actual encoding is done by the json module's C
+    encoder.
+    """
+
+    def __init__(self, enum_names: bool = True):
+        """
+        :param enum_names: if True, encode IntEnum members as their names,
+                           otherwise as their values
+        """
+        self.enum_names = enum_names
+        self._convert = _converter(enum_names)
+
+    def encode(self, obj: Any) -> str:
+        """
+        Encode an interpreted script (or any part of one) as a JSON document.
+        """
+        return _dumps(self.convert(obj))
+
+    def iter_lines(self, obj: Mapping, path: Optional[str] = None) -> Iterator[str]:
+        """
+        Encode an interpreted script as NDJSON: yield one line (without line
+        break) per numbered object, and per other top-level property or
+        object. Each line is a JSON object with the keys "path" (if given),
+        "object" (the identifier of the top-level object or property),
+        "number" (numbered objects only) and "value".
+        """
+        convert = self._convert
+        key = self._key
+        for ident, value in obj.items():
+            record = {} if path is None else {"path": path}
+            record["object"] = ident
+            if is_numbered_family(value):
+                for number, numbered_obj in value.items():
+                    record["number"] = key(number)
+                    record["value"] = convert(numbered_obj)
+                    yield _dumps(record)
+            else:
+                record["value"] = convert(value)
+                yield _dumps(record)
+
+    def convert(self, value: Any) -> Any:
+        """
+        Convert an interpreted value into one the json module encodes as
+        intended.
+        """
+        return self._convert(value)
+
+    def _key(self, key: Any) -> Any:
+        if isinstance(key, enum.IntEnum):
+            return key._name_ if self.enum_names else int(key)
+        return key
+
+
+def _converter(enum_names: bool) -> Callable[[Any], Any]:
+    # This runs for every value of a script, hence a closure, and values
+    # needing no conversion are checked before recursing.
+    plain_types = _PLAIN_TYPES
+    int_enum = enum.IntEnum
+
+    def convert_enum(member: enum.IntEnum) -> Any:
+        return member._name_ if enum_names else int(member)
+
+    def convert_key(key: Any) -> Any:
+        return convert_enum(key) if isinstance(key, int_enum) else key
+
+    def convert(value: Any) -> Any:
+        type_ = type(value)
+        if type_ in plain_types:
+            return value
+        elif type_ is dict or isinstance(value, Mapping):
+            return {
+                k if type(k) in plain_types else convert_key(k): (
+                    v if type(v) in plain_types else convert(v)
+                )
+                for k, v in value.items()
+            }
+        elif type_ is list or type_ is tuple:
+            return [v if type(v) in plain_types else convert(v) for v in value]
+        elif isinstance(value, int_enum):
+            return convert_enum(value)
+        return value
+
+    return convert
+
+
+def _dumps(obj: Any) -> str:
+    # converted values never contain cycles
+    return json.dumps(
+        obj, ensure_ascii=False, check_circular=False, separators=(",", ":")
+    )
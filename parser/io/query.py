@@ -0,0 +1,257 @@
+import bisect
+from collections.abc import Hashable, Mapping
+from numbers import Real
+from typing import Any, Iterator
+
+from parser.game.constants import NUMMER
+from parser.io.columnar import COLUMN_SEPARATOR, is_numbered_family
+
+
+class FamilyQuery:
+    """
+    Indexes over a family of numbered objects (such as all HAUS or all FIGUR
+    objects) for looking up objects by their properties without scanning the
+    family.
+
+    Properties of sub-objects are addressed as "<object>.<property>", like in
+    `to_columnar`, e.g. "HAUS_PRODLIST.Ware". Unlike columnar tables,
+    properties may hold several values per numbered object: the values of
+    repeated properties, of repeated sub-objects, and of all objects of
+    nested numbered families (e.g. "ANIM.AnimAnz" of a FIGUR). An object
+    matches a query if any of its values does. The number of each object is
+    available as property NUMMER.
+
+    Indexes are built per property on first use: hash indexes for `where`,
+    sorted indexes for `between`, and interval indexes for `containing`.
+    Lookups tell apart IntEnum members and plain integers, as well as
+    members of different enums.
+    """
+
+    def __init__(self, family: Mapping):
+        """
+        :param family: numbered objects by number, as interpreted
+        """
+        self.family = family
+        # number -> property -> values
+        self._records: dict[Any, dict[str, list]] = {}
+        for number, obj in family.items():
+            record = {NUMMER: [number]}
+            _flatten(obj, "", record)
+            self._records[number] = record
+        self._hash_indexes: dict[str, dict[tuple, list]] = {}
+        # property -> integer value -> (type, number) pairs, for joins
+        self._int_indexes: dict[str, dict[int, list]] = {}
+        self._sorted_indexes: dict[str, tuple[list, list]] = {}
+        self._interval_indexes: dict[tuple[str, str], _IntervalIndex] = {}
+
+    def __getitem__(self, number: Any) -> Mapping:
+        return self.family[number]
+
+    def __iter__(self) -> Iterator:
+        return iter(self.family)
+
+    def __len__(self) -> int:
+        return len(self.family)
+
+    def values(self, number: Any, prop: str) -> list:
+        """
+        Return all values of a property of an object, see FamilyQuery.
+        """
+        return self._records[number].get(prop, [])
+
+    def where(self, prop: str, value: Hashable) -> list:
+        """
+        Return the numbers of all objects with the given value of a property,
+        e.g. `where("Kind", BuildingKind.HWFERTIG)`. Takes O(1) besides the
+        result, once the property's index is built.
+        """
+        index = self._hash_indexes.get(prop)
+        if index is None:
+            index = self._hash_indexes[prop] = {}
+            for number, record in self._records.items():
+                for v in record.get(prop, ()):
+                    if isinstance(v, Hashable):
+                        numbers = index.setdefault(_hash_key(v), [])
+                        if not numbers or numbers[-1] is not number:
+                            numbers.append(number)
+        return list(index.get(_hash_key(value), ()))
+
+    def _join_numbers(self, prop: str, value: Hashable) -> list:
+        """
+        Like `where`, but IntEnum members also match plain integers of the
+        same value (like numbers given relative to a member, such as
+        "@Nummer: +1"), while members of different enums still do not.
+        """
+        if not isinstance(value, int) or isinstance(value, bool):
+            return self.where(prop, value)
+        index = self._int_indexes.get(prop)
+        if index is None:
+            index = self._int_indexes[prop] = {}
+            for number, record in self._records.items():
+                for v in record.get(prop, ()):
+                    if isinstance(v, int) and not isinstance(v, bool):
+                        index.setdefault(int(v), []).append((type(v), number))
+        type_ = type(value)
+        return list(
+            dict.fromkeys(
+                number
+                for t, number in index.get(int(value), ())
+                if t is type_ or t is int or type_ is int
+            )
+        )
+
+    def between(self, prop: str, low: Real, high: Real) -> list:
+        """
+        Return the numbers of all objects with a numeric value of a property
+        in the range [low, high), ordered by that value, e.g.
+        `between("Gfx", 100, 200)`. Takes O(log n) besides the result, once
+        the property's index is built.
+        """
+        index = self._sorted_indexes.get(prop)
+        if index is None:
+            pairs = sorted(
+                (v, i)
+                for i, (number, record) in enumerate(self._records.items())
+                for v in record.get(prop, ())
+                if _is_number(v)
+            )
+            numbers = list(self._records)
+            index = self._sorted_indexes[prop] = (
+                [v for v, _ in pairs],
+                [numbers[i] for _, i in pairs],
+            )
+        keys, numbers = index
+        start = bisect.bisect_left(keys, low)
+        end = bisect.bisect_left(keys, high, lo=start)
+        return list(dict.fromkeys(numbers[start:end]))
+
+    def containing(self, start_prop: str, length_prop: str, value: Real) -> list:
+        """
+        Return the numbers of all objects for which the interval
+        [start, start + length) contains a value, where start and length are
+        numeric values of two properties. If the properties have several
+        values, they are paired in order. Takes O(log n) besides the result
+        for intervals which overlap rarely (such as graphics ranges), once
+        the index is built.
+        """
+        key = (start_prop, length_prop)
+        index = self._interval_indexes.get(key)
+        if index is None:
+            intervals = []
+            for number, record in self._records.items():
+                for start, length in zip(
+                    record.get(start_prop, ()), record.get(length_prop, ())
+                ):
+                    if _is_number(start) and _is_number(length):
+                        intervals.append((start, start + length, number))
+            index = self._interval_indexes[key] = _IntervalIndex(intervals)
+        return index.containing(value)
+
+
+class ScriptQuery:
+    """
+    Queries over the families of numbered objects of one or several
+    interpreted scripts, e.g. HAEUSER.COD and FIGUREN.COD, with joins
+    between families through shared enums:
+
+        query = ScriptQuery(haeuser, figuren)
+        query["HAUS"].where("HAUS_PRODLIST.Ware", Resource.WOLLE)
+        query.join("HAUS", "HAUS_PRODLIST.Figurnr", "FIGUR")
+    """
+
+    def __init__(self, *objs: Mapping):
+        """
+        :param objs: interpreted scripts, as returned by
+                     `CodGadLoader.parse_interpret`
+        """
+        self.families: dict[str, FamilyQuery] = {}
+        for obj in objs:
+            for ident, value in obj.items():
+                if not is_numbered_family(value):
+                    continue
+                if ident in self.families:
+                    raise ValueError(f"Family '{ident}' is defined more than once.")
+                self.families[ident] = FamilyQuery(value)
+
+    def __getitem__(self, ident: str) -> FamilyQuery:
+        return self.families[ident]
+
+    def __contains__(self, ident: str) -> bool:
+        return ident in self.families
+
+    def join(
+        self, left: str, left_prop: str, right: str, right_prop: str = NUMMER
+    ) -> list[tuple[Any, Any]]:
+        """
+        Return pairs of numbers of objects of two families whose properties
+        share a value, e.g. `join("HAUS", "HAUS_PRODLIST.Figurnr", "FIGUR")`
+        for the figures of production buildings, which FIGUREN.COD numbers
+        by Character. Each pair is found via a hash index of the right
+        family. Unlike in `where`, IntEnum members and plain integers of the
+        same value match, since numbered objects following one numbered by
+        a member (via "@Nummer: +1") are numbered by plain integers.
+
+        :param left_prop: property of the left family
+        :param right_prop: property of the right family, the number of its
+                           objects by default
+        """
+        left_family = self.families[left]
+        right_family = self.families[right]
+        pairs = []
+        for number in left_family:
+            right_numbers = {}
+            for v in left_family.values(number, left_prop):
+                if isinstance(v, Hashable):
+                    right_numbers.update(
+                        dict.fromkeys(right_family._join_numbers(right_prop, v))
+                    )
+            pairs.extend((number, right_number) for right_number in right_numbers)
+        return pairs
+
+
+class _IntervalIndex:
+    """
+    Intervals sorted by start, with the maximum end of all intervals up to
+    each position, which bounds how far back a lookup has to scan.
+    """
+
+    def __init__(self, intervals: list[tuple[Real, Real, Any]]):
+        intervals.sort(key=lambda interval: interval[0])
+        self.starts = [start for start, _, _ in intervals]
+        self.ends = [end for _, end, _ in intervals]
+        self.numbers = [number for _, _, number in intervals]
+        self.max_ends = []
+        max_end = None
+        for end in self.ends:
+            max_end = end if max_end is None else max(max_end, end)
+            self.max_ends.append(max_end)
+
+    def containing(self, value: Real) -> list:
+        numbers = []
+        i = bisect.bisect_right(self.starts, value) - 1
+        while i >= 0 and self.max_ends[i] > value:
+            if self.ends[i] > value:
+                numbers.append(self.numbers[i])
+            i -= 1
+        numbers.reverse()
+        return list(dict.fromkeys(numbers))
+
+
+def _flatten(obj: Mapping, prefix: str, record: dict[str, list]) -> None:
+    for key, value in obj.items():
+        for v in value if type(value) is list else (value,):
+            if not isinstance(v, Mapping):
+                record.setdefault(prefix + key, []).append(v)
+                continue
+            sub_prefix = prefix + key + COLUMN_SEPARATOR
+            for sub_obj in v.values() if is_numbered_family(v) else (v,):
+                _flatten(sub_obj, sub_prefix, record)
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, Real) and not isinstance(value, bool)
+
+
+def _hash_key(value: Hashable) -> tuple:
+    # IntEnum members are equal to their values, but must not be confused
+    return type(value), value
@@ -0,0 +1,170 @@
+import enum
+import math
+from collections.abc import Mapping
+from typing import Any, Optional, Type
+
+from parser.io.script.symbols import SymbolIndex
+
+
+class ScriptEmitter:
+    """
+    Inverse of ScriptInterpreter: turns interpreted scripts (as returned by
+    `CodGadLoader.parse_interpret`) back into script text, such that
+    interpreting the text again yields an equal result.
+
+    Objects are emitted as "Objekt" blocks, families of numbered objects
+    with one "Nummer" per object, and properties holding several values
+    (aggregated duplicates) as repeated properties. Where all numbered
+    objects of a family share the properties of the first one, which is the
+    case for families filled via ObjFill, the first object becomes an
+    ObjFill prototype and the other objects only state how they differ from
+    it. Enum members are emitted by name, so they have to be resolvable via
+    the enums of the loader interpreting the result.
+    """
+
+    def __init__(
+        self,
+        enums: Optional[list[Type[enum.IntEnum]]] = None,
+        external_vars: Optional[dict[str, Any]] = None,
+        indent: str = "    ",
+        use_fill: bool = True,
+    ):
+        """
+        :param enums: enums of the interpreter the output is meant for
+        :param external_vars: external variables of that interpreter, which
+                              shadow enum members of the same name
+        :param indent: indentation per level of object nesting
+        :param use_fill: if False, never emit ObjFill, but all properties of
+                         each numbered object
+        """
+        self.symbols = SymbolIndex(enums or [], external_vars)
+        self.external_vars = external_vars or {}
+        self.indent = indent
+        self.use_fill = use_fill
+
+    def emit(self, obj: Mapping) -> str:
+        """
+        Emit a script for an interpreted script.
+        """
+        lines = []
+        # Emitting works off a stack instead of recursing, so deeply nested
+        # objects are not limited by Python's recursion limit. Entries are
+        # either finished lines, or objects at some depth to be expanded.
+        stack: list[str | tuple[Mapping, int]] = [(obj, 0)]
+        while stack:
+            entry = stack.pop()
+            if type(entry) is str:
+                lines.append(entry)
+            else:
+                stack += reversed(self._expand(*entry))
+        lines.append("")
+        return "\n".join(lines)
+
+    def _expand(self, obj: Mapping, depth: int) -> list[str | tuple[Mapping, int]]:
+        """
+        Return the lines of the properties and sub-objects of an object, with
+        sub-objects yet to be expanded.
+        """
+        prefix = self.indent * depth
+        entries = []
+        for key, value in obj.items():
+            values = value if type(value) is list else (value,)
+            if type(value) is list and len(value) < 2:
+                raise ValueError(
+                    f"Cannot emit '{key}': lists hold the values of repeated properties, of which there must be several."
+                )
+            for v in values:
+                if not isinstance(v, Mapping):
+                    entries.append(f"{prefix}{key}: {self._format_value(v)}")
+                    continue
+                if not v:
+                    raise ValueError(f"Cannot emit empty object '{key}'.")
+                entries.append(f"{prefix}Objekt: {key}")
+                if all(isinstance(k, int) for k in v):
+                    entries += self._expand_numbered(key, v, depth + 1)
+                else:
+                    entries.append((v, depth + 1))
+                entries.append(f"{prefix}EndObj;")
+        return entries
+
+    def _expand_numbered(
+        self, ident: str, family: Mapping, depth: int
+    ) -> list[str | tuple[Mapping, int]]:
+        prefix = self.indent * depth
+        objs = list(family.items())
+        proto = self._find_prototype(objs)
+
+        entries = []
+        for i, (number, obj) in enumerate(objs):
+            entries.append(f"{prefix}Nummer: {self._format_value(number)}")
+            if proto is not None and i == 0:
+                fill_from = self._format_value(min(n for n, _ in objs))
+                entries.append(f"{prefix}ObjFill: {fill_from},MAX{ident}")
+            elif proto is not None:
+                # only what differs from the prototype, but at least one
+                # property, since numbered objects cannot be empty
+                obj = {
+                    k: v for k, v in obj.items() if not _same(proto.get(k, _MISSING), v)
+                } or dict([next(iter(obj.items()))])
+            elif not obj:
+                raise ValueError(f"Cannot emit empty object '{ident}' {number}.")
+            entries.append((obj, depth))
+        return entries
+
+    def _find_prototype(self, objs: list[tuple[int, Mapping]]) -> Optional[Mapping]:
+        """
+        Return the first object of a family if it can be used as forward
+        ObjFill prototype for all other objects.
+        """
+        if not self.use_fill or len(objs) < 2:
+            return None
+        if min(number for number, _ in objs) < 0:
+            # the number to fill from is a literal, which cannot be negative
+            return None
+        _, proto = objs[0]
+        if not proto or not all(proto.keys() <= obj.keys() for _, obj in objs[1:]):
+            return None
+        return proto
+
+    def _format_value(self, value: Any) -> str:
+        if type(value) is tuple:
+            if len(value) < 2:
+                raise ValueError(
+                    f"Cannot emit tuple {value!r} with less than 2 values."
+                )
+            return ", ".join(self._format_value(v) for v in value)
+        elif isinstance(value, enum.IntEnum):
+            return self._format_member(value)
+        elif type(value) is int:
+            return str(value)
+        elif type(value) is float and math.isfinite(value):
+            return repr(value)
+        raise TypeError(f"Cannot emit value {value!r} of type {type(value)}.")
+
+    def _format_member(self, member: enum.IntEnum) -> str:
+        name = member.name
+        if self.symbols.get(name) is not member or name in self.external_vars:
+            raise ValueError(
+                f"Cannot emit {member!r}, '{name}' does not resolve to it."
+            )
+        return name
+
+
+_MISSING = object()
+
+
+def _same(a: Any, b: Any) -> bool:
+    """
+    Equality which also tells apart IntEnum members and their values.
+    """
+    if type(a) is not type(b):
+        return isinstance(a, Mapping) and isinstance(b, Mapping) and _same_mapping(a, b)
+    elif type(a) in (tuple, list):
+        return len(a) == len(b) and all(_same(x, y) for x, y in zip(a, b))
+    elif isinstance(a, Mapping):
+        return _same_mapping(a, b)
+    return a == b
+
+
+def _same_mapping(a: Mapping, b: Mapping) -> bool:
+    return a.keys() == b.keys() and all(_same(v, b[k]) for k, v in a.items())
@@ -0,0 +1,184 @@
+from collections.abc import Mapping
+from typing import Any, Iterator, NamedTuple, Optional
+
+from lark import Token
+from lark.lark import PostLex
+
+from parser.game.constants import NUMMER
+from parser.io.script.interpreter import ScriptInterpreter
+
+# kinds of events
+# an object starts, before any of its contents
+BEGIN_OBJECT = "begin_object"
+# an object is complete, with all of its contents
+END_OBJECT = "end_object"
+# a numbered object is complete, with ObjFill applied
+NUMBERED_OBJECT = "numbered_object"
+# a property is defined or modified (except for "Nummer")
+SET_PROPERTY = "set_property"
+# a variable is defined or modified
+SET_VARIABLE = "set_variable"
+
+_MISSING = object()
+
+
+class ScriptEvent(NamedTuple):
+    kind: str
+    # enclosing objects, outermost first, as tuples of identifier and current
+    # number (None for objects without numbered objects)
+    path: tuple[tuple[str, Any], ...]
+    # identifier of the object, property or variable
+    name: str
+    # interpreted object (BEGIN_OBJECT: None), or the new value of the
+    # property or variable
+    value: Any = None
+    # number of the numbered object (NUMBERED_OBJECT only)
+    number: Any = None
+
+
+class _OpenObject:
+    """
+    State of an object being interpreted.
+    """
+
+    __slots__ = ("ident", "filled", "fill_proto_objects")
+
+    def __init__(self, ident: str):
+        self.ident = ident
+        # numbered objects completed so far, with ObjFill applied
+        self.filled = {}
+        self.fill_proto_objects = []
+
+
+class EventInterpreter(ScriptInterpreter):
+    """
+    Interpreter which reports what it interprets as a stream of ScriptEvents,
+    see `CodGadLoader.iter_events`. It is meant to be used as inline
+    transformer alongside `EventPostLex`, so that events occur while parsing.
+
+    Numbered objects are filled via ObjFill as soon as they are complete,
+    instead of once their object is complete. Top-level objects are not
+    kept once their END_OBJECT event has been reported, so memory use is
+    bounded by the largest top-level object rather than the whole script
+    (numbered objects have to be kept until the end of their object, since
+    ObjFill may refer back to any of them).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # events not consumed yet
+        self.events: list[ScriptEvent] = []
+        # objects being interpreted, innermost last
+        self._objects: list[_OpenObject] = []
+
+    def reset(self, external_vars: Optional[dict[str, Any]] = None) -> None:
+        """
+        Prepare for interpreting a new script.
+        """
+        self.vars = external_vars or {}
+        self.properties = [{}]
+        self.events = []
+        self._objects = []
+
+    def begin_object(self, ident: str) -> None:
+        """
+        Open the scope of an object, called by EventPostLex.
+        """
+        self.events.append(ScriptEvent(BEGIN_OBJECT, self._path(), ident))
+        self.open_scope()
+        self._objects.append(_OpenObject(ident))
+
+    def _path(self) -> tuple[tuple[str, Any], ...]:
+        # the scope of each object is the one above the scope it was opened in
+        return tuple(
+            (obj.ident, scope.get(NUMMER))
+            for obj, scope in zip(self._objects, self.properties[1:])
+        )
+
+    def def_object(self, child_objs: list) -> tuple[str, Optional[dict]]:
+        obj = self._objects.pop()
+        object_identifier = child_objs[0].value
+        if obj.filled:
+            overall_object = obj.filled
+        else:
+            overall_object = child_objs[1]
+        self.properties.pop()
+        self.events.append(
+            ScriptEvent(END_OBJECT, self._path(), object_identifier, overall_object)
+        )
+        # objects only need to be kept for their enclosing objects
+        return object_identifier, overall_object if self._objects else None
+
+    def numbered_object(self, child_objs: list) -> tuple[int, dict]:
+        number, obj = super().numbered_object(child_objs)
+        open_obj = self._objects[-1]
+        filled = open_obj.filled[number] = self._fill(
+            open_obj.ident, number, obj, open_obj.filled, open_obj.fill_proto_objects
+        )
+        path = self._path()[:-1]
+        self.events.append(
+            ScriptEvent(NUMBERED_OBJECT, path, open_obj.ident, filled, number)
+        )
+        return number, filled
+
+    def def_property_absolute(self, children: list) -> tuple[str, Any]:
+        prop, value = super().def_property_absolute(children)
+        self.events.append(ScriptEvent(SET_PROPERTY, self._path(), prop, value))
+        return prop, value
+
+    def def_property_relative(self, children: list) -> tuple[str, Any]:
+        prop, value = super().def_property_relative(children)
+        self.events.append(ScriptEvent(SET_PROPERTY, self._path(), prop, value))
+        return prop, value
+
+    def def_var_absolute(self, children: list) -> None:
+        super().def_var_absolute(children)
+        self._var_event(children[0].value)
+
+    def def_var_relative(self, children: list) -> None:
+        super().def_var_relative(children)
+        self._var_event(children[0].value)
+
+    def _var_event(self, var: str) -> None:
+        self.events.append(ScriptEvent(SET_VARIABLE, self._path(), var, self.vars[var]))
+
+    def include_expr(self, children: list) -> None:
+        """
+        Report the variables, objects and properties of an included file. Its
+        objects are reported as complete objects only.
+        """
+        variables = dict(self.vars)
+        included = super().include_expr(children)
+        for var, value in self.vars.items():
+            if variables.get(var, _MISSING) is not value:
+                self.events.append(ScriptEvent(SET_VARIABLE, (), var, value))
+        for key, value in (included or {}).items():
+            values = value if type(value) is list else (value,)
+            for v in values:
+                kind = END_OBJECT if isinstance(v, Mapping) else SET_PROPERTY
+                self.events.append(ScriptEvent(kind, (), key, v))
+        return None
+
+
+class EventPostLex(PostLex):
+    """
+    Like ScopePostLex, but opens the scope of an object once its identifier
+    is known, so that the identifier can be reported. At that point, all
+    reductions preceding the object have been completed as well.
+    """
+
+    always_accept = ()
+
+    def __init__(self, interpreter: EventInterpreter):
+        self.interpreter = interpreter
+
+    def process(self, stream: Iterator[Token]) -> Iterator[Token]:
+        # whether "Objekt" was read, but not the identifier following it
+        in_header = False
+        for token in stream:
+            if token.type == "OBJEKT":
+                in_header = True
+            elif in_header and token.type == "OBJECT_IDENT":
+                self.interpreter.begin_object(token.value)
+                in_header = False
+            yield token
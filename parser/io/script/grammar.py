@@ -0,0 +1,106 @@
+import functools
+import hashlib
+import threading
+from importlib.resources import files
+from typing import TYPE_CHECKING, Any
+
+from parser.io.cache import get_cache_dir
+
+if TYPE_CHECKING:
+    from lark import Lark
+
+# Options used for all parsers built from grammar.lark. The LALR parser is the
+# only one lark can serialize to disk.
+DEFAULT_LARK_OPTIONS = {"propagate_positions": True, "parser": "lalr"}
+
+# options which do not affect the compiled parser, so that parsers with and
+# without inline transformers share the same on-disk cache
+_UNHASHABLE_OPTIONS = ("transformer", "lexer_callbacks", "postlex")
+
+_registry: dict[tuple, "Lark"] = {}
+_registry_lock = threading.Lock()
+
+
+def read_grammar() -> str:
+    """
+    Return the text of grammar.lark.
+    """
+    return files("parser.io.script").joinpath("grammar.lark").read_text()
+
+
+@functools.cache
+def grammar_hash() -> str:
+    """
+    Hash of the grammar text and the lark version, i.e. everything that
+    determines the compiled parser.
+    """
+    s = read_grammar() + _lark_version()
+    return hashlib.sha256(s.encode("utf8")).hexdigest()
+
+
+def _lark_version() -> str:
+    # Use the installed distribution's metadata rather than importing lark,
+    # which takes longer than everything else needed for loading a cached
+    # result.
+    from importlib.metadata import PackageNotFoundError, version
+
+    try:
+        return version("lark")
+    except PackageNotFoundError:
+        # e.g. lark vendored without its metadata
+        import lark
+
+        return lark.__version__
+
+
+def get_lark(**options: Any) -> "Lark":
+    """
+    Return a LALR parser for grammar.lark. Parsers are shared process-wide:
+    there is only one instance per set of options. Compiled parsers are also
+    serialized to disk (keyed by grammar hash and lark version), so that new
+    processes only need to deserialize them. If the serialized parser is
+    stale or unreadable, lark silently falls back to compiling the grammar.
+
+    :param options: lark options, overriding DEFAULT_LARK_OPTIONS
+    """
+    options = DEFAULT_LARK_OPTIONS | options
+    key = tuple(sorted(options.items()))
+    with _registry_lock:
+        if key not in _registry:
+            _registry[key] = _build_lark(options)
+        return _registry[key]
+
+
+def build_lark(**options: Any) -> "Lark":
+    """
+    Build a new, unshared LALR parser for grammar.lark, e.g. one bound to a
+    specific inline transformer. The compiled parser is still loaded from the
+    on-disk cache if possible.
+
+    :param options: lark options, overriding DEFAULT_LARK_OPTIONS
+    """
+    return _build_lark(DEFAULT_LARK_OPTIONS | options)
+
+
+def _build_lark(options: dict[str, Any]) -> "Lark":
+    from lark import Lark
+
+    # lark validates the hash stored inside the cache file itself, but putting
+    # the hash in the filename keeps parsers of different versions of the
+    # grammar (and different options) from overwriting each other
+    options_str = "".join(
+        f"{k}{v}" for k, v in sorted(options.items()) if k not in _UNHASHABLE_OPTIONS
+    )
+    key = hashlib.sha256((grammar_hash() + options_str).encode("utf8")).hexdigest()
+    try:
+        cache_path = str(get_cache_dir() / f"grammar_{key[:16]}.lark")
+    except OSError:
+        # no writable cache directory, compile in-memory only
+        cache_path = False
+    lark_ = Lark(read_grammar(), cache=cache_path, **options)
+    # Terminal patterns loaded from the cache lack the "raw" attribute, which
+    # lark needs to format parse errors.
+    for terminal in lark_.terminals:
+        if not hasattr(terminal.pattern, "raw"):
+            terminal.pattern.raw = None
+    return lark_
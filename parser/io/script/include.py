@@ -0,0 +1,110 @@
+import pathlib
+import threading
+from collections import Counter
+from typing import Any, Callable, Hashable, NamedTuple
+
+# modification time (ns) and size of a file
+FileStamp = tuple[int, int]
+
+
+class CircularIncludeError(Exception):
+    """
+    Raised when a script includes itself, directly or via other includes.
+    """
+
+
+class IncludeResult(NamedTuple):
+    """
+    Interpreted contents of an included script.
+    """
+
+    # objects and properties defined in the included script
+    obj: dict
+    # variables after interpreting the included script
+    vars: dict[str, Any]
+    # the included script and all scripts included by it (transitively),
+    # with the stamps they had when they were read
+    dependencies: tuple[tuple[pathlib.Path, FileStamp], ...]
+
+
+class IncludeCache:
+    """
+    Process-wide cache of interpreted include files (usually INC files shared
+    by many GAD files), so that each include file is parsed only once. Entries
+    are keyed by the resolved path of the included file plus a key describing
+    the interpreter configuration (enums, external variables), and are
+    invalidated when the modification time or size of the included file, or
+    of any file it includes, changes.
+    """
+
+    def __init__(self):
+        self._entries: dict[tuple[pathlib.Path, Hashable], IncludeResult] = {}
+        self._lock = threading.Lock()
+        self.stats = Counter(hits=0, misses=0)
+
+    def get(
+        self,
+        path: pathlib.Path,
+        config_key: Hashable,
+        evaluate: Callable[[pathlib.Path, FileStamp], IncludeResult],
+    ) -> IncludeResult:
+        """
+        Return the cached result for an include file, or evaluate and cache
+        it.
+
+        :param path: path of the include file
+        :param config_key: hashable description of everything besides the
+                           file contents that the result depends on
+        :param evaluate: function interpreting the include file, which
+                         receives its resolved path and current stamp
+        """
+        path = path.resolve()
+        key = (path, config_key)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and self._is_valid(entry):
+            with self._lock:
+                self.stats["hits"] += 1
+            return entry
+
+        entry = evaluate(path, get_stamp(path))
+        with self._lock:
+            self.stats["misses"] += 1
+            self._entries[key] = entry
+        return entry
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.stats.clear()
+
+    @staticmethod
+    def _is_valid(entry: IncludeResult) -> bool:
+        try:
+            return all(get_stamp(path) == stamp for path, stamp in entry.dependencies)
+        except OSError:
+            return False
+
+
+def get_stamp(path: pathlib.Path) -> FileStamp:
+    stat = path.stat()
+    return stat.st_mtime_ns, stat.st_size
+
+
+def find_include(base_dir: pathlib.Path, filename: str) -> pathlib.Path:
+    """
+    Find an included file next to the including file. The game refers to
+    files case-insensitively, so fall back to a case-insensitive search.
+    """
+    path = base_dir / filename
+    if path.exists():
+        return path
+    filename_lower = filename.lower()
+    for candidate in base_dir.iterdir():
+        if candidate.name.lower() == filename_lower:
+            return candidate
+    raise FileNotFoundError(f"Included file '{filename}' not found in '{base_dir}'.")
+
+
+# shared by all loaders
+INCLUDE_CACHE = IncludeCache()
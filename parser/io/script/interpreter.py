@@ -1,26 +1,65 @@
+import copy
 import enum
-from typing import Any, Type, Optional
+import pathlib
+import warnings
+from collections import Counter
+from typing import Any, Type, Optional, Iterator, Callable
 
-from lark import ParseTree, ParseError
-from lark.visitors import Interpreter
+from lark import ParseTree, ParseError, Token, Tree
+from lark.lark import PostLex
+from lark.visitors import Transformer
 
 from parser.game.constants import NUMMER
+from parser.io.script.include import IncludeResult, FileStamp
+from parser.io.script.layered import LayeredDict
+from parser.io.script.symbols import SymbolIndex
 
 
-class ScriptInterpreter(Interpreter):
+class ScriptInterpreter(Transformer):
     """
     Parsing a 1602 script with grammar.lark produces a ParseTree. This
     interpreter walks over the parse tree and converts its contents into plain
     Python objects.
+
+    Each rule method receives the already interpreted children of its node,
+    like a lark Transformer. That way, the interpreter can alternatively be
+    plugged into a LALR parser as inline transformer (see `postlex`), in
+    which case scripts are interpreted while parsing, without ever building a
+    parse tree.
     """
 
     FILL_FORWARD = "__fill_forward__"
     FILL_BACKWARD = "__fill__backward__"
 
+    # names of the rules in grammar.lark that end up in parse trees
+    RULES = (
+        "start",
+        "include_expr",
+        "def_object",
+        "object_content",
+        "numbered_object",
+        "def_number_absolute",
+        "def_number_relative",
+        "def_property_absolute",
+        "def_property_relative",
+        "property_value",
+        "def_var_absolute",
+        "def_var_relative",
+        "fill_expr",
+        "unary_arith_expr",
+        "binary_arith_expr",
+        "literal",
+        "int_literal",
+        "var_ref",
+        "property_ref",
+        "property_index_ref",
+    )
+
     def __init__(
         self,
         external_vars: Optional[dict[str, Any]] = None,
         enums: Optional[list[Type[enum.IntEnum]]] = None,
+        layered_fill: bool = False,
     ):
         """
         :param external_vars: any external variables that are referenced but
@@ -29,37 +68,113 @@ class ScriptInterpreter(Interpreter):
         :param enums: in case a variable identifier cannot be resolved against
                       a variable defined in the script, or a variable from
                       external_vars, it can be looked up in this list of enums
+        :param layered_fill: if True, numbered objects filled via ObjFill are
+                             LayeredDicts sharing the properties of their
+                             prototypes, instead of dicts with copies of them
         """
         self.enums = enums or []
         self.vars = external_vars or {}
+        self.layered_fill = layered_fill
+        # Resolves the filename of an included file to its interpreted
+        # contents, given the include stack. Set by the loader, since
+        # resolving depends on the path of the script being interpreted.
+        self.include_resolver: Optional[
+            Callable[[str, tuple[pathlib.Path, ...]], IncludeResult]
+        ] = None
+        # resolved paths of the included files this script is interpreted
+        # within, outermost first, for detecting circular includes
+        self.include_stack: tuple[pathlib.Path, ...] = ()
+        # all files included while interpreting, with their stamps
+        self.include_dependencies: list[tuple[pathlib.Path, FileStamp]] = []
+        self.symbols = SymbolIndex(self.enums, self.vars)
+        # number of var_ref lookups resolved against variables, enums, and
+        # how many of the latter were ambiguous
+        self.lookup_stats = Counter(vars=0, enums=0, ambiguous=0)
+        self._warned_ambiguous = set()
         # Each object introduces a new scope for properties. There can be
         # properties on the top-level scope without any object definition,
         # so initialize the stack with an empty dict for the top-level scope.
         # Variables appear to be globally scoped and do not need a stack.
         self.properties = [{}]
 
-    def start(self, tree: ParseTree) -> dict:
-        child_objs = self.visit_children(tree)
+        # rule name -> handler
+        self._handlers = {rule: getattr(self, rule) for rule in self.RULES}
+
+    def visit(self, tree: ParseTree) -> Any:
+        """
+        Interpret a parse tree in one walk, children before parents.
+
+        The walk is iterative, so deeply nested objects are not limited by
+        Python's recursion limit. Interpreted children are collected on a
+        single value stack, from which each rule handler receives its
+        children once the last of them has been interpreted.
+        """
+        handlers = self._handlers
+        values = []
+        # nodes whose children are being interpreted, as tuples of rule name,
+        # iterator over remaining children, and start of the node's children
+        # on the value stack
+        stack = []
+
+        node = tree
+        while True:
+            if node is not None:
+                if node.data == "def_object":
+                    self.open_scope()
+                stack.append((node.data, iter(node.children), len(values)))
+                node = None
+
+            rule, children, base = stack[-1]
+            for child in children:
+                if isinstance(child, Tree):
+                    node = child
+                    break
+                values.append(child)
+            else:
+                stack.pop()
+                value = handlers[rule](values[base:])
+                del values[base:]
+                if not stack:
+                    return value
+                values.append(value)
+
+    transform = visit
+
+    @property
+    def postlex(self) -> "ScopePostLex":
+        """
+        Post-lexer to pass to lark alongside this interpreter when using it as
+        inline transformer.
+        """
+        return ScopePostLex(self)
 
+    def open_scope(self) -> None:
+        self.properties.append({})
+
+    def start(self, child_objs: list) -> dict:
         # child_objs will contain None's from variable definitions, remove
-        # those (only keep properties)
-        properties_objects = [e for e in child_objs if e is not None]
+        # those (only keep properties), and dicts from included files
+        properties_objects = []
+        for obj in child_objs:
+            if obj is None:
+                continue
+            elif type(obj) is dict:
+                properties_objects += obj.items()
+            else:
+                properties_objects.append(obj)
 
         object_ = self._aggregate_duplicate_dict_items(properties_objects)
         return object_
 
-    def def_object(self, tree: ParseTree) -> tuple[str, dict]:
+    def def_object(self, child_objs: list) -> tuple[str, dict]:
         """
         Aggregate all properties & sub-objects (in the case of a simple
         object), or all numbered sub-objects (in the case of numbered
         sub-objects) of an object into one object (a dict), and return it
         alongside its identifier.
         """
-        # open new scope
-        self.properties.append({})
-
-        # collect object contents from subtrees
-        child_objs = self.visit_children(tree)
+        # the scope of this object was opened before its contents were
+        # interpreted
         object_identifier = child_objs[0].value
         has_numbered_objects = type(child_objs[1]) is tuple
         if not has_numbered_objects:
@@ -78,48 +193,105 @@ class ScriptInterpreter(Interpreter):
             fill_proto_objects: list[tuple[int, dict]] = []
 
             for number, obj in child_objs[1:]:
-                obj_filled = {}
-
-                # detect prototype object used for forward filling
-                if fill_forward := obj.get(self.FILL_FORWARD):
-                    fill_from_number, fill_ident = fill_forward
-                    assert fill_ident == object_identifier
-                    fill_proto_objects.append((fill_from_number, obj))
-
-                # apply forward filling (if applicable)
-                if fill_proto_objects:
-                    for fill_from_number, proto_obj in fill_proto_objects:
-                        if number >= fill_from_number:
-                            obj_filled |= proto_obj
-
-                # apply backward filling (if applicable)
-                if fill_backward := obj.get(self.FILL_BACKWARD):
-                    recalled_obj = overall_object[fill_backward]
-                    obj_filled |= recalled_obj
-
-                # finally, apply properties of the object itself
-                obj_filled |= obj
-                # remove special fill properties
-                obj_filled.pop(self.FILL_FORWARD, None)
-                obj_filled.pop(self.FILL_BACKWARD, None)
-                overall_object[number] = obj_filled
+                overall_object[number] = self._fill(
+                    object_identifier, number, obj, overall_object, fill_proto_objects
+                )
 
         # close scope
         self.properties.pop()
         return object_identifier, overall_object
 
-    def object_content(self, tree: ParseTree) -> dict:
-        child_objs = self.visit_children(tree)
+    def _fill(
+        self,
+        object_identifier: str,
+        number: int,
+        obj: dict,
+        overall_object: dict,
+        fill_proto_objects: list[tuple[int, dict]],
+    ) -> dict | LayeredDict:
+        """
+        Apply ObjFill logic to a numbered object.
+
+        :param overall_object: numbered objects filled so far, by number
+        :param fill_proto_objects: prototype objects found so far, to which
+                                   obj is added if it is a prototype
+        """
+        # detect prototype object used for forward filling
+        if fill_forward := obj.get(self.FILL_FORWARD):
+            fill_from_number, fill_ident = fill_forward
+            assert fill_ident == object_identifier
+            fill_proto_objects.append((fill_from_number, obj))
+
+        if self.layered_fill:
+            return self._fill_layered(number, obj, overall_object, fill_proto_objects)
+
+        obj_filled = {}
+
+        # apply forward filling (if applicable)
+        if fill_proto_objects:
+            for fill_from_number, proto_obj in fill_proto_objects:
+                if number >= fill_from_number:
+                    obj_filled |= proto_obj
+
+        # apply backward filling (if applicable)
+        if fill_backward := obj.get(self.FILL_BACKWARD):
+            recalled_obj = overall_object[fill_backward]
+            obj_filled |= recalled_obj
+
+        # finally, apply properties of the object itself
+        obj_filled |= obj
+        # remove special fill properties
+        obj_filled.pop(self.FILL_FORWARD, None)
+        obj_filled.pop(self.FILL_BACKWARD, None)
+        return obj_filled
+
+    def _fill_layered(
+        self,
+        number: int,
+        obj: dict,
+        overall_object: dict,
+        fill_proto_objects: list[tuple[int, dict]],
+    ) -> dict | LayeredDict:
+        """
+        Same as the regular ObjFill logic in def_object, except that objects
+        are filled by layering them over their prototypes instead of copying
+        all properties of the prototypes into each object.
+        """
+        # remove special fill properties
+        obj.pop(self.FILL_FORWARD, None)
+        fill_backward = obj.pop(self.FILL_BACKWARD, None)
+        is_proto = bool(fill_proto_objects) and fill_proto_objects[-1][1] is obj
+
+        # order layers by decreasing precedence
+        layers = []
+        if fill_backward:
+            # a snapshot, so that later writes to the recalled object (which
+            # is returned to the caller) do not show through
+            recalled_obj = overall_object[fill_backward]
+            if isinstance(recalled_obj, LayeredDict):
+                layers.append(recalled_obj.copy())
+            else:
+                layers.append(dict(recalled_obj))
+        for fill_from_number, proto_obj in reversed(
+            fill_proto_objects[:-1] if is_proto else fill_proto_objects
+        ):
+            if number >= fill_from_number:
+                layers.append(proto_obj)
+        if is_proto:
+            # Later objects are layered over a private copy of the prototype,
+            # as obj is returned to the caller, who may modify it.
+            fill_proto_objects[-1] = (fill_proto_objects[-1][0], dict(obj))
+        return LayeredDict(obj, tuple(layers)) if layers else obj
+
+    def object_content(self, child_objs: list) -> dict:
         object_ = self._aggregate_duplicate_dict_items(child_objs)
         return object_
 
-    def numbered_object(self, tree: ParseTree) -> tuple[int, dict[str, Any]]:
+    def numbered_object(self, child_objs: list) -> tuple[int, dict[str, Any]]:
         """
         Aggregate all properties and sub-objects of a numbered object into one
         object (a dict), and return it alongside its number.
         """
-        child_objs = self.visit_children(tree)
-
         object_contents = []
         number = None
         for obj in child_objs:
@@ -143,21 +315,21 @@ class ScriptInterpreter(Interpreter):
         object_ = self._aggregate_duplicate_dict_items(object_contents)
         return number, object_
 
-    def def_number_absolute(self, tree: ParseTree) -> tuple[str, Any]:
+    def def_number_absolute(self, children: list) -> tuple[str, Any]:
         """
         Define or overwrite the "Nummer" property in the current scope. Return
         the name the property and its new value.
         """
-        _, value = self.visit_children(tree)
+        _, value = children
         self.properties[-1][NUMMER] = value
         return NUMMER, value
 
-    def def_number_relative(self, tree: ParseTree) -> tuple[str, Any]:
+    def def_number_relative(self, children: list) -> tuple[str, Any]:
         """
         Modify the "Nummer" property in the current scope by adding some delta
         to it. Return the name the property and its new value.
         """
-        _, delta = self.visit_children(tree)
+        _, delta = children
 
         if NUMMER not in self.properties[-1]:
             # exception to cover the ugly first occurrence of "Nummer" in
@@ -169,58 +341,52 @@ class ScriptInterpreter(Interpreter):
 
         return NUMMER, new_value
 
-    def property_value(self, tree: ParseTree) -> Any | tuple:
-        value = self.visit_children(tree)
+    def property_value(self, value: list) -> Any | tuple:
         # unpack singleton list, tuple-ify list-typed values
         value = value[0] if len(value) == 1 else tuple(value)
         return value
 
-    def def_property_absolute(self, tree: ParseTree) -> tuple[str, Any]:
+    def def_property_absolute(self, children: list) -> tuple[str, Any]:
         """
         Define or overwrite a property in the current scope. Return the name
         the property and its new value.
         """
-        prop, value_tree = tree.children
-        value = self.visit(value_tree)
+        prop, value = children
         self.properties[-1][prop.value] = value
 
         return prop.value, value
 
-    def def_property_relative(self, tree: ParseTree) -> tuple[str, Any]:
+    def def_property_relative(self, children: list) -> tuple[str, Any]:
         """
         Modify a property in the current scope by adding some delta to it.
         Return the name the property and its new value.
         """
-        prop, delta_tree = tree.children
+        prop, delta = children
         if prop.value not in self.properties[-1]:
             raise ParseError(
-                f"Undefined property '{prop}' (line {tree.meta.line}, col {tree.meta.column})."
+                f"Undefined property '{prop}' (line {prop.line}, col {prop.column})."
             )
 
-        delta = self.visit(delta_tree)
         new_value = self.properties[-1][prop.value] + delta
         self.properties[-1][prop.value] = new_value
 
         return prop.value, new_value
 
-    def def_var_absolute(self, tree: ParseTree) -> None:
+    def def_var_absolute(self, children: list) -> None:
         """
         Define or overwrite a variable.
         """
-        var, arith_expr = tree.children
-        value = self.visit(arith_expr)
+        var, value = children
         self.vars[var.value] = value
 
-    def def_var_relative(self, tree: ParseTree) -> None:
+    def def_var_relative(self, children: list) -> None:
         """
         Modify a variable by adding some delta to it.
         """
-        var, arith_expr = tree.children
-        value = self.visit(arith_expr)
+        var, value = children
         self.vars[var.value] += value
 
-    def fill_expr(self, tree: ParseTree) -> tuple[str, tuple | int]:
-        child_objs = self.visit_children(tree)
+    def fill_expr(self, child_objs: list) -> tuple[str, tuple | int]:
         if len(child_objs) == 1:
             return self.FILL_BACKWARD, child_objs[0]
         elif len(child_objs) == 2:
@@ -229,8 +395,8 @@ class ScriptInterpreter(Interpreter):
         else:
             raise NotImplementedError
 
-    def binary_arith_expr(self, tree: ParseTree) -> int | float:
-        operand_a, operator, operand_b = self.visit_children(tree)
+    def binary_arith_expr(self, children: list) -> int | float:
+        operand_a, operator, operand_b = children
         if operator == "+":
             return operand_a + operand_b
         elif operator == "-":
@@ -238,59 +404,83 @@ class ScriptInterpreter(Interpreter):
         else:
             raise NotImplementedError
 
-    def unary_arith_expr(self, tree: ParseTree) -> int | float:
-        sign, literal_tree = tree.children
-        literal = self.visit(literal_tree)
+    def unary_arith_expr(self, children: list) -> int | float:
+        sign, literal = children
         return literal * -1 if sign == "-" else literal
 
-    def literal(self, tree: ParseTree) -> int | float:
-        s = tree.children[0]
+    def literal(self, children: list) -> int | float:
+        s = children[0]
         try:
             return int(s)
         except ValueError:
             return float(s)
 
-    def int_literal(self, tree: ParseTree) -> int:
-        return int(tree.children[0])
+    def int_literal(self, children: list) -> int:
+        return int(children[0])
 
-    def var_ref(self, tree: ParseTree) -> int | float:
+    def var_ref(self, children: list) -> int | float:
         """
         Look up the value of a variable, or, if unsuccessful, try to find an
         enum of the same name.
         """
-        var = tree.children[0].value
+        token = children[0]
+        var = token.value
         if var in self.vars:
+            self.lookup_stats["vars"] += 1
             return self.vars[var]
 
         # look up variable name in enums if it cannot be found
-        for enum_cls in self.enums:
-            try:
-                return enum_cls[var]
-            except KeyError:
-                continue
+        member = self.symbols.get(var)
+        if member is not None:
+            self.lookup_stats["enums"] += 1
+            if var in self.symbols.ambiguous:
+                self._warn_ambiguous(var, member)
+            return member
         raise ParseError(
-            f"Unknown variable '{var}' (line {tree.meta.line}, col {tree.meta.column}). It is not defined in this file, and was not found in predefined enums."
+            f"Unknown variable '{var}' (line {token.line}, col {token.column}). It is not defined in this file, and was not found in predefined enums."
         )
 
-    def property_ref(self, tree: ParseTree) -> int | float:
+    def _warn_ambiguous(self, var: str, member: enum.IntEnum) -> None:
+        self.lookup_stats["ambiguous"] += 1
+        if var not in self._warned_ambiguous:
+            self._warned_ambiguous.add(var)
+            candidates = ", ".join(self.symbols.ambiguous[var])
+            warnings.warn(
+                f"Identifier '{var}' is ambiguous ({candidates}), resolved to {member!r}."
+            )
+
+    def property_ref(self, children: list) -> int | float:
         """
         Look up the value of a property from the current scope.
         """
-        prop = tree.children[0].value
+        token = children[0]
+        prop = token.value
         try:
             return self.properties[-1][prop]
         except KeyError:
             raise ParseError(
-                f"Undefined property '{prop}' (line {tree.meta.line}, col {tree.meta.column})"
+                f"Undefined property '{prop}' (line {token.line}, col {token.column})"
             )
 
-    def property_index_ref(self, tree: ParseTree) -> int | float:
+    def property_index_ref(self, children: list) -> int | float:
         # TODO implement me
         raise NotImplementedError
 
-    def include_expr(self, tree: ParseTree):
-        # TODO implement me
-        raise NotImplementedError
+    def include_expr(self, children: list) -> Optional[dict]:
+        """
+        Interpret an included file (via include_resolver), adopt its variables
+        and return its objects and properties, if there are any.
+        """
+        filename = children[0]
+        if self.include_resolver is None:
+            raise ParseError(
+                f"Cannot include '{filename}' (line {filename.line}, col {filename.column}) without knowing the path of the including file."
+            )
+        included = self.include_resolver(filename.value, self.include_stack)
+        self.include_dependencies += included.dependencies
+        self.vars.update(included.vars)
+        # included results are shared, do not hand them out for modification
+        return copy.deepcopy(included.obj) if included.obj else None
 
     @staticmethod
     def _aggregate_duplicate_dict_items(dict_items: list[tuple]) -> dict:
@@ -309,3 +499,24 @@ class ScriptInterpreter(Interpreter):
             else:
                 aggregated[k] = [aggregated[k], v]
         return aggregated
+
+
+class ScopePostLex(PostLex):
+    """
+    Objects open a new property scope before their contents are interpreted,
+    which an inline (bottom-up) transformer cannot do by itself. This
+    post-lexer opens the scope instead: token streams are consumed lazily by
+    the LALR parser, so once the token after "Objekt" is requested, all
+    reductions preceding the object have been completed.
+    """
+
+    always_accept = ()
+
+    def __init__(self, interpreter: ScriptInterpreter):
+        self.interpreter = interpreter
+
+    def process(self, stream: Iterator[Token]) -> Iterator[Token]:
+        for token in stream:
+            yield token
+            if token.type == "OBJEKT":
+                self.interpreter.open_scope()
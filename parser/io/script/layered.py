@@ -0,0 +1,125 @@
+import itertools
+from collections.abc import Mapping, MutableMapping
+from typing import Any, Iterator, Optional
+
+
+class LayeredDict(MutableMapping):
+    """
+    Mutable mapping made up of a dict of its own items on top of read-only
+    layers, such as the prototype objects an object was filled from via
+    ObjFill. Layers are shared between many objects and never copied or
+    modified: writes and deletions only affect the own items of an object
+    (copy-on-write). Layers must not be modified by anyone else either,
+    hence they are private copies rather than objects handed out elsewhere.
+
+    Iteration order is that of a dict obtained by updating an empty dict
+    with each layer from lowest to highest precedence, and finally with the
+    own items.
+    """
+
+    __slots__ = ("own", "layers", "_deleted")
+
+    def __init__(self, own: dict, layers: tuple[Mapping, ...]):
+        """
+        :param own: items of the object itself, taking precedence over layers
+        :param layers: layers in order of decreasing precedence
+        """
+        self.own = own
+        self.layers = layers
+        # keys of layer items which were deleted from this object
+        self._deleted: Optional[set] = None
+
+    def __getitem__(self, key: Any) -> Any:
+        own = self.own
+        if key in own:
+            return own[key]
+        if self._deleted is None or key not in self._deleted:
+            for layer in self.layers:
+                if key in layer:
+                    return layer[key]
+        raise KeyError(key)
+
+    def __contains__(self, key: Any) -> bool:
+        if key in self.own:
+            return True
+        if self._deleted is not None and key in self._deleted:
+            return False
+        return any(key in layer for layer in self.layers)
+
+    def __setitem__(self, key: Any, value: Any) -> None:
+        self.own[key] = value
+        if self._deleted is not None:
+            self._deleted.discard(key)
+
+    def __delitem__(self, key: Any) -> None:
+        if key not in self:
+            raise KeyError(key)
+        self.own.pop(key, None)
+        if any(key in layer for layer in self.layers):
+            if self._deleted is None:
+                self._deleted = set()
+            self._deleted.add(key)
+
+    def __iter__(self) -> Iterator:
+        # keys of layers first (including own keys overriding them), then
+        # the remaining own keys, without merging the items into a dict
+        layer_keys = self._layer_keys()
+        deleted = self._deleted or ()
+        for key in layer_keys:
+            if key not in deleted:
+                yield key
+        for key in self.own:
+            if key not in layer_keys:
+                yield key
+
+    def __len__(self) -> int:
+        layer_keys = self._layer_keys()
+        num_own = sum(1 for key in self.own if key not in layer_keys)
+        return len(layer_keys) - len(self._deleted or ()) + num_own
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.materialize()!r})"
+
+    def copy(self) -> "LayeredDict":
+        """
+        Return a shallow copy, sharing the layers (but not the own items) of
+        this object.
+        """
+        copied = LayeredDict(dict(self.own), self.layers)
+        if self._deleted is not None:
+            copied._deleted = set(self._deleted)
+        return copied
+
+    def _layer_keys(self) -> Mapping:
+        """
+        Return the keys of all layers, in iteration order, as a mapping.
+        """
+        layers = self.layers
+        if len(layers) == 1:
+            return layers[0]
+        return dict.fromkeys(itertools.chain.from_iterable(reversed(layers)))
+
+    def materialize(self) -> dict:
+        """
+        Return a plain (shallow) dict with the items of this object.
+        """
+        materialized = {}
+        for layer in reversed(self.layers):
+            materialized.update(layer)
+        materialized.update(self.own)
+        if self._deleted is not None:
+            for key in self._deleted:
+                materialized.pop(key, None)
+        return materialized
+
+
+def materialize(obj: Any) -> Any:
+    """
+    Recursively convert all LayeredDicts in an interpreted script into plain
+    dicts.
+    """
+    if isinstance(obj, Mapping):
+        return {k: materialize(v) for k, v in obj.items()}
+    elif type(obj) is list:
+        return [materialize(e) for e in obj]
+    return obj
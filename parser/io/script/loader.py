@@ -1,30 +1,69 @@
+import contextlib
 import enum
+import functools
+import hashlib
+import importlib.util
+import os
 import pathlib
-from importlib.resources import files, as_file
-from typing import Optional, Any, Type
-
-from lark import Lark, ParseTree
+import sys
+from collections.abc import Iterable, Iterator, Mapping
+from typing import TYPE_CHECKING, Optional, Any, Type
 
 from parser.game.constants import (
     HAEUSER_COD,
     MAXPRODCNT,
     RADIUS_HQ,
     RADIUS_MARKT,
-    Resource,
-    InfrastructureLevel,
-    BuildingKind,
-    AudioSample,
-    Ruins,
-    Character,
-    OreSize,
-    AnimationType,
     FIGUREN_COD,
     NOOBJEKT,
-    CharacterType,
-    Formation,
     PROPERTY_NUM_ROTATIONS,
 )
-from parser.io.script.interpreter import ScriptInterpreter
+from parser.io.cod import read_script, write_cod
+from parser.io.script.emitter import ScriptEmitter
+from parser.io.script.grammar import get_lark, build_lark, grammar_hash
+from parser.io.script.include import (
+    INCLUDE_CACHE,
+    CircularIncludeError,
+    IncludeResult,
+    FileStamp,
+    find_include,
+)
+from parser.io.script.profiling import (
+    DECODE,
+    INTERPRET,
+    PARSE,
+    POST_PROCESS,
+    LoadStats,
+    Profiler,
+)
+from parser.io.script.result_cache import ResultCache, make_key
+
+# Modules depending on lark are imported where they are used, so that
+# importing this module is cheap, e.g. for only decoding COD files or loading
+# cached results. The enums of the game are created on first use as well (see
+# parser.game.constants).
+if TYPE_CHECKING:
+    import concurrent.futures
+
+    from lark import Lark, ParseTree
+
+    from parser.io.script.events import EventInterpreter, ScriptEvent
+    from parser.io.script.interpreter import ScriptInterpreter
+    from parser.io.script.program import ScriptProgram
+    from parser.io.script.scanner import ScriptParser
+
+# modules besides those of loaders whose code affects results, part of the
+# configuration of cached results
+_RESULT_MODULES = (
+    "parser.io.script.interpreter",
+    "parser.io.script.scanner",
+    "parser.io.script.layered",
+    "parser.io.script.symbols",
+    "parser.game.constants",
+)
+
+# stands in for the contexts of a profiler, if there is none
+_NULL_CONTEXT = contextlib.nullcontext()
 
 
 class CodGadLoader:
@@ -32,14 +71,85 @@ class CodGadLoader:
     Generic COD/GAD content loader.
     """
 
-    def __init__(self):
-        traversable = files("parser.io.script").joinpath("grammar.lark")
-        with as_file(traversable) as lark_path, open(lark_path) as f:
-            self.lark = Lark(f, propagate_positions=True, parser="lalr")
+    BACKEND_LARK = "lark"
+    BACKEND_SCANNER = "scanner"
+
+    def __init__(
+        self,
+        single_pass: bool = False,
+        backend: str = BACKEND_LARK,
+        layered_fill: bool = False,
+        result_cache: Optional[ResultCache] = None,
+        executor: Optional["concurrent.futures.Executor"] = None,
+        num_shards: Optional[int] = None,
+        profiler: Optional[Profiler] = None,
+    ):
+        """
+        :param single_pass: if True, interpret scripts while parsing them in
+                            `parse_interpret`, without building a parse tree
+        :param backend: parser used in `parse_interpret`, either the parser
+                        generated from grammar.lark (BACKEND_LARK), or the
+                        dedicated ScriptParser (BACKEND_SCANNER), which always
+                        interprets in a single pass
+        :param layered_fill: if True, numbered objects filled via ObjFill
+                             share the properties of their prototypes instead
+                             of copying them (see LayeredDict)
+        :param result_cache: cache for results of `parse_interpret`, may be
+                             shared between loaders
+        :param executor: if given, scripts are split into shards which are
+                         parsed in parallel on this executor (usually a
+                         ProcessPoolExecutor, see `sharding.create_executor`)
+                         in `parse_interpret` (two-pass only) and `compile`
+        :param num_shards: number of shards to split scripts into, defaults to
+                           the number of CPUs
+        :param profiler: if given, records the time of each phase of `load`
+                         and `parse_interpret`, see Profiler
+        """
+        if backend not in (self.BACKEND_LARK, self.BACKEND_SCANNER):
+            raise ValueError(f"Unknown parser backend '{backend}'.")
+        self.layered_fill = layered_fill
+        # the parser and the interpreter are created on first use
+        self._lark = None
+        self._interpreter = None
 
-        external_vars = self._get_external_vars()
-        enums = self._get_enums()
-        self.interpreter = ScriptInterpreter(external_vars=external_vars, enums=enums)
+        self.single_pass = single_pass
+        self.backend = backend
+        self.result_cache = result_cache
+        self._result_cache_config = None
+        self._single_pass_lark = None
+        self._event_lark = None
+        self._event_interpreter = None
+        self._script_parser = None
+        self._emitter = None
+        self.executor = executor
+        self.num_shards = num_shards or os.cpu_count() or 1
+        self.profiler = profiler
+
+    @property
+    def lark(self) -> "Lark":
+        # the compiled parser is shared by all loaders
+        if self._lark is None:
+            self._lark = get_lark()
+        return self._lark
+
+    @property
+    def interpreter(self) -> "ScriptInterpreter":
+        if self._interpreter is None:
+            self._interpreter = self._create_interpreter()
+        return self._interpreter
+
+    def warm_up(self) -> None:
+        """
+        Create the parser and the interpreter `load` uses now rather than on
+        first use, e.g. in a worker process before it receives scripts.
+        """
+        self.interpreter
+        if self.backend == self.BACKEND_SCANNER:
+            self._get_script_parser()
+        elif self.single_pass:
+            self._get_single_pass_lark()
+        else:
+            self.lark
 
     def accepts(self, path: pathlib.Path) -> bool:
         return path.suffix.lower() in (".cod", ".gad", ".inc")
@@ -50,17 +160,362 @@ class CodGadLoader:
     def _get_enums(self) -> Optional[list[Type[enum.IntEnum]]]:
         return None
 
-    def parse_interpret(self, file_content: str) -> Any:
-        tree = self.parse(file_content)
-        obj = self.interpreter.visit(tree)
-        return self._post_process(obj)
+    def _create_interpreter(
+        self,
+        external_vars: Optional[dict[str, Any]] = None,
+        interpreter_cls: Optional[Type["ScriptInterpreter"]] = None,
+    ) -> "ScriptInterpreter":
+        if interpreter_cls is None:
+            from parser.io.script.interpreter import ScriptInterpreter
+
+            interpreter_cls = ScriptInterpreter
+        if external_vars is None:
+            external_vars = self._get_external_vars()
+        return interpreter_cls(
+            external_vars=external_vars,
+            enums=self._get_enums(),
+            layered_fill=self.layered_fill,
+        )
+
+    def load(self, path: pathlib.Path) -> Any:
+        """
+        Read and interpret a script file, decoding COD files.
+        """
+        with self._profile_load(path):
+            with self._profile_phase(DECODE):
+                file_content = read_script(path)
+            return self.parse_interpret(file_content, path)
+
+    def parse_interpret(
+        self,
+        file_content: str,
+        path: Optional[pathlib.Path] = None,
+        select: Optional[Iterable[str]] = None,
+    ) -> Any:
+        """
+        :param file_content: script to interpret
+        :param path: path of the script, needed for resolving Include
+                     statements relative to it
+        :param select: if given, only interpret the top-level objects with
+                       these identifiers, each on first access (see
+                       LazyScript), bypassing the result cache
+        """
+        if select is not None:
+            from parser.io.script.selective import LazyScript
+
+            return LazyScript(self, file_content, path, select)
+
+        with self._profile_load(path):
+            return self._parse_interpret(file_content, path)
+
+    def _parse_interpret(self, file_content: str, path: Optional[pathlib.Path]) -> Any:
+        include_dir = path.parent if path else None
+        if self.result_cache is not None:
+            key = make_key(
+                file_content,
+                self._get_result_cache_config(),
+                str(include_dir.resolve()) if include_dir else None,
+            )
+            obj = self.result_cache.get(key)
+            if obj is not None:
+                return obj
 
-    def parse(self, file_content: str) -> ParseTree:
+        self._set_include_dir(self.interpreter, include_dir)
+        profiler = self.profiler
+        if self.backend == self.BACKEND_SCANNER:
+            with self._profile_phase(PARSE):
+                obj = self._get_script_parser().parse_interpret(file_content)
+        elif self.single_pass:
+            single_pass_lark = self._get_single_pass_lark()
+            if profiler is None:
+                obj = single_pass_lark.parse(file_content)
+            else:
+                obj = profiler.parse(single_pass_lark, file_content)
+        elif self.executor is not None:
+            with self._profile_phase(PARSE):
+                program = self.compile(file_content)
+            with self._profile_phase(INTERPRET), self._profile_rules():
+                obj = program.run(self.interpreter)
+        else:
+            if profiler is None:
+                tree = self.parse(file_content)
+            else:
+                tree = profiler.parse(self.lark, file_content)
+            with self._profile_phase(INTERPRET), self._profile_rules():
+                obj = self.interpreter.visit(tree)
+        with self._profile_phase(POST_PROCESS):
+            obj = self._post_process(obj)
+
+        if self.result_cache is not None:
+            dependencies = tuple(self.interpreter.include_dependencies)
+            self.result_cache.put(key, obj, dependencies)
+        return obj
+
+    def parse(self, file_content: str) -> "ParseTree":
         return self.lark.parse(file_content)
 
+    def iter_events(
+        self, file_content: str, path: Optional[pathlib.Path] = None
+    ) -> Iterator["ScriptEvent"]:
+        """
+        Interpret a script while parsing it, and yield ScriptEvents as they
+        occur, instead of returning the result at the end (see
+        EventInterpreter). Top-level objects and their numbered objects are
+        post-processed before they are reported. Only one stream of events
+        per loader can be consumed at a time.
+
+        :param file_content: script to interpret
+        :param path: path of the script, needed for resolving Include
+                     statements relative to it
+        """
+        interpreter = self._get_event_interpreter()
+        interpreter.reset(dict(self._get_external_vars() or {}))
+        self._set_include_dir(interpreter, path.parent if path else None)
+        parser = self._event_lark.parse_interactive(file_content)
+        events = interpreter.events
+        for _ in parser.iter_parse():
+            if events:
+                yield from self._post_process_events(events)
+                events.clear()
+        parser.feed_eof()
+        yield from self._post_process_events(events)
+        events.clear()
+
+    def _post_process_events(self, events: list["ScriptEvent"]) -> list["ScriptEvent"]:
+        from parser.io.script.events import END_OBJECT, NUMBERED_OBJECT, SET_PROPERTY
+
+        for i, event in enumerate(events):
+            if event.path:
+                continue
+            elif event.kind == NUMBERED_OBJECT:
+                value = self._post_process_numbered(
+                    event.name, event.number, event.value
+                )
+                events[i] = event._replace(value=value)
+            elif event.kind in (END_OBJECT, SET_PROPERTY):
+                value = self._post_process_object(event.name, event.value)
+                events[i] = event._replace(value=value)
+        return events
+
+    def compile(self, file_content: str) -> "ScriptProgram":
+        """
+        Parse a script into a ScriptProgram, which can be run repeatedly with
+        different external variables via `run`.
+        """
+        if self.executor is not None:
+            from parser.io.script.sharding import compile_sharded
+
+            return compile_sharded(file_content, self.num_shards, self.executor)
+        from parser.io.script.program import compile_tree
+
+        return compile_tree(self.parse(file_content), self.interpreter)
+
+    def run(
+        self,
+        program: "ScriptProgram",
+        external_vars: Optional[dict[str, Any]] = None,
+        path: Optional[pathlib.Path] = None,
+    ) -> Any:
+        """
+        Interpret a compiled script from scratch, as `parse_interpret` would.
+
+        :param program: compiled script
+        :param external_vars: external variables overriding those of the
+                              loader, e.g. `{RADIUS_HQ: 12}`
+        :param path: path of the script, needed for resolving Include
+                     statements relative to it
+        """
+        external_vars = (self._get_external_vars() or {}) | (external_vars or {})
+        interpreter = self._create_interpreter(dict(external_vars))
+        include_dir = path.parent if path else None
+        self._set_include_dir(interpreter, include_dir, external_vars)
+        return self._post_process(program.run(interpreter))
+
+    def emit(self, obj: Mapping) -> str:
+        """
+        Turn an interpreted script back into script text, see ScriptEmitter.
+        """
+        return self._get_emitter().emit(obj)
+
+    def write_cod_variants(
+        self, variants: Iterable[tuple[pathlib.Path, Mapping]]
+    ) -> None:
+        """
+        Emit many interpreted scripts (e.g. modified variants of HAEUSER.COD)
+        and write them to COD binary files.
+
+        :param variants: paths to write to, with the interpreted scripts
+        """
+        emitter = self._get_emitter()
+        for path, obj in variants:
+            write_cod(path, emitter.emit(obj))
+
     def _post_process(self, obj: Any) -> Any:
+        for key, value in obj.items():
+            obj[key] = self._post_process_object(key, value)
+        return obj
+
+    def _post_process_object(self, key: str, value: Any) -> Any:
+        """
+        Post-process a top-level object or property of an interpreted script.
+        """
+        if isinstance(value, Mapping):
+            for number, obj in value.items():
+                if isinstance(number, int):
+                    value[number] = self._post_process_numbered(key, number, obj)
+        return value
+
+    def _post_process_numbered(self, ident: str, number: Any, obj: Any) -> Any:
+        """
+        Post-process a numbered object of a top-level object.
+        """
         return obj
 
+    def _profile_load(
+        self, path: Optional[pathlib.Path]
+    ) -> contextlib.AbstractContextManager[Optional[LoadStats]]:
+        if self.profiler is None:
+            return _NULL_CONTEXT
+        return self.profiler.load(path)
+
+    def _profile_phase(self, name: str) -> contextlib.AbstractContextManager:
+        if self.profiler is None:
+            return _NULL_CONTEXT
+        return self.profiler.phase(name)
+
+    def _profile_rules(self) -> contextlib.AbstractContextManager:
+        if self.profiler is None:
+            return _NULL_CONTEXT
+        return self.profiler.rules(self.interpreter)
+
+    def _get_single_pass_lark(self) -> "Lark":
+        # this parser is bound to our interpreter, so it cannot be shared
+        if self._single_pass_lark is None:
+            self._single_pass_lark = build_lark(
+                propagate_positions=False,
+                transformer=self.interpreter,
+                postlex=self.interpreter.postlex,
+            )
+        return self._single_pass_lark
+
+    def _get_event_interpreter(self) -> "EventInterpreter":
+        # like the single pass parser, the parser is bound to the interpreter
+        if self._event_lark is None:
+            from parser.io.script.events import EventInterpreter, EventPostLex
+
+            self._event_interpreter = self._create_interpreter(
+                interpreter_cls=EventInterpreter
+            )
+            self._event_lark = build_lark(
+                propagate_positions=False,
+                transformer=self._event_interpreter,
+                postlex=EventPostLex(self._event_interpreter),
+            )
+        return self._event_interpreter
+
+    def _get_result_cache_config(self) -> tuple:
+        """
+        Everything besides the script itself that results depend on.
+        """
+        if self._result_cache_config is None:
+            loader_cls = type(self)
+            enums = self._get_enums() or []
+            external_vars = self._get_external_vars() or {}
+            self._result_cache_config = (
+                f"{loader_cls.__module__}.{loader_cls.__qualname__}",
+                grammar_hash(),
+                tuple(sorted(external_vars.items())),
+                tuple((e.__qualname__, tuple(e.__members__.items())) for e in enums),
+                self.layered_fill,
+                # changes to the interpreter or loader code (e.g. post
+                # processing) affect results too
+                tuple(_source_hash(module) for module in self._get_code_modules()),
+            )
+        return self._result_cache_config
+
+    def _get_code_modules(self) -> list[str]:
+        modules = [cls.__module__ for cls in type(self).__mro__[:-1]]
+        modules += _RESULT_MODULES
+        return list(dict.fromkeys(modules))
+
+    def _set_include_dir(
+        self,
+        interpreter: "ScriptInterpreter",
+        include_dir: Optional[pathlib.Path],
+        external_vars: Optional[dict[str, Any]] = None,
+    ) -> None:
+        """
+        :param external_vars: external variables for interpreting included
+                              files, defaults to those of the loader
+        """
+        interpreter.include_dependencies = []
+        if include_dir is None:
+            interpreter.include_resolver = None
+        else:
+            if external_vars is None:
+                external_vars = self._get_external_vars() or {}
+            interpreter.include_resolver = functools.partial(
+                self._resolve_include, include_dir, external_vars
+            )
+
+    def _resolve_include(
+        self,
+        include_dir: pathlib.Path,
+        external_vars: dict[str, Any],
+        filename: str,
+        include_stack: tuple[pathlib.Path, ...],
+    ) -> IncludeResult:
+        path = find_include(include_dir, filename).resolve()
+        if path in include_stack:
+            cycle = include_stack[include_stack.index(path) :] + (path,)
+            raise CircularIncludeError(
+                "Circular include: " + " -> ".join(p.name for p in cycle)
+            )
+        config_key = (
+            tuple(self._get_enums() or []),
+            tuple(sorted(external_vars.items())),
+            self.layered_fill,
+        )
+        evaluate = functools.partial(
+            self._interpret_include, external_vars, include_stack + (path,)
+        )
+        return INCLUDE_CACHE.get(path, config_key, evaluate)
+
+    def _interpret_include(
+        self,
+        external_vars: dict[str, Any],
+        include_stack: tuple[pathlib.Path, ...],
+        path: pathlib.Path,
+        stamp: FileStamp,
+    ) -> IncludeResult:
+        # included files are interpreted from scratch with a fresh interpreter
+        interpreter = self._create_interpreter(dict(external_vars))
+        interpreter.include_stack = include_stack
+        self._set_include_dir(interpreter, path.parent, external_vars)
+        file_content = path.read_text(encoding="cp1252")
+        if self.backend == self.BACKEND_SCANNER:
+            from parser.io.script.scanner import ScriptParser
+
+            obj = ScriptParser(interpreter).parse_interpret(file_content)
+        else:
+            obj = interpreter.visit(self.parse(file_content))
+        dependencies = ((path, stamp), *interpreter.include_dependencies)
+        return IncludeResult(obj, interpreter.vars, dependencies)
+
+    def _get_emitter(self) -> ScriptEmitter:
+        if self._emitter is None:
+            self._emitter = ScriptEmitter(
+                enums=self._get_enums(), external_vars=self._get_external_vars()
+            )
+        return self._emitter
+
+    def _get_script_parser(self) -> "ScriptParser":
+        if self._script_parser is None:
+            from parser.io.script.scanner import ScriptParser
+
+            self._script_parser = ScriptParser(self.interpreter)
+        return self._script_parser
+
 
 class HaeuserCodLoader(CodGadLoader):
     def accepts(self, path: pathlib.Path) -> bool:
@@ -75,6 +530,17 @@ class HaeuserCodLoader(CodGadLoader):
         }
 
     def _get_enums(self) -> Optional[list[Type[enum.IntEnum]]]:
+        from parser.game.constants import (
+            AnimationType,
+            AudioSample,
+            BuildingKind,
+            Character,
+            InfrastructureLevel,
+            OreSize,
+            Resource,
+            Ruins,
+        )
+
         return [
             Resource,
             InfrastructureLevel,
@@ -95,6 +561,15 @@ class FigurenCodLoader(CodGadLoader):
         return {NOOBJEKT: -1}
 
     def _get_enums(self) -> Optional[list[Type[enum.IntEnum]]]:
+        from parser.game.constants import (
+            AnimationType,
+            AudioSample,
+            Character,
+            CharacterType,
+            Formation,
+            Resource,
+        )
+
         return [
             CharacterType,
             Character,
@@ -104,48 +579,76 @@ class FigurenCodLoader(CodGadLoader):
             Resource,
         ]
 
-    def _post_process(self, obj: Any) -> Any:
-        # Several "Rotate" properties in FIGUREN.COD are incorrect, we fix
-        # those here:
-        # - all ships have "Rotate: 1" which should be 8
-        # - bow wave animations have "Rotate: 12" which should be 8
-        # - flags have "Rotate: 8" which should be 1
-        # - cannon effects have "Rotate: 16" which should be 8
-        # - ship sinking effect has "Rotate: 36" which should be 8
-        # - juggler has "Rotate: 8" which should be 4
-        fixed_rotations_by_character = {
-            8: [
-                Character.HANDEL1,
-                Character.HANDELD1,
-                Character.HANDEL2,
-                Character.HANDELD2,
-                Character.KRIEG1,
-                Character.KRIEGD1,
-                Character.KRIEG2,
-                Character.KRIEGD2,
-                Character.HANDLER,
-                Character.HANDLERD,
-                Character.PIRAT,
-                Character.PIRATD,
-                Character.BUGH,
-                Character.KANONSHOT1,
-                Character.KANONSHOT2,
-                Character.KANONSHOTTURM,
-                Character.KANONSHOTTURM2,
-                Character.UNTERGANG,
-            ],
-            4: [Character.GAUKLER1],
-            1: [
-                Character.FAHNE1,
-                Character.FAHNE2,
-                Character.FAHNE3,
-                Character.FAHNE4,
-                Character.FAHNEPIRAT,
-                Character.FAHNEWEISS,
-            ],
+    # Several "Rotate" properties in FIGUREN.COD are incorrect, we fix those
+    # here:
+    # - all ships have "Rotate: 1" which should be 8
+    # - bow wave animations have "Rotate: 12" which should be 8
+    # - flags have "Rotate: 8" which should be 1
+    # - cannon effects have "Rotate: 16" which should be 8
+    # - ship sinking effect has "Rotate: 36" which should be 8
+    # - juggler has "Rotate: 8" which should be 4
+    # Characters are given by name, so that their enum is only created once
+    # needed.
+    _FIXED_ROTATIONS_BY_CHARACTER = {
+        8: [
+            "HANDEL1",
+            "HANDELD1",
+            "HANDEL2",
+            "HANDELD2",
+            "KRIEG1",
+            "KRIEGD1",
+            "KRIEG2",
+            "KRIEGD2",
+            "HANDLER",
+            "HANDLERD",
+            "PIRAT",
+            "PIRATD",
+            "BUGH",
+            "KANONSHOT1",
+            "KANONSHOT2",
+            "KANONSHOTTURM",
+            "KANONSHOTTURM2",
+            "UNTERGANG",
+        ],
+        4: ["GAUKLER1"],
+        1: [
+            "FAHNE1",
+            "FAHNE2",
+            "FAHNE3",
+            "FAHNE4",
+            "FAHNEPIRAT",
+            "FAHNEWEISS",
+        ],
+    }
+
+    @functools.cached_property
+    def _fixed_rotations(self) -> dict[enum.IntEnum, int]:
+        from parser.game.constants import Character
+
+        return {
+            Character[name]: fixed_rotation
+            for fixed_rotation, names in self._FIXED_ROTATIONS_BY_CHARACTER.items()
+            for name in names
         }
 
-        for fixed_rotation, characters in fixed_rotations_by_character.items():
-            for character in characters:
-                obj["FIGUR"][character][PROPERTY_NUM_ROTATIONS] = fixed_rotation
+    def _post_process_numbered(self, ident: str, number: Any, obj: Any) -> Any:
+        if ident == "FIGUR" and number in self._fixed_rotations:
+            obj[PROPERTY_NUM_ROTATIONS] = self._fixed_rotations[number]
         return obj
+
+
+@functools.cache
+def _source_hash(module_name: str) -> str:
+    path = getattr(sys.modules.get(module_name), "__file__", None)
+    if path is None:
+        # modules imported on first use, such as the interpreter's
+        try:
+            path = importlib.util.find_spec(module_name).origin
+        except (AttributeError, ImportError, ValueError):
+            pass
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except (OSError, TypeError):
+        # e.g. interactively defined loaders
+        return module_name
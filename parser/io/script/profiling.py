@@ -0,0 +1,284 @@
+import contextlib
+import pathlib
+import time
+import tracemalloc
+from collections.abc import Callable, Iterator
+from typing import TYPE_CHECKING, Any, Optional
+
+if TYPE_CHECKING:
+    from lark import Lark
+
+    from parser.io.script.interpreter import ScriptInterpreter
+
+# phases of loading a script
+# reading and decoding the script file
+DECODE = "decode"
+# tokenizing the script, interleaved with parsing
+LEX = "lex"
+# parsing the script, without lexing (backends which interpret while parsing
+# record interpreting under this phase too)
+PARSE = "parse"
+# interpreting the parse tree (or compiled program)
+INTERPRET = "interpret"
+# loader-specific post-processing, see `CodGadLoader._post_process`
+POST_PROCESS = "post_process"
+
+
+class PhaseStats:
+    """
+    Wall time and allocations of a phase, summed over all times it ran.
+    """
+
+    __slots__ = ("calls", "seconds", "peak_bytes")
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        # highest peak of memory allocated during any run of the phase, above
+        # what was allocated at its start (only with allocation tracing)
+        self.peak_bytes = 0
+
+    def __repr__(self) -> str:
+        return (
+            f"PhaseStats(calls={self.calls}, seconds={self.seconds:.6f}, "
+            f"peak_bytes={self.peak_bytes})"
+        )
+
+
+class RuleStats:
+    """
+    Calls of the handler of a grammar rule in ScriptInterpreter, and the
+    time spent in them. Handlers are called with their children interpreted
+    already, so the time does not include the time of the children.
+    """
+
+    __slots__ = ("calls", "seconds")
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+
+    def __repr__(self) -> str:
+        return f"RuleStats(calls={self.calls}, seconds={self.seconds:.6f})"
+
+
+class LoadStats:
+    """
+    Stats of loading one script, or of several loads combined.
+    """
+
+    def __init__(self, path: Optional[pathlib.Path] = None):
+        """
+        :param path: path of the script, if known
+        """
+        self.path = path
+        self.phases: dict[str, PhaseStats] = {}
+        self.rules: dict[str, RuleStats] = {}
+
+    @property
+    def seconds(self) -> float:
+        """
+        Total time of all phases.
+        """
+        return sum(stats.seconds for stats in self.phases.values())
+
+    def merge(self, other: "LoadStats") -> None:
+        """
+        Add the stats of another load to these.
+        """
+        for name, stats in other.phases.items():
+            own = self.phases.setdefault(name, PhaseStats())
+            own.calls += stats.calls
+            own.seconds += stats.seconds
+            own.peak_bytes = max(own.peak_bytes, stats.peak_bytes)
+        for rule, stats in other.rules.items():
+            own = self.rules.setdefault(rule, RuleStats())
+            own.calls += stats.calls
+            own.seconds += stats.seconds
+
+    def format(self, num_rules: int = 10) -> str:
+        """
+        Format the stats as a table of phases, followed by the rules taking
+        the most time.
+
+        :param num_rules: number of rules to include
+        """
+        lines = [f"{'phase':<14} {'calls':>7} {'seconds':>10} {'peak MB':>8}"]
+        for name, stats in self.phases.items():
+            lines.append(
+                f"{name:<14} {stats.calls:>7} {stats.seconds:>10.4f} "
+                f"{stats.peak_bytes / 1e6:>8.2f}"
+            )
+        if self.rules:
+            lines.append("")
+            lines.append(f"{'rule':<24} {'calls':>7} {'seconds':>10}")
+            rules = sorted(self.rules.items(), key=lambda item: -item[1].seconds)
+            for rule, stats in rules[:num_rules]:
+                lines.append(f"{rule:<24} {stats.calls:>7} {stats.seconds:>10.4f}")
+        return "\n".join(lines)
+
+
+class Profiler:
+    """
+    Opt-in instrumentation of CodGadLoader (see its `profiler` parameter):
+    records the wall time of each phase of loading a script (DECODE, LEX,
+    PARSE, INTERPRET, POST_PROCESS) and, optionally, the memory allocated
+    during each phase. Also records the calls and time of each rule handler
+    of ScriptInterpreter, whenever a parse tree or compiled program is
+    interpreted. Loaders without profiler skip all of this.
+
+    Each load results in a LoadStats, which is passed to the sink (if any),
+    kept as `last`, and added to `total`.
+    """
+
+    def __init__(
+        self,
+        trace_allocations: bool = False,
+        sink: Optional[Callable[[LoadStats], None]] = None,
+    ):
+        """
+        :param trace_allocations: if True, record the peak memory of each
+                                  phase via tracemalloc, which slows down
+                                  loading considerably. Lexing and parsing
+                                  are interleaved, so allocations while lexing
+                                  are recorded under PARSE.
+        :param sink: called with the stats of each load once it is done
+                     (whether it succeeded or not)
+        """
+        self.trace_allocations = trace_allocations
+        self.sink = sink
+        self.total = LoadStats()
+        self.last: Optional[LoadStats] = None
+        self._current: Optional[LoadStats] = None
+
+    @contextlib.contextmanager
+    def load(self, path: Optional[pathlib.Path] = None) -> Iterator[LoadStats]:
+        """
+        Record the phases within this context as one load. Nested loads are
+        part of the outer load.
+        """
+        if self._current is not None:
+            yield self._current
+            return
+        started_tracing = self.trace_allocations and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        stats = self._current = LoadStats(path)
+        try:
+            yield stats
+        finally:
+            self._current = None
+            if started_tracing:
+                tracemalloc.stop()
+            self.last = stats
+            self.total.merge(stats)
+            if self.sink is not None:
+                self.sink(stats)
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> Iterator[PhaseStats]:
+        """
+        Record the time (and allocations) within this context as a phase of
+        the current load. Raises a RuntimeError outside of `load`.
+        """
+        stats = self._load_stats().phases.setdefault(name, PhaseStats())
+        tracing = self.trace_allocations and tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield stats
+        finally:
+            stats.seconds += time.perf_counter() - start
+            stats.calls += 1
+            if tracing:
+                peak = tracemalloc.get_traced_memory()[1] - baseline
+                stats.peak_bytes = max(stats.peak_bytes, peak)
+
+    def parse(self, lark: "Lark", text: str) -> Any:
+        """
+        Parse a script with a LALR parser, recording the time spent in its
+        lexer as LEX and the remaining time as PARSE. Raises a RuntimeError
+        outside of `load`.
+        """
+        # This drives lark's parser frontend directly to put a timed lexer in
+        # between, relying on internals of lark 1.1.5 (the version pinned in
+        # requirements.txt): Lark.parser.lexer, Lark.parser.parser.parse and
+        # LexerThread.from_text. test_profiler_lark_internals fails if they
+        # change.
+        from lark.lexer import LexerThread
+
+        stats = self._load_stats()
+        lex_stats = stats.phases.setdefault(LEX, PhaseStats())
+        lex_seconds = lex_stats.seconds
+        frontend = lark.parser
+        lexer = _TimedLexer(frontend.lexer, lex_stats)
+        parse_stats = stats.phases.setdefault(PARSE, PhaseStats())
+        try:
+            with self.phase(PARSE):
+                return frontend.parser.parse(
+                    LexerThread.from_text(lexer, text), lark.options.start[0]
+                )
+        finally:
+            lex_stats.calls += 1
+            # the time of the parse phase included lexing
+            parse_stats.seconds -= lex_stats.seconds - lex_seconds
+
+    @contextlib.contextmanager
+    def rules(self, interpreter: "ScriptInterpreter") -> Iterator[None]:
+        """
+        Record the calls of the rule handlers of an interpreter within this
+        context, as part of the current load. Raises a RuntimeError outside of
+        `load`.
+        """
+        rules = self._load_stats().rules
+        handlers = interpreter._handlers
+        interpreter._handlers = {
+            rule: _timed(handler, rules.setdefault(rule, RuleStats()))
+            for rule, handler in handlers.items()
+        }
+        try:
+            yield
+        finally:
+            interpreter._handlers = handlers
+
+    def _load_stats(self) -> LoadStats:
+        if self._current is None:
+            raise RuntimeError("Phases can only be recorded within Profiler.load().")
+        return self._current
+
+
+class _TimedLexer:
+    """
+    Wraps a lark lexer, adding the time spent producing tokens to a phase.
+    """
+
+    def __init__(self, lexer: Any, stats: PhaseStats):
+        self.lexer = lexer
+        self.stats = stats
+
+    def lex(self, lexer_state: Any, parser_state: Any) -> Iterator:
+        stats = self.stats
+        tokens = self.lexer.lex(lexer_state, parser_state)
+        while True:
+            start = time.perf_counter()
+            try:
+                token = next(tokens)
+            except StopIteration:
+                stats.seconds += time.perf_counter() - start
+                return
+            stats.seconds += time.perf_counter() - start
+            yield token
+
+
+def _timed(handler: Callable[[list], Any], stats: RuleStats) -> Callable:
+    def timed_handler(children: list) -> Any:
+        start = time.perf_counter()
+        try:
+            return handler(children)
+        finally:
+            stats.seconds += time.perf_counter() - start
+            stats.calls += 1
+
+    return timed_handler
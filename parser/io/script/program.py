@@ -0,0 +1,119 @@
+from typing import Any
+
+from lark import ParseTree, Tree
+
+from parser.io.script.interpreter import ScriptInterpreter
+
+# instructions of a ScriptProgram
+# push a constant (a token or a folded value) onto the value stack
+PUSH = 0
+# call a rule handler with the topmost values as children, arg is a tuple of
+# the rule's index in ScriptInterpreter.RULES and its number of children
+CALL = 1
+# open the property scope of an object
+OPEN_SCOPE = 2
+
+# rules whose results only depend on their children, which are folded into
+# constants if all of their children are constants
+_PURE_RULES = frozenset(
+    (
+        "literal",
+        "int_literal",
+        "unary_arith_expr",
+        "binary_arith_expr",
+        "property_value",
+    )
+)
+
+
+class ScriptProgram:
+    """
+    Flat, interpreter-independent form of a parsed script: the post-order
+    sequence of rule calls that `ScriptInterpreter.visit` performs for its
+    parse tree, with literals and arithmetic on literals folded into
+    constants. Running a program is equivalent to interpreting its parse
+    tree, but skips the tree walk, and since the program holds no state of
+    its own, it can be run any number of times, e.g. with different external
+    variables.
+    """
+
+    __slots__ = ("code",)
+
+    def __init__(self, code: list[tuple[int, Any]]):
+        """
+        :param code: instructions, as tuples of op code and argument
+        """
+        self.code = code
+
+    def __len__(self) -> int:
+        return len(self.code)
+
+    def run(self, interpreter: ScriptInterpreter) -> Any:
+        """
+        Interpret the script with a (fresh) interpreter.
+        """
+        return self.execute(interpreter).pop()
+
+    def execute(self, interpreter: ScriptInterpreter) -> list:
+        """
+        Run the instructions, and return the values left on the value stack.
+        Unlike `run`, this also works for programs made up of a part of the
+        instructions of a script.
+        """
+        handlers = [interpreter._handlers[rule] for rule in interpreter.RULES]
+        values = []
+        for op, arg in self.code:
+            if op == PUSH:
+                values.append(arg)
+            elif op == CALL:
+                rule_index, num_children = arg
+                base = len(values) - num_children
+                value = handlers[rule_index](values[base:])
+                del values[base:]
+                values.append(value)
+            else:
+                interpreter.open_scope()
+        return values
+
+
+def compile_tree(tree: ParseTree, interpreter: ScriptInterpreter) -> ScriptProgram:
+    """
+    Compile a parse tree into a ScriptProgram.
+
+    :param interpreter: interpreter used for folding constants, which must
+                        not be affected by the values of any variables
+    """
+    rule_indices = {rule: i for i, rule in enumerate(interpreter.RULES)}
+    code = []
+    # nodes whose children are being compiled, as tuples of rule name,
+    # iterator over remaining children, start of the node's instructions,
+    # and number of children
+    stack = []
+
+    node = tree
+    while True:
+        if node is not None:
+            if node.data == "def_object":
+                code.append((OPEN_SCOPE, None))
+            stack.append([node.data, iter(node.children), len(code), 0])
+            node = None
+
+        entry = stack[-1]
+        rule, children, start, _ = entry
+        for child in children:
+            entry[3] += 1
+            if isinstance(child, Tree):
+                node = child
+                break
+            code.append((PUSH, child))
+        else:
+            stack.pop()
+            num_children = entry[3]
+            if rule in _PURE_RULES and all(op == PUSH for op, _ in code[start:]):
+                args = [arg for _, arg in code[start:]]
+                del code[start:]
+                code.append((PUSH, getattr(interpreter, rule)(args)))
+            else:
+                code.append((CALL, (rule_indices[rule], num_children)))
+            if not stack:
+                return ScriptProgram(code)
@@ -0,0 +1,148 @@
+import hashlib
+import os
+import pathlib
+import pickle
+import tempfile
+import threading
+from collections import Counter, OrderedDict
+from typing import Any, Optional
+
+from parser.io.cache import get_cache_dir
+from parser.io.script.include import FileStamp, get_stamp
+
+# bump to invalidate all persisted results when the entry format changes
+_FORMAT_VERSION = 1
+
+
+class ResultCache:
+    """
+    Two-tier cache for results of `CodGadLoader.parse_interpret`: a bounded
+    in-memory LRU in front of a persistent on-disk store. Results are stored
+    pickled, so every caller receives its own copy.
+
+    Keys are computed by the loader from the script contents and everything
+    else the result depends on (loader class, grammar, external variables,
+    enum definitions, interpreter code). Results of scripts with Include
+    statements additionally remember the stamps of the included files, and
+    are discarded if those have changed.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 32,
+        cache_dir: Optional[pathlib.Path] = None,
+        persistent: bool = True,
+    ):
+        """
+        :param max_entries: maximum number of results kept in memory
+        :param cache_dir: directory for persisted results, defaults to a
+                          subdirectory of the global cache directory
+        :param persistent: if False, only cache results in memory
+        """
+        self.max_entries = max_entries
+        self.cache_dir = None
+        if persistent:
+            self.cache_dir = cache_dir or get_cache_dir() / "results"
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._memory: OrderedDict[str, bytes] = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = Counter(memory_hits=0, disk_hits=0, misses=0)
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Return the cached result for a key, or None.
+        """
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+        tier = "memory_hits"
+
+        if data is None and self.cache_dir is not None:
+            try:
+                data = (self.cache_dir / key).read_bytes()
+            except OSError:
+                pass
+            else:
+                tier = "disk_hits"
+                self._remember(key, data)
+
+        if data is not None:
+            try:
+                dependencies, obj = pickle.loads(data)
+            except Exception:
+                # corrupt or partly written entry (unpickling raises all
+                # kinds of exceptions for those), recompute the result
+                dependencies, obj = None, None
+            if dependencies is not None and self._is_valid(dependencies):
+                with self._lock:
+                    self.stats[tier] += 1
+                return obj
+            self.discard(key)
+
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    def put(
+        self,
+        key: str,
+        obj: Any,
+        dependencies: tuple[tuple[pathlib.Path, FileStamp], ...] = (),
+    ) -> None:
+        """
+        Cache a result.
+
+        :param dependencies: included files and their stamps at the time the
+                             result was computed
+        """
+        data = pickle.dumps((dependencies, obj), protocol=pickle.HIGHEST_PROTOCOL)
+        self._remember(key, data)
+        if self.cache_dir is not None:
+            # write atomically, other processes may read concurrently
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, self.cache_dir / key)
+            except OSError:
+                pathlib.Path(tmp_path).unlink(missing_ok=True)
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            self._memory.pop(key, None)
+        if self.cache_dir is not None:
+            (self.cache_dir / key).unlink(missing_ok=True)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            self.stats.clear()
+        if self.cache_dir is not None:
+            for path in self.cache_dir.iterdir():
+                path.unlink(missing_ok=True)
+
+    def _remember(self, key: str, data: bytes) -> None:
+        with self._lock:
+            self._memory[key] = data
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    @staticmethod
+    def _is_valid(dependencies: tuple[tuple[pathlib.Path, FileStamp], ...]) -> bool:
+        try:
+            return all(get_stamp(path) == stamp for path, stamp in dependencies)
+        except OSError:
+            return False
+
+
+def make_key(file_content: str, *config: Any) -> str:
+    """
+    Hash script contents and a configuration (anything with a stable repr)
+    into a cache key.
+    """
+    h = hashlib.sha256()
+    h.update(repr((_FORMAT_VERSION, *config)).encode("utf8"))
+    h.update(file_content.encode("utf8", errors="surrogatepass"))
+    return h.hexdigest()
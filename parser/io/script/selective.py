@@ -0,0 +1,238 @@
+import pathlib
+import re
+from collections.abc import Iterable, Iterator, Mapping
+from typing import TYPE_CHECKING, Any, NamedTuple, Optional
+
+from lark.exceptions import LarkError
+
+from parser.io.script.scanner import ScriptParser
+
+if TYPE_CHECKING:
+    from parser.io.script.loader import CodGadLoader
+
+# Tokens relevant for skimming a script: the boundaries of objects, and the
+# "=" of variable definitions. Comments and strings are matched so that their
+# contents are skipped.
+_SKIM_RE = re.compile(
+    r"""(?=[;"EO=])
+    (?:
+        ;[^\n]*
+        | "[^"\n]*"
+        | (?P<end>EndObj;)
+        | \bObjekt\b\s*:\s*(?P<ident>\w+)
+        | (?P<equals>=)
+    )
+    """,
+    re.VERBOSE,
+)
+_BLANK_RE = re.compile(r"(?:\s|;[^\n]*)*")
+
+
+class TopLevelBlock(NamedTuple):
+    start: int
+    end: int
+    # identifier of the top-level object, or None for the statements between
+    # top-level objects
+    ident: Optional[str] = None
+    # starts of the lines of the object which define variables
+    var_lines: tuple[int, ...] = ()
+
+
+class LazyScript(Mapping):
+    """
+    Result of `CodGadLoader.parse_interpret` with `select`: a mapping like the
+    interpreted script, in which only the selected top-level objects are
+    present, and interpreted on first access.
+
+    The statements between top-level objects (variables, properties and
+    includes) are interpreted right away. Top-level objects are only skimmed
+    for variable definitions, which are applied in order as usual, so that
+    each selected object is interpreted with the variables defined up to it.
+    Objects whose variable definitions depend on properties are interpreted
+    in full instead.
+    """
+
+    def __init__(
+        self,
+        loader: "CodGadLoader",
+        file_content: str,
+        path: Optional[pathlib.Path] = None,
+        select: Optional[Iterable[str]] = None,
+    ):
+        """
+        :param loader: loader to interpret the script like
+        :param file_content: script to interpret
+        :param path: path of the script, needed for resolving Include
+                     statements relative to it
+        :param select: identifiers of the top-level objects to interpret, all
+                       objects if None
+        """
+        self.loader = loader
+        self.text = file_content
+        selected = None if select is None else frozenset(select)
+
+        self._interpreter = loader._create_interpreter(
+            dict(loader._get_external_vars() or {})
+        )
+        loader._set_include_dir(self._interpreter, path.parent if path else None)
+        self._script_parser = None
+        # key -> interpreted values and pending objects (as blocks and the
+        # variables before them), in order of appearance
+        self._sources: dict[str, list[Any]] = {}
+        # interpreted values of keys without pending objects
+        self._values: dict[str, Any] = {}
+
+        for block in split_top_level(file_content):
+            if block.ident is None:
+                for key, value in self._interpret_block(block).items():
+                    self._sources.setdefault(key, []).append(value)
+                continue
+
+            if selected is not None and block.ident not in selected:
+                self._skim(block)
+                continue
+            variables = dict(self._interpreter.vars)
+            interpreted = self._skim(block)
+            if interpreted is None:
+                source = _Pending(block, variables)
+            else:
+                source = interpreted[block.ident]
+            self._sources.setdefault(block.ident, []).append(source)
+
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return self._values[key]
+        except KeyError:
+            pass
+        sources = self._sources[key]
+        for i, source in enumerate(sources):
+            if type(source) is _Pending:
+                self._interpreter.vars = dict(source.variables)
+                self._interpreter.properties = [{}]
+                sources[i] = self._interpret_block(source.block)[key]
+        # aggregate duplicates like ScriptInterpreter.start
+        items = self._interpreter._aggregate_duplicate_dict_items(
+            [(key, v) for v in sources]
+        )
+        value = self._values[key] = self.loader._post_process_object(key, items[key])
+        return value
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._sources)
+
+    def __len__(self) -> int:
+        return len(self._sources)
+
+    def is_interpreted(self, key: str) -> bool:
+        """
+        Whether accessing a key does not require interpreting anything.
+        """
+        return key in self._values
+
+    def _skim(self, block: TopLevelBlock) -> Optional[dict]:
+        """
+        Apply the variable definitions of a top-level object. If that is not
+        possible without interpreting the whole object, the object is
+        interpreted, and the interpreted block is returned.
+        """
+        if not block.var_lines:
+            return None
+        text = self.text
+        lines = []
+        for line_start in block.var_lines:
+            line_end = text.find("\n", line_start, block.end)
+            lines.append(text[line_start : line_end if line_end >= 0 else block.end])
+        snippet = "\n".join(lines) + "\n"
+
+        # Interpret the lines in a scope of their own. If they contain more
+        # than variable definitions, or refer to properties, they cannot be
+        # interpreted separately from the object.
+        interpreter = self._interpreter
+        variables = dict(interpreter.vars)
+        properties = interpreter.properties
+        interpreter.properties = [{}]
+        try:
+            skimmed = self._interpret(snippet) == {}
+        except (LarkError, KeyError):
+            skimmed = False
+        finally:
+            interpreter.properties = properties
+        if skimmed:
+            return None
+        interpreter.vars = variables
+        return self._interpret_block(block)
+
+    def _interpret_block(self, block: TopLevelBlock) -> dict:
+        """
+        Interpret a block, padded to its position in the script so that errors
+        report lines and columns in the script.
+        """
+        text = self.text
+        line = text.count("\n", 0, block.start)
+        column = block.start - (text.rfind("\n", 0, block.start) + 1)
+        return self._interpret(
+            "\n" * line + " " * column + text[block.start : block.end]
+        )
+
+    def _interpret(self, script: str) -> dict:
+        if self.loader.backend == self.loader.BACKEND_SCANNER:
+            if self._script_parser is None:
+                self._script_parser = ScriptParser(self._interpreter)
+            return self._script_parser.parse_interpret(script)
+        return self._interpreter.visit(self.loader.parse(script))
+
+
+class _Pending(NamedTuple):
+    """
+    Top-level object yet to be interpreted.
+    """
+
+    block: TopLevelBlock
+    # variables defined before the object
+    variables: dict[str, Any]
+
+
+def split_top_level(text: str) -> list[TopLevelBlock]:
+    """
+    Split a script into top-level objects and the statements between them,
+    noting the lines of objects which define variables. Text which cannot be
+    split (e.g. due to unbalanced objects) ends up in a single block of
+    statements, for the parser to report errors.
+    """
+    blocks = []
+    # start of the statements following the last top-level object
+    pos = 0
+    depth = 0
+    object_start = 0
+    ident = None
+    var_lines = []
+    for match in _SKIM_RE.finditer(text):
+        kind = match.lastgroup
+        if kind == "ident":
+            depth += 1
+            if depth == 1:
+                object_start = match.start()
+                ident = match.group("ident")
+                var_lines = []
+        elif kind == "end":
+            depth -= 1
+            if depth < 0:
+                break
+            elif depth > 0:
+                continue
+            if not _BLANK_RE.fullmatch(text, pos, object_start):
+                blocks.append(TopLevelBlock(pos, object_start))
+            blocks.append(
+                TopLevelBlock(object_start, match.end(), ident, tuple(var_lines))
+            )
+            pos = match.end()
+        elif kind == "equals" and depth > 0:
+            line_start = max(text.rfind("\n", 0, match.start()) + 1, object_start)
+            if not var_lines or var_lines[-1] != line_start:
+                var_lines.append(line_start)
+
+    # anything after the last complete top-level object, including
+    # unbalanced objects
+    if not _BLANK_RE.fullmatch(text, pos):
+        blocks.append(TopLevelBlock(pos, len(text)))
+    return blocks
@@ -0,0 +1,377 @@
+import pathlib
+import re
+from collections import Counter
+from typing import Any, NamedTuple, Optional
+
+from lark import ParseError, Token, UnexpectedInput
+
+from parser.game.constants import NUMMER
+from parser.io.script.loader import CodGadLoader
+from parser.io.script.program import ScriptProgram, compile_tree
+from parser.io.script.sharding import PRESCAN_RE, skip_prelude
+
+# kinds of blocks
+# top-level variables, properties and includes between objects
+STATEMENTS = "statements"
+# a top-level object without numbered objects
+OBJECT = "object"
+# a single numbered object of a top-level object
+NUMBERED = "numbered"
+# start and end of a top-level object with numbered objects
+BEGIN = "begin"
+END = "end"
+
+_BLANK_RE = re.compile(r"(?:\s|;[^\n]*)*")
+_COLON_RE = re.compile(r"\s*:")
+
+_MISSING = object()
+
+
+class Block(NamedTuple):
+    kind: str
+    start: int
+    end: int
+    # identifier of the (enclosing) top-level object, if any
+    ident: Optional[str] = None
+
+
+class Compiled(NamedTuple):
+    """
+    Parsed block, independent of the position of the block in the script.
+    """
+
+    program: ScriptProgram
+    # variables the block reads and writes
+    var_reads: frozenset[str]
+    var_writes: frozenset[str]
+    # properties the block reads from its scope
+    property_reads: frozenset[str]
+    # whether the block includes files, whose contents may change anytime
+    has_include: bool
+
+
+class Execution(NamedTuple):
+    """
+    Result of interpreting a block, and what it depended on.
+    """
+
+    # values of the variables and properties read, before interpreting
+    var_inputs: dict[str, Any]
+    property_inputs: dict[str, Any]
+    # values of the variables and properties written, after interpreting
+    var_outputs: dict[str, Any]
+    property_outputs: dict[str, Any]
+    # interpreted values of the block
+    values: list
+
+
+class EditSession:
+    """
+    Incrementally re-interprets a script while it is being edited.
+
+    Scripts are split into blocks: top-level objects, the numbered objects
+    of top-level objects (so that large objects such as HAUS in HAEUSER.COD
+    are not reinterpreted as a whole), and the top-level statements in
+    between. On each update, only blocks whose text changed are parsed
+    again. A block is interpreted again if it was parsed again, or if any
+    variable or property it reads has a different value than when it was
+    last interpreted, which is how changes propagate to downstream blocks.
+    Other blocks replay the values they wrote. Includes are always
+    interpreted again (see INCLUDE_CACHE).
+
+    The result is patched in place, so that it remains the same dict across
+    updates, with unchanged top-level objects remaining the same objects.
+    They are shared with the session and must not be modified.
+    """
+
+    def __init__(
+        self,
+        loader: CodGadLoader,
+        text: str = "",
+        path: Optional[pathlib.Path] = None,
+    ):
+        """
+        :param loader: loader to interpret the script like
+        :param text: initial text of the script
+        :param path: path of the script, needed for resolving Include
+                     statements relative to it
+        """
+        if loader.layered_fill:
+            raise ValueError("Edit sessions do not support layered ObjFill.")
+        self.loader = loader
+        self.path = path
+        self.text = ""
+        self.result: dict = {}
+        self.blocks: list[Block] = []
+        # number of blocks parsed, interpreted, and reused in the last update
+        self.stats = Counter()
+        self._external_vars = loader._get_external_vars() or {}
+        self._interpreter = loader._create_interpreter(dict(self._external_vars))
+        self._compiled: dict[tuple, Compiled] = {}
+        self._executions: dict[tuple, list[Execution]] = {}
+        # identifier and index of top-level objects with numbered objects ->
+        # interpreted numbered objects, and interpreted object
+        self._objects: dict[tuple[str, int], tuple[list, tuple]] = {}
+        self.update(text)
+
+    def edit(self, start: int, end: int, replacement: str) -> dict:
+        """
+        Replace the characters from start to end and update.
+        """
+        return self.update(self.text[:start] + replacement + self.text[end:])
+
+    def update(self, text: str) -> dict:
+        """
+        Update the result for a new version of the script. If interpreting
+        fails, the exception is raised and the session remains at the
+        previous version.
+        """
+        blocks = split_blocks(text)
+        interpreter = self._interpreter
+        interpreter.vars = dict(self._external_vars)
+        interpreter.properties = [{}]
+        self.loader._set_include_dir(
+            interpreter, self.path.parent if self.path else None
+        )
+
+        stats = Counter(parsed=0, interpreted=0, reused=0)
+        compiled_blocks = {}
+        executions = {}
+        previous_executions = {k: list(v) for k, v in self._executions.items()}
+        objects = {}
+        top_values = []
+        object_values = None
+        for block in blocks:
+            if block.kind == BEGIN:
+                interpreter.open_scope()
+                object_values = [Token("OBJECT_IDENT", block.ident)]
+                continue
+            elif block.kind == END:
+                top_values.append(self._end_object(block, object_values, objects))
+                object_values = None
+                continue
+
+            key = (block.kind, block.ident, text[block.start : block.end])
+            compiled = compiled_blocks.get(key) or self._compiled.get(key)
+            if compiled is None:
+                compiled = self._compile(text, block)
+                stats["parsed"] += 1
+            compiled_blocks[key] = compiled
+
+            candidates = previous_executions.get(key)
+            execution = candidates.pop(0) if candidates else None
+            if (
+                execution is not None
+                and not compiled.has_include
+                and self._inputs_unchanged(execution)
+            ):
+                interpreter.vars.update(execution.var_outputs)
+                interpreter.properties[-1].update(execution.property_outputs)
+                stats["reused"] += 1
+            else:
+                execution = self._execute(text, block, compiled)
+                stats["interpreted"] += 1
+            executions.setdefault(key, []).append(execution)
+
+            if object_values is None:
+                top_values += execution.values
+            else:
+                object_values += execution.values
+
+        obj = self.loader._post_process(interpreter.start(top_values))
+
+        self.text = text
+        self.blocks = blocks
+        self.stats = stats
+        self._compiled = compiled_blocks
+        self._executions = executions
+        self._objects = objects
+        for k in [k for k in self.result if k not in obj]:
+            del self.result[k]
+        for k, v in obj.items():
+            if self.result.get(k, _MISSING) is not v:
+                self.result[k] = v
+        return self.result
+
+    def _end_object(self, block: Block, values: list, objects: dict) -> tuple:
+        """
+        Interpret a top-level object with numbered objects, or reuse it if
+        none of its numbered objects changed.
+        """
+        key = (block.ident, len(objects))
+        previous = self._objects.get(key)
+        if (
+            previous is not None
+            and len(previous[0]) == len(values)
+            and all(a is b for a, b in zip(previous[0][1:], values[1:]))
+        ):
+            # close the scope like def_object
+            self._interpreter.properties.pop()
+            obj = previous[1]
+        else:
+            obj = self._interpreter.def_object(values)
+        objects[key] = (values, obj)
+        return obj
+
+    def _compile(self, text: str, block: Block, padded: bool = False) -> Compiled:
+        """
+        :param padded: if True, pad the block to its position in the script,
+                       so that errors report the lines and columns in the
+                       script (otherwise, positions are relative to the
+                       block)
+        """
+        block_text = text[block.start : block.end]
+        if padded:
+            line = text.count("\n", 0, block.start)
+            column = block.start - (text.rfind("\n", 0, block.start) + 1)
+            block_text = " " * column + block_text
+        else:
+            line = 1 if block.kind == NUMBERED else 0
+        if block.kind == NUMBERED:
+            prefix = "\n" * (line - 1) + f"Objekt: {block.ident}\n"
+            script = prefix + block_text + "\nEndObj;\n"
+        else:
+            script = "\n" * line + block_text
+
+        try:
+            tree = self.loader.parse(script)
+        except UnexpectedInput:
+            if padded:
+                raise
+            tree = None
+        if tree is None:
+            # raise the error with its position in the script
+            return self._compile(text, block, padded=True)
+        code = compile_tree(tree, self._interpreter).code
+        # drop the call of the start rule, and the numbered object's wrapping
+        code = code[2:-2] if block.kind == NUMBERED else code[:-1]
+
+        var_reads, var_writes, property_reads = set(), set(), set()
+        has_include = False
+        for subtree in tree.iter_subtrees():
+            rule = subtree.data
+            if rule == "var_ref":
+                var_reads.add(subtree.children[0].value)
+            elif rule in ("def_var_absolute", "def_var_relative"):
+                var_writes.add(subtree.children[0].value)
+                if rule == "def_var_relative":
+                    var_reads.add(subtree.children[0].value)
+            elif rule in ("property_ref", "def_property_relative"):
+                property_reads.add(subtree.children[0].value)
+            elif rule == "def_number_relative":
+                property_reads.add(NUMMER)
+            elif rule == "include_expr":
+                has_include = True
+        return Compiled(
+            ScriptProgram(code),
+            frozenset(var_reads),
+            frozenset(var_writes),
+            frozenset(property_reads),
+            has_include,
+        )
+
+    def _execute(
+        self, text: str, block: Block, compiled: Compiled, padded: bool = False
+    ) -> Execution:
+        interpreter = self._interpreter
+        variables = interpreter.vars
+        scope = interpreter.properties[-1]
+        var_inputs = {v: variables.get(v, _MISSING) for v in compiled.var_reads}
+        property_inputs = {p: scope.get(p, _MISSING) for p in compiled.property_reads}
+        variables_before = dict(variables)
+        scopes_before = [dict(s) for s in interpreter.properties]
+        try:
+            values = compiled.program.execute(interpreter)
+        except ParseError:
+            if padded:
+                raise
+            values = None
+        if values is None:
+            # raise the error with its position in the script
+            interpreter.vars = variables_before
+            interpreter.properties = scopes_before
+            compiled = self._compile(text, block, padded=True)
+            return self._execute(text, block, compiled, padded=True)
+        scope_before = scopes_before[-1]
+        var_outputs = {v: variables[v] for v in compiled.var_writes if v in variables}
+        property_outputs = {
+            p: value
+            for p, value in scope.items()
+            if scope_before.get(p, _MISSING) is not value
+        }
+        return Execution(
+            var_inputs, property_inputs, var_outputs, property_outputs, values
+        )
+
+    def _inputs_unchanged(self, execution: Execution) -> bool:
+        variables = self._interpreter.vars
+        scope = self._interpreter.properties[-1]
+        return all(
+            _same(variables.get(v, _MISSING), value)
+            for v, value in execution.var_inputs.items()
+        ) and all(
+            _same(scope.get(p, _MISSING), value)
+            for p, value in execution.property_inputs.items()
+        )
+
+
+def split_blocks(text: str) -> list[Block]:
+    """
+    Split a script into blocks, see EditSession. Text which cannot be split
+    (e.g. due to unbalanced objects) ends up in a single block of
+    statements, for the parser to report errors.
+    """
+    blocks = []
+    # start of the statements following the last top-level object
+    pos = 0
+    depth = 0
+    object_start = 0
+    ident = None
+    cuts = []
+    for match in PRESCAN_RE.finditer(text):
+        kind = match.lastgroup
+        if kind == "ident":
+            depth += 1
+            if depth == 1:
+                object_start = match.start()
+                ident = match.group("ident")
+                cuts = []
+        elif kind == "end":
+            depth -= 1
+            if depth < 0:
+                break
+            elif depth > 0:
+                continue
+            if not _BLANK_RE.fullmatch(text, pos, object_start):
+                blocks.append(Block(STATEMENTS, pos, object_start))
+            if cuts:
+                blocks.append(Block(BEGIN, object_start, cuts[0], ident))
+                for start, end in zip(cuts, cuts[1:] + [match.start()]):
+                    blocks.append(Block(NUMBERED, start, end, ident))
+                blocks.append(Block(END, match.start(), match.end(), ident))
+            else:
+                blocks.append(Block(OBJECT, object_start, match.end(), ident))
+            pos = match.end()
+        elif (
+            kind == "nummer"
+            and depth == 1
+            # a definition of the number, not a reference to it ("Id: Nummer")
+            and _COLON_RE.match(text, match.end())
+        ):
+            cut = text.rfind("\n", 0, match.start()) + 1
+            if text[cut : match.start()].strip():
+                cut = match.start()
+            else:
+                cut = skip_prelude(text, cut)
+            cuts.append(cut)
+
+    # anything after the last complete top-level object, including
+    # unbalanced objects
+    if not _BLANK_RE.fullmatch(text, pos):
+        blocks.append(Block(STATEMENTS, pos, len(text)))
+    return blocks
+
+
+def _same(a: Any, b: Any) -> bool:
+    # IntEnum members are equal to their values, but must not be confused
+    return a is b or (type(a) is type(b) and a == b)
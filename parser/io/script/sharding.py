@@ -0,0 +1,221 @@
+import concurrent.futures
+import re
+from typing import NamedTuple, Optional
+
+from parser.io.script.grammar import get_lark
+from parser.io.script.interpreter import ScriptInterpreter
+from parser.io.script.program import CALL, OPEN_SCOPE, ScriptProgram, compile_tree
+
+# Tokens relevant for finding the boundaries of objects (here and in
+# EditSession). Comments and strings are matched so that their contents are
+# skipped. The lookahead lets the regex engine skip other characters quickly.
+PRESCAN_RE = re.compile(
+    r"""(?=[;"EO@N])
+    (?:
+        (?P<comment>;[^\n]*)
+        | "[^"\n]*"
+        | (?P<end>EndObj;)
+        | \bObjekt\b\s*:\s*(?P<ident>\w+)
+        | (?P<nummer>(?<![\w@])@?Nummer\b)
+    )
+    """,
+    re.VERBOSE,
+)
+# remainder of a line which contains no further tokens
+_LINE_END_RE = re.compile(r"[ \t\r]*(?:;[^\n]*)?\n")
+# lines which may precede the "Nummer" of a numbered object, and have to
+# stay with it, since LALR only accepts variable definitions in front of it
+_PRELUDE_LINE_RE = re.compile(r"[ \t\r]*(?:@?p?[A-Z][A-Z0-9_]*[ \t]*=.*)?(?:;.*)?$")
+
+_START = ScriptInterpreter.RULES.index("start")
+_DEF_OBJECT = ScriptInterpreter.RULES.index("def_object")
+
+
+class Shard(NamedTuple):
+    """
+    Part of a script made up of complete lines, which can be parsed on its
+    own once wrapped into the objects it is part of.
+    """
+
+    start: int
+    end: int
+    # number of lines preceding the shard in the script
+    line: int
+    # identifier of the top-level object the shard starts in, if any
+    starts_in: Optional[str]
+    # identifier of the top-level object the shard ends in, if any
+    ends_in: Optional[str]
+
+    def wrap(self, text: str) -> str:
+        """
+        Return the text of the shard as a parsable script, padded so that
+        line numbers match those of the script.
+        """
+        parts = []
+        if self.starts_in is None:
+            parts.append("\n" * self.line)
+        else:
+            parts.append("\n" * (self.line - 1) + f"Objekt: {self.starts_in}\n")
+        parts.append(text[self.start : self.end])
+        if self.ends_in is not None:
+            parts.append("\nEndObj;\n")
+        return "".join(parts)
+
+
+def split_script(text: str, num_shards: int) -> list[Shard]:
+    """
+    Split a script into at most num_shards shards of similar size. Scripts
+    are split between top-level objects, and between the numbered objects of
+    top-level objects (such as the HAUS objects in HAEUSER.COD), since a
+    single object may make up most of a script.
+    """
+    # positions where the script may be split, with the identifier of the
+    # top-level object they are in
+    candidates: list[tuple[int, Optional[str]]] = []
+    depth = 0
+    ident = None
+    seen_nummer = False
+    for match in PRESCAN_RE.finditer(text):
+        kind = match.lastgroup
+        if kind == "ident":
+            depth += 1
+            if depth == 1:
+                ident = match.group("ident")
+                seen_nummer = False
+        elif kind == "end":
+            depth -= 1
+            if depth == 0:
+                # split after the rest of the line
+                line_end = _LINE_END_RE.match(text, match.end())
+                if line_end is not None and line_end.end() < len(text):
+                    candidates.append((line_end.end(), None))
+        elif kind == "nummer" and depth == 1:
+            # numbered objects are split before the "Nummer" of the next
+            # object, which has to be the first token on its line
+            if seen_nummer:
+                cut = text.rfind("\n", 0, match.start()) + 1
+                if not text[cut : match.start()].strip():
+                    candidates.append((skip_prelude(text, cut), ident))
+            seen_nummer = True
+
+    cuts = []
+    target_size = len(text) / max(num_shards, 1)
+    last_cut = 0
+    for cut, ident in candidates:
+        if len(cuts) == num_shards - 1:
+            break
+        if cut - last_cut >= target_size:
+            cuts.append((cut, ident))
+            last_cut = cut
+
+    shards = []
+    start, line, starts_in = 0, 0, None
+    for cut, ident in cuts + [(len(text), None)]:
+        shards.append(Shard(start, cut, line, starts_in, ident))
+        line += text.count("\n", start, cut)
+        start, starts_in = cut, ident
+    return shards
+
+
+def skip_prelude(text: str, cut: int) -> int:
+    """
+    Move a line start back over variable definitions, blank lines and
+    comments preceding it, which belong to the numbered object starting
+    there (LALR only accepts variable definitions in front of its number).
+
+    :param text: script
+    :param cut: offset of a line start in the script
+    :return: offset of the first line belonging to the same numbered object
+    """
+    while cut > 0:
+        prev = text.rfind("\n", 0, cut - 1) + 1
+        line = text[prev : cut - 1]
+        if not _PRELUDE_LINE_RE.match(line):
+            break
+        cut = prev
+    return cut
+
+
+def create_executor(
+    max_workers: Optional[int] = None,
+) -> concurrent.futures.ProcessPoolExecutor:
+    """
+    Create a process pool for parsing shards, whose workers load the parser
+    once on startup.
+    """
+    return concurrent.futures.ProcessPoolExecutor(
+        max_workers=max_workers, initializer=get_lark
+    )
+
+
+def compile_shard(shard_script: str) -> ScriptProgram:
+    """
+    Parse and compile a wrapped shard, in a worker process.
+    """
+    # constant folding does not depend on the interpreter's state
+    return compile_tree(get_lark().parse(shard_script), ScriptInterpreter())
+
+
+def compile_sharded(
+    text: str, num_shards: int, executor: concurrent.futures.Executor
+) -> ScriptProgram:
+    """
+    Parse the shards of a script in parallel, and merge them into one
+    program. Interpretation, which depends on variables defined in order
+    throughout the script, is not affected by sharding: the merged program
+    performs the same rule calls as the program of the whole script.
+    """
+    shards = split_script(text, num_shards)
+    futures = [executor.submit(compile_shard, shard.wrap(text)) for shard in shards]
+    programs = [future.result() for future in futures]
+    return merge_programs(shards, programs)
+
+
+def merge_programs(shards: list[Shard], programs: list[ScriptProgram]) -> ScriptProgram:
+    code = []
+    # number of children of the start rule
+    num_children = 0
+    # number of children so far of a top-level object continued in the next
+    # shard
+    open_children = 0
+    for shard, program in zip(shards, programs):
+        shard_code = list(program.code)
+        _, (rule, n) = shard_code.pop()
+        assert rule == _START
+        num_children += n
+        end_children = 0
+        if shard.ends_in is not None:
+            _, (rule, end_children) = shard_code.pop()
+            assert rule == _DEF_OBJECT
+
+        if shard.starts_in is not None:
+            # drop the opening of the continued object (counted already)
+            del shard_code[:2]
+            num_children -= 1
+            close = _find_close(shard_code)
+            if close is None:
+                # the object continues in the next shard as well
+                open_children += end_children - 1
+                code += shard_code
+                continue
+            _, (_, n) = shard_code[close]
+            shard_code[close] = (CALL, (_DEF_OBJECT, open_children + n - 1))
+        open_children = end_children
+        code += shard_code
+    code.append((CALL, (_START, num_children)))
+    return ScriptProgram(code)
+
+
+def _find_close(code: list) -> Optional[int]:
+    """
+    Find the call closing the object whose scope was open before code.
+    """
+    depth = 0
+    for i, (op, arg) in enumerate(code):
+        if op == OPEN_SCOPE:
+            depth += 1
+        elif op == CALL and arg[0] == _DEF_OBJECT:
+            if depth == 0:
+                return i
+            depth -= 1
+    return None
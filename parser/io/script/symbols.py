@@ -0,0 +1,57 @@
+import enum
+import functools
+from typing import Any, Iterable, Optional, Type
+
+
+class SymbolIndex:
+    """
+    Maps identifiers which are not defined as variables in a script to enum
+    members, merged from all enums available to an interpreter. Identifiers
+    that could be resolved in more than one way (members of several enums,
+    or enum members shadowed by external variables) are recorded as
+    ambiguous. As before, the first enum in the list takes precedence, and
+    variables take precedence over enums.
+    """
+
+    def __init__(
+        self,
+        enums: Iterable[Type[enum.IntEnum]],
+        external_vars: Optional[dict[str, Any]] = None,
+    ):
+        """
+        :param enums: enums in order of precedence
+        :param external_vars: external variables, only used for detecting
+                              ambiguities
+        """
+        members, ambiguous = _index_enums(tuple(enums))
+        self.members = members
+        # identifier -> description of all the things it refers to
+        self.ambiguous = dict(ambiguous)
+        for var in external_vars or {}:
+            if var in members:
+                sources = self.ambiguous.get(var) or [_describe(members[var])]
+                self.ambiguous[var] = ["external variable"] + sources
+
+    def get(self, identifier: str) -> Optional[enum.IntEnum]:
+        return self.members.get(identifier)
+
+
+@functools.cache
+def _index_enums(
+    enums: tuple[Type[enum.IntEnum], ...],
+) -> tuple[dict[str, enum.IntEnum], dict[str, list[str]]]:
+    # shared by all loaders using the same enums
+    members = {}
+    ambiguous = {}
+    for enum_cls in enums:
+        for name, member in enum_cls.__members__.items():
+            if name not in members:
+                members[name] = member
+            else:
+                sources = ambiguous.setdefault(name, [_describe(members[name])])
+                sources.append(_describe(member))
+    return members, ambiguous
+
+
+def _describe(member: enum.IntEnum) -> str:
+    return f"{type(member).__name__}.{member.name}"
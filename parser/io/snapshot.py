@@ -0,0 +1,572 @@
+import enum
+import importlib
+import itertools
+import mmap
+import pathlib
+import struct
+import zlib
+from collections.abc import Iterator, Mapping
+from typing import Any, Optional, Type
+
+from parser.io.columnar import is_numbered_family
+
+# Binary snapshot of an interpreted script, see write_snapshot. All integers
+# are little-endian.
+#
+# header:     magic, version, offsets of root object, string and enum table
+# body:       nodes, each referring to its children by offset
+#   object:   u32 count, then count entries of a key cell and a value cell,
+#             then the key table: count pairs of u32 key hash (see
+#             _key_hash) and u32 entry position, sorted by hash
+#   family:   numbered objects whose properties are named by strings (such
+#             as all HAUS), as fixed-layout records: u32 count, u32 column
+#             count, u32 string index of each column (the property names of
+#             all objects, in order of appearance), then count records of a
+#             number cell and one value cell per column (ABSENT if the
+#             object lacks the property), then the key table of the numbers
+#   sequence: u32 count, then count value cells (lists and tuples)
+# strings:    u32 count, u32 offsets of count + 1 boundaries, UTF-8 data
+# enums:      u32 count, then per enum: u32 string index of its module,
+#             u32 string index of its name, u32 member count, and members as
+#             u32 string index of the name and i64 value
+#
+# cell: u8 tag, u8 padding, u16 enum index (ENUM only), i64 payload (integer,
+# float bits, string index, enum member value, or offset of a node)
+MAGIC = b"A1602SNP"
+VERSION = 3
+
+_HEADER = struct.Struct("<8sIxxxxQQQ")
+_CELL = struct.Struct("<BxHq")
+_ENTRY = struct.Struct("<BxHqBxHq")
+_COUNT = struct.Struct("<I")
+_FLOAT = struct.Struct("<d")
+_MEMBER = struct.Struct("<Iq")
+_BOUNDS = struct.Struct("<II")
+_ENUM_HEADER = struct.Struct("<III")
+_KEY = struct.Struct("<II")
+_FAMILY_HEADER = struct.Struct("<II")
+
+# tags of cells
+_NONE = 0
+_INT = 1
+_FLOAT_TAG = 2
+_STR = 3
+_ENUM = 4
+_FALSE = 5
+_TRUE = 6
+_OBJECT = 7
+_LIST = 8
+_TUPLE = 9
+_FAMILY = 10
+# a property missing from a record of a family
+_ABSENT = 11
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def write_snapshot(path: pathlib.Path, obj: Mapping) -> None:
+    """
+    Write an interpreted script (as returned by `CodGadLoader.parse_interpret`)
+    to a binary snapshot file, which `Snapshot` reads without deserializing
+    it.
+    """
+    path.write_bytes(_SnapshotWriter().write(obj))
+
+
+class _SnapshotWriter:
+    def __init__(self):
+        self.body = bytearray()
+        self.strings: dict[str, int] = {}
+        self.enums: dict[Type[enum.IntEnum], int] = {}
+
+    def write(self, obj: Mapping) -> bytes:
+        root = self._node(_OBJECT, obj)
+        # the enum table refers to strings, so it has to be built first
+        enums = self._enum_table()
+        strings = self._string_table()
+        body_offset = _HEADER.size
+        strings_offset = body_offset + len(self.body)
+        enums_offset = strings_offset + len(strings)
+        header = _HEADER.pack(
+            MAGIC, VERSION, body_offset + root, strings_offset, enums_offset
+        )
+        return b"".join((header, self.body, strings, enums))
+
+    def _node(self, tag: int, value: Any) -> int:
+        """
+        Append a node to the body, after its children, return its offset
+        relative to the body.
+        """
+        cell = self._cell
+        if tag == _OBJECT:
+            packed = [_ENTRY.pack(*cell(k), *cell(v)) for k, v in value.items()]
+            keys = sorted((_key_hash(k), i) for i, k in enumerate(value))
+            packed += [_KEY.pack(*key) for key in keys]
+        else:
+            packed = [_CELL.pack(*cell(v)) for v in value]
+        offset = len(self.body)
+        self.body += _COUNT.pack(len(value))
+        self.body += b"".join(packed)
+        return offset
+
+    def _family(self, family: Mapping) -> int:
+        """
+        Append a family of numbered objects to the body as fixed-layout
+        records, after its children, return its offset relative to the body.
+        """
+        cell = self._cell
+        columns = {}
+        for obj in family.values():
+            for name in obj:
+                columns.setdefault(name, len(columns))
+        absent = _CELL.pack(_ABSENT, 0, 0)
+        packed = []
+        for number, obj in family.items():
+            record = [absent] * len(columns)
+            for name, value in obj.items():
+                record[columns[name]] = _CELL.pack(*cell(value))
+            packed.append(_CELL.pack(*cell(number)))
+            packed += record
+        keys = sorted((_key_hash(number), i) for i, number in enumerate(family))
+        packed += [_KEY.pack(*key) for key in keys]
+        offset = len(self.body)
+        self.body += _FAMILY_HEADER.pack(len(family), len(columns))
+        self.body += struct.pack(
+            f"<{len(columns)}I", *(self._string(name) for name in columns)
+        )
+        self.body += b"".join(packed)
+        return offset
+
+    def _cell(self, value: Any) -> tuple[int, int, int]:
+        type_ = type(value)
+        if type_ is str:
+            return _STR, 0, self._string(value)
+        elif type_ is int:
+            return _INT, 0, value
+        elif type_ is float:
+            return _FLOAT_TAG, 0, _float_bits(value)
+        elif type_ is bool:
+            return _TRUE if value else _FALSE, 0, 0
+        elif value is None:
+            return _NONE, 0, 0
+        elif isinstance(value, enum.IntEnum):
+            return _ENUM, self._enum(type_), int(value)
+        elif isinstance(value, Mapping):
+            if _is_record_family(value):
+                return _FAMILY, 0, _HEADER.size + self._family(value)
+            return _OBJECT, 0, _HEADER.size + self._node(_OBJECT, value)
+        elif type_ is list:
+            return _LIST, 0, _HEADER.size + self._node(_LIST, value)
+        elif type_ is tuple:
+            return _TUPLE, 0, _HEADER.size + self._node(_TUPLE, value)
+        raise TypeError(f"Cannot write values of type {type_.__name__} to snapshots.")
+
+    def _string(self, s: str) -> int:
+        index = self.strings.get(s)
+        if index is None:
+            index = self.strings[s] = len(self.strings)
+        return index
+
+    def _enum(self, enum_cls: Type[enum.IntEnum]) -> int:
+        index = self.enums.get(enum_cls)
+        if index is None:
+            index = self.enums[enum_cls] = len(self.enums)
+        return index
+
+    def _string_table(self) -> bytes:
+        data = [s.encode("utf8") for s in self.strings]
+        boundaries = [0]
+        for d in data:
+            boundaries.append(boundaries[-1] + len(d))
+        count = len(data)
+        return struct.pack(f"<I{count + 1}I", count, *boundaries) + b"".join(data)
+
+    def _enum_table(self) -> bytes:
+        parts = [_COUNT.pack(len(self.enums))]
+        for enum_cls in self.enums:
+            parts.append(
+                _ENUM_HEADER.pack(
+                    self._string(enum_cls.__module__),
+                    self._string(enum_cls.__qualname__),
+                    len(enum_cls),
+                )
+            )
+            for member in enum_cls:
+                parts.append(_MEMBER.pack(self._string(member.name), member.value))
+        return b"".join(parts)
+
+
+class Snapshot(Mapping):
+    """
+    Read-only view of a snapshot file written by `write_snapshot`.
+
+    The file is memory-mapped, and only the header and the (small) enum table
+    are read when opening it. Objects are ObjectViews, which find keys via
+    their key table and decode values on access, and families of numbered
+    objects are FamilyViews of fixed-layout records (RecordViews), so
+    processes reading the same snapshot share one copy of it in the page
+    cache. Enums are resolved to
+    the classes they were written from, if these still have the same members
+    (otherwise, equivalent enums are created), so values compare and hash
+    like those of the interpreted script.
+    """
+
+    def __init__(self, path: pathlib.Path):
+        with path.open("rb") as f:
+            try:
+                self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # empty files cannot be mapped
+                raise SnapshotError(f"'{path}' is not a snapshot.") from None
+        try:
+            magic, version, root, strings, enums = _HEADER.unpack_from(self._mm)
+            if magic != MAGIC or version != VERSION:
+                raise SnapshotError(f"'{path}' is not a snapshot of version {VERSION}.")
+            (num_strings,) = _COUNT.unpack_from(self._mm, strings)
+            self._string_bounds = strings + _COUNT.size
+            self._string_data = self._string_bounds + 4 * (num_strings + 1)
+            self._strings: list[Optional[str]] = [None] * num_strings
+            self._enums = self._read_enums(enums)
+            # offset of a family -> its columns, see _family_columns
+            self._families: dict[int, tuple[list[str], dict[str, int]]] = {}
+            self._root = ObjectView(self, root)
+        except SnapshotError:
+            self._mm.close()
+            raise
+        except (struct.error, IndexError, UnicodeDecodeError, ValueError):
+            # beyond the end of a truncated file, or garbage
+            self._mm.close()
+            raise SnapshotError(f"'{path}' is not a snapshot, or truncated.") from None
+
+    def close(self) -> None:
+        # views must not be used afterwards
+        self._mm.close()
+
+    def __enter__(self) -> "Snapshot":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __getitem__(self, key: Any) -> Any:
+        return self._root[key]
+
+    def __iter__(self) -> Iterator:
+        return iter(self._root)
+
+    def __len__(self) -> int:
+        return len(self._root)
+
+    def _string(self, index: int) -> str:
+        s = self._strings[index]
+        if s is None:
+            start, end = _BOUNDS.unpack_from(self._mm, self._string_bounds + 4 * index)
+            data = self._string_data
+            s = self._strings[index] = str(self._mm[data + start : data + end], "utf8")
+        return s
+
+    def _read_enums(self, offset: int) -> list[Type[enum.IntEnum]]:
+        (count,) = _COUNT.unpack_from(self._mm, offset)
+        offset += _COUNT.size
+        enums = []
+        for _ in range(count):
+            module, name, num_members = _ENUM_HEADER.unpack_from(self._mm, offset)
+            offset += _ENUM_HEADER.size
+            members = []
+            for _ in range(num_members):
+                member_name, value = _MEMBER.unpack_from(self._mm, offset)
+                members.append((self._string(member_name), value))
+                offset += _MEMBER.size
+            enums.append(
+                _resolve_enum(self._string(module), self._string(name), members)
+            )
+        return enums
+
+    def _family_columns(self, offset: int) -> tuple[list[str], dict[str, int]]:
+        """
+        Return the property names of the columns of a family, and the column
+        of each name. Decoded once per family.
+        """
+        columns = self._families.get(offset)
+        if columns is None:
+            _, num_columns = _FAMILY_HEADER.unpack_from(self._mm, offset)
+            indices = struct.unpack_from(
+                f"<{num_columns}I", self._mm, offset + _FAMILY_HEADER.size
+            )
+            names = [self._string(index) for index in indices]
+            columns = self._families[offset] = (
+                names,
+                {name: i for i, name in enumerate(names)},
+            )
+        return columns
+
+    def _find(self, key: Any, entries: int, count: int, entry_size: int) -> int:
+        """
+        Look up a key in the key table following the entries of an object or
+        the records of a family, which start with their key cell. Return the
+        offset of the entry or record, or -1 if the key is missing.
+        """
+        mm = self._mm
+        table = entries + count * entry_size
+        digest = _key_hash(key)
+        # first position in the key table with this hash
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if _KEY.unpack_from(mm, table + mid * _KEY.size)[0] < digest:
+                lo = mid + 1
+            else:
+                hi = mid
+        for i in range(lo, count):
+            key_digest, position = _KEY.unpack_from(mm, table + i * _KEY.size)
+            if key_digest != digest:
+                break
+            offset = entries + position * entry_size
+            if self._value(*_CELL.unpack_from(mm, offset)) == key:
+                return offset
+        return -1
+
+    def _value(self, tag: int, enum_index: int, payload: int) -> Any:
+        if tag == _INT:
+            return payload
+        elif tag == _STR:
+            return self._string(payload)
+        elif tag == _ENUM:
+            return self._enums[enum_index](payload)
+        elif tag == _OBJECT:
+            return ObjectView(self, payload)
+        elif tag == _FAMILY:
+            return FamilyView(self, payload)
+        elif tag == _LIST or tag == _TUPLE:
+            (count,) = _COUNT.unpack_from(self._mm, payload)
+            cells = _CELL.iter_unpack(
+                self._mm[payload + 4 : payload + 4 + count * _CELL.size]
+            )
+            values = [self._value(*cell) for cell in cells]
+            return values if tag == _LIST else tuple(values)
+        elif tag == _FLOAT_TAG:
+            return _FLOAT.unpack(payload.to_bytes(8, "little", signed=True))[0]
+        elif tag == _NONE:
+            return None
+        return tag == _TRUE
+
+
+class ObjectView(Mapping):
+    """
+    Read-only view of an object in a Snapshot. Numbered objects are keyed by
+    their numbers (ints or IntEnum members), like in interpreted scripts.
+    Looking up a key binary-searches the key table of the object, and only
+    decodes the keys whose hash matches.
+    """
+
+    __slots__ = ("_snapshot", "_offset", "_len")
+
+    def __init__(self, snapshot: Snapshot, offset: int):
+        self._snapshot = snapshot
+        self._offset = offset
+        (self._len,) = _COUNT.unpack_from(snapshot._mm, offset)
+
+    def __getitem__(self, key: Any) -> Any:
+        snapshot = self._snapshot
+        offset = snapshot._find(key, self._offset + 4, self._len, _ENTRY.size)
+        if offset < 0:
+            raise KeyError(key)
+        return snapshot._value(*_CELL.unpack_from(snapshot._mm, offset + _CELL.size))
+
+    def __iter__(self) -> Iterator:
+        value = self._snapshot._value
+        start = self._offset + 4
+        for entry in _ENTRY.iter_unpack(
+            self._snapshot._mm[start : start + self._len * _ENTRY.size]
+        ):
+            yield value(*entry[:3])
+
+    def __len__(self) -> int:
+        return self._len
+
+    def items(self):
+        # decode keys and values in one pass over the entries
+        return dict(self._iter_items()).items()
+
+    def _iter_items(self) -> Iterator[tuple[Any, Any]]:
+        value = self._snapshot._value
+        start = self._offset + 4
+        for entry in _ENTRY.iter_unpack(
+            self._snapshot._mm[start : start + self._len * _ENTRY.size]
+        ):
+            yield value(*entry[:3]), value(*entry[3:])
+
+    def __repr__(self) -> str:
+        return f"ObjectView({dict(self._iter_items())!r})"
+
+
+class FamilyView(Mapping):
+    """
+    Read-only view of a family of numbered objects in a Snapshot, stored as
+    fixed-layout records. Numbers are looked up like keys of ObjectViews,
+    the objects are RecordViews.
+    """
+
+    __slots__ = ("_snapshot", "_offset", "_len", "_records", "_record_size")
+
+    def __init__(self, snapshot: Snapshot, offset: int):
+        self._snapshot = snapshot
+        self._offset = offset
+        self._len, num_columns = _FAMILY_HEADER.unpack_from(snapshot._mm, offset)
+        self._records = offset + _FAMILY_HEADER.size + 4 * num_columns
+        self._record_size = (1 + num_columns) * _CELL.size
+
+    def __getitem__(self, number: Any) -> "RecordView":
+        offset = self._snapshot._find(
+            number, self._records, self._len, self._record_size
+        )
+        if offset < 0:
+            raise KeyError(number)
+        return RecordView(self._snapshot, self._offset, offset)
+
+    def __iter__(self) -> Iterator:
+        mm = self._snapshot._mm
+        value = self._snapshot._value
+        for i in range(self._len):
+            yield value(*_CELL.unpack_from(mm, self._records + i * self._record_size))
+
+    def __len__(self) -> int:
+        return self._len
+
+    def _iter_items(self) -> Iterator[tuple[Any, "RecordView"]]:
+        for i, number in enumerate(self):
+            record = self._records + i * self._record_size
+            yield number, RecordView(self._snapshot, self._offset, record)
+
+    def _iter_records(self) -> Iterator[tuple[Any, list[tuple[str, Any]]]]:
+        """
+        Yield the numbers and properties of all records, decoded in one pass
+        over the family.
+        """
+        snapshot = self._snapshot
+        value = snapshot._value
+        names = snapshot._family_columns(self._offset)[0]
+        size = self._len * self._record_size
+        cells = _CELL.iter_unpack(snapshot._mm[self._records : self._records + size])
+        for number_cell in cells:
+            record = zip(names, itertools.islice(cells, len(names)))
+            yield value(*number_cell), [
+                (name, value(*cell)) for name, cell in record if cell[0] != _ABSENT
+            ]
+
+    def __repr__(self) -> str:
+        return f"FamilyView({dict(self._iter_items())!r})"
+
+
+class RecordView(Mapping):
+    """
+    Read-only view of a numbered object in a FamilyView. Properties are found
+    by their column, and iterate in the order of the columns of the family
+    (the order in which they first appear in it).
+    """
+
+    __slots__ = ("_snapshot", "_family", "_offset")
+
+    def __init__(self, snapshot: Snapshot, family: int, offset: int):
+        self._snapshot = snapshot
+        self._family = family
+        self._offset = offset
+
+    def __getitem__(self, name: Any) -> Any:
+        snapshot = self._snapshot
+        column = snapshot._family_columns(self._family)[1].get(name)
+        if column is None:
+            raise KeyError(name)
+        cell = _CELL.unpack_from(snapshot._mm, self._offset + (1 + column) * _CELL.size)
+        if cell[0] == _ABSENT:
+            raise KeyError(name)
+        return snapshot._value(*cell)
+
+    def __iter__(self) -> Iterator[str]:
+        for name, _ in self._iter_cells():
+            yield name
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self._iter_cells())
+
+    def items(self):
+        # decode names and values in one pass over the record
+        return dict(self._iter_items()).items()
+
+    def _iter_cells(self) -> Iterator[tuple[str, tuple[int, int, int]]]:
+        snapshot = self._snapshot
+        names = snapshot._family_columns(self._family)[0]
+        start = self._offset + _CELL.size
+        cells = _CELL.iter_unpack(snapshot._mm[start : start + len(names) * _CELL.size])
+        for name, cell in zip(names, cells):
+            if cell[0] != _ABSENT:
+                yield name, cell
+
+    def _iter_items(self) -> Iterator[tuple[str, Any]]:
+        value = self._snapshot._value
+        for name, cell in self._iter_cells():
+            yield name, value(*cell)
+
+    def __repr__(self) -> str:
+        return f"RecordView({dict(self._iter_items())!r})"
+
+
+def materialize_snapshot(obj: Any) -> Any:
+    """
+    Turn views of a Snapshot into plain dicts, e.g. before the snapshot is
+    closed.
+    """
+    if isinstance(obj, FamilyView):
+        return {
+            number: {name: materialize_snapshot(v) for name, v in properties}
+            for number, properties in obj._iter_records()
+        }
+    elif isinstance(obj, (ObjectView, RecordView)):
+        return {k: materialize_snapshot(v) for k, v in obj._iter_items()}
+    elif isinstance(obj, Snapshot):
+        return materialize_snapshot(obj._root)
+    elif type(obj) is list:
+        return [materialize_snapshot(v) for v in obj]
+    elif type(obj) is tuple:
+        return tuple(materialize_snapshot(v) for v in obj)
+    return obj
+
+
+def _resolve_enum(
+    module: str, name: str, members: list[tuple[str, int]]
+) -> Type[enum.IntEnum]:
+    try:
+        enum_cls = getattr(importlib.import_module(module), name)
+    except (ImportError, AttributeError):
+        enum_cls = None
+    if enum_cls is not None and [(m.name, m.value) for m in enum_cls] == members:
+        return enum_cls
+    # recreated where it is defined, so that its members pickle and repr
+    # like those of the original enum
+    return enum.IntEnum(name.rpartition(".")[2], members, module=module, qualname=name)
+
+
+def _is_record_family(value: Mapping) -> bool:
+    return is_numbered_family(value) and all(
+        isinstance(obj, Mapping) and all(type(name) is str for name in obj)
+        for obj in value.values()
+    )
+
+
+def _key_hash(key: Any) -> int:
+    # Hashes must not depend on the process (unlike those of strings), and
+    # keys which compare equal must have equal hashes. Other keys than
+    # numbers and strings are rare, they all share one hash.
+    if isinstance(key, float) and key.is_integer():
+        key = int(key)
+    if isinstance(key, int):
+        return key & 0xFFFFFFFF
+    elif isinstance(key, str):
+        return zlib.crc32(key.encode("utf8"))
+    return 0
+
+
+def _float_bits(value: float) -> int:
+    return int.from_bytes(_FLOAT.pack(value), "little", signed=True)
@@ -0,0 +1,46 @@
+import asyncio
+import pathlib
+import tempfile
+import unittest
+
+from lark.exceptions import LarkError
+
+from parser.game.constants import BuildingKind, HAEUSER_COD
+from parser.io.aio import AsyncScriptLoader
+from parser.io.cod import write_cod
+
+
+class TestAsyncScriptLoader(unittest.IsolatedAsyncioTestCase):
+    async def test_load_files(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            root = pathlib.Path(tmp_dir)
+            haeuser_path = root / HAEUSER_COD.upper()
+            write_cod(haeuser_path, "Objekt: HAUS\nNummer: 0\nKind: BODEN\nEndObj;\n")
+            gad_paths = [root / f"{i}.GAD" for i in range(4)]
+            for i, path in enumerate(gad_paths):
+                path.write_text(f"Objekt: GADGET\nId: {i}\nEndObj;\n")
+            broken_path = root / "BROKEN.GAD"
+            broken_path.write_text("Objekt: GADGET\n")
+
+            async with AsyncScriptLoader(max_workers=2, max_concurrency=1) as loader:
+                haeuser = await loader.aparse_interpret(haeuser_path)
+                self.assertIs(haeuser["HAUS"][0]["Kind"], BuildingKind.BODEN)
+
+                results = await loader.gather(gad_paths)
+                self.assertEqual(
+                    results,
+                    {path: {"GADGET": {"Id": i}} for i, path in enumerate(gad_paths)},
+                )
+                with self.assertRaises(LarkError):
+                    await loader.gather([broken_path, *gad_paths])
+                with self.assertRaises(ValueError):
+                    await loader.aparse_interpret(root / "readme.txt")
+
+                # files waiting for their turn can be cancelled
+                first = asyncio.ensure_future(loader.aparse_interpret(gad_paths[0]))
+                second = asyncio.ensure_future(loader.aparse_interpret(gad_paths[1]))
+                await asyncio.sleep(0)
+                second.cancel()
+                self.assertEqual(await first, {"GADGET": {"Id": 0}})
+                with self.assertRaises(asyncio.CancelledError):
+                    await second
@@ -0,0 +1,39 @@
+import pathlib
+import tempfile
+import unittest
+
+from parser.benchmark.corpus import (
+    generate_figuren,
+    generate_gad,
+    generate_haeuser,
+    write_corpus,
+)
+from parser.benchmark.suite import PHASES, run_suite, scaling_exponents
+from parser.io.cod import read_cod
+from parser.io.script.loader import CodGadLoader, FigurenCodLoader, HaeuserCodLoader
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_corpus(self):
+        for generate, loader_cls, ident in [
+            (generate_haeuser, HaeuserCodLoader, "HAUS"),
+            (generate_figuren, FigurenCodLoader, "FIGUR"),
+            (generate_gad, CodGadLoader, "GADGET"),
+        ]:
+            with self.subTest(ident):
+                script = generate(30, seed=1)
+                self.assertEqual(script, generate(30, seed=1))
+                obj = loader_cls().parse_interpret(script)
+                self.assertEqual(len(obj[ident]), 30)
+                scanned = loader_cls(backend="scanner").parse_interpret(script)
+                self.assertEqual(obj, scanned)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            paths = write_corpus(pathlib.Path(tmp_dir), 10, num_gad_files=1)
+            self.assertEqual(read_cod(paths[0]), generate_haeuser(10))
+
+    def test_suite(self):
+        results = run_suite(scales=(5, 10), repeat=1, num_gad_files=1)
+        self.assertEqual([r.phase for r in results], list(PHASES) * 2)
+        self.assertTrue(all(r.seconds > 0 and r.bytes > 0 for r in results))
+        self.assertEqual(set(scaling_exponents(results)), set(PHASES))
@@ -0,0 +1,76 @@
+import contextlib
+import io
+import json
+import pathlib
+import tempfile
+import unittest
+
+from parser.benchmark.corpus import write_corpus
+from parser.cli import main
+from parser.game.constants import BuildingKind, Character
+from parser.io.export import ScriptEncoder
+from parser.io.script.layered import LayeredDict
+
+
+class TestCli(unittest.TestCase):
+    def test_encoder(self):
+        obj = {
+            "FIGUR": {Character.SOLDAT1: {"Gfx": 0}, 1000: {"Gfx": 8}},
+            "HAUS": {0: LayeredDict({"Kind": BuildingKind.BODEN}, ({"Size": (1, 2)},))},
+            "Pos": 1.5,
+        }
+        encoder = ScriptEncoder()
+        self.assertEqual(
+            json.loads(encoder.encode(obj)),
+            {
+                "FIGUR": {"SOLDAT1": {"Gfx": 0}, "1000": {"Gfx": 8}},
+                "HAUS": {"0": {"Kind": "BODEN", "Size": [1, 2]}},
+                "Pos": 1.5,
+            },
+        )
+        lines = [json.loads(line) for line in encoder.iter_lines(obj, "a.cod")]
+        self.assertEqual(len(lines), 4)
+        self.assertEqual(
+            lines[0],
+            {
+                "path": "a.cod",
+                "object": "FIGUR",
+                "number": "SOLDAT1",
+                "value": {"Gfx": 0},
+            },
+        )
+        self.assertEqual(lines[3], {"path": "a.cod", "object": "Pos", "value": 1.5})
+        values = json.loads(ScriptEncoder(enum_names=False).encode(obj))
+        self.assertEqual(values["HAUS"]["0"]["Kind"], BuildingKind.BODEN.value)
+
+    def test_main(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            root = pathlib.Path(tmp_dir) / "install"
+            root.mkdir()
+            write_corpus(root, 10, num_gad_files=2)
+            (root / "README.TXT").write_text("not a script")
+
+            out = io.StringIO()
+            with contextlib.redirect_stdout(out):
+                self.assertEqual(main([str(root), "--jobs", "2"]), 0)
+            converted = json.loads(out.getvalue())
+            self.assertEqual(
+                sorted(converted),
+                [
+                    "FIGUREN.COD",
+                    "Gaddata/GEN000.GAD",
+                    "Gaddata/GEN001.GAD",
+                    "HAEUSER.COD",
+                ],
+            )
+            self.assertEqual(converted["HAEUSER.COD"]["HAUS"]["3"]["Id"], 20003)
+
+            out_dir = pathlib.Path(tmp_dir) / "out"
+            args = [str(root / "HAEUSER.COD"), "-f", "ndjson", "-o", str(out_dir)]
+            self.assertEqual(main(args), 0)
+            lines = (out_dir / "HAEUSER.COD.ndjson").read_text().splitlines()
+            self.assertEqual(json.loads(lines[3])["number"], 3)
+
+            # files given explicitly must be accepted by a loader
+            with contextlib.redirect_stderr(io.StringIO()):
+                self.assertEqual(main([str(root / "README.TXT")]), 1)
@@ -0,0 +1,36 @@
+import pathlib
+import tempfile
+import unittest
+
+from parser.io.cod import read_cod, iter_cod, write_cod, LineIndex
+
+
+class TestCod(unittest.TestCase):
+    def setUp(self):
+        self.script = "Objekt: HAUS\n    Nummer: 0\n    Gfx: 10\n\nEndObj;"
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.path = pathlib.Path(tmp_dir.name) / "TEST.COD"
+        self.path.write_bytes(bytes((256 - b) & 0xFF for b in self.script.encode()))
+
+    def test_read_cod(self):
+        self.assertEqual(read_cod(self.path), self.script)
+
+    def test_iter_cod(self):
+        chunks = list(iter_cod(self.path, chunk_size=16))
+        self.assertEqual("".join(chunks), self.script)
+        for chunk in chunks[:-1]:
+            self.assertTrue(chunk.endswith("\n"))
+
+    def test_line_index(self):
+        index = LineIndex.from_cod(self.path, chunk_size=16)
+        lines = self.script.split("\n")
+        self.assertEqual(len(index), len(lines))
+        self.assertEqual(index.line_column(index.offset(3, 5)), (3, 5))
+        self.assertEqual(self.script[index.offset(3) :].split("\n")[0], lines[2])
+
+    def test_write_cod(self):
+        path = self.path.with_name("WRITTEN.COD")
+        write_cod(path, self.script)
+        self.assertEqual(path.read_bytes(), self.path.read_bytes())
+        self.assertEqual(read_cod(path), self.script)
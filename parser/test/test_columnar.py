@@ -0,0 +1,38 @@
+import unittest
+
+import numpy as np
+
+from parser.game.constants import BuildingKind, Resource
+from parser.io.columnar import to_columnar
+from parser.io.script.loader import HaeuserCodLoader
+
+
+class TestColumnar(unittest.TestCase):
+    def test_haus_table(self):
+        script = """
+Objekt: HAUS
+    Nummer: 0
+    Kind: BODEN
+    Pos: 1, 2
+    Nummer: 1
+    Kind: BERGWERK
+    Pos: 3, 4
+    Objekt: HAUS_PRODLIST
+        Ware: EISENERZ
+    EndObj;
+EndObj;
+"""
+        obj = HaeuserCodLoader().parse_interpret(script)
+        haus = to_columnar(obj)["HAUS"]
+
+        self.assertEqual(len(haus), 2)
+        self.assertIs(haus.enum_types["Kind"], BuildingKind)
+        self.assertEqual(haus["Pos"].shape, (2, 2))
+        np.testing.assert_array_equal(haus.masks["HAUS_PRODLIST.Ware"], [False, True])
+        np.testing.assert_array_equal(
+            haus.where(
+                {"Kind": BuildingKind.BERGWERK, "HAUS_PRODLIST.Ware": Resource.EISENERZ}
+            ),
+            [1],
+        )
+        self.assertEqual(haus.row(0), {"Kind": BuildingKind.BODEN, "Pos": (1, 2)})
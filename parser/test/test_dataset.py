@@ -0,0 +1,73 @@
+import functools
+import pathlib
+import tempfile
+import unittest
+
+from lark.exceptions import LarkError
+
+from parser.game.constants import BuildingKind, HAEUSER_COD
+from parser.io.cod import write_cod
+from parser.io import dataset
+from parser.io.dataset import GameDataSet
+from parser.io.script.loader import CodGadLoader
+
+
+class TestGameDataSet(unittest.TestCase):
+    def test_load_install(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            root = pathlib.Path(tmp_dir)
+            write_cod(
+                root / HAEUSER_COD.upper(),
+                "Objekt: HAUS\nNummer: 0\nKind: BODEN\nEndObj;\n",
+            )
+            (root / "Gaddata").mkdir()
+            (root / "Gaddata" / "A.GAD").write_text("Objekt: GADGET\nId: 1\nEndObj;\n")
+            (root / "Gaddata" / "BROKEN.GAD").write_text("Objekt: GADGET\n")
+            # fills from an undefined object, raising a KeyError
+            (root / "Gaddata" / "FILL.GAD").write_text(
+                "Objekt: GADGET\nNummer: 0\nObjFill: 5\nEndObj;\n"
+            )
+            (root / "readme.txt").write_text("not a script")
+
+            with GameDataSet(root, max_workers=2) as data_set:
+                self.assertEqual(
+                    set(data_set),
+                    {
+                        pathlib.Path(HAEUSER_COD.upper()),
+                        pathlib.Path("Gaddata/A.GAD"),
+                        pathlib.Path("Gaddata/BROKEN.GAD"),
+                        pathlib.Path("Gaddata/FILL.GAD"),
+                    },
+                )
+                # membership neither waits for files nor raises their errors
+                self.assertIn("Gaddata/BROKEN.GAD", data_set)
+                self.assertIn(pathlib.Path("Gaddata/FILL.GAD"), data_set)
+                self.assertNotIn("readme.txt", data_set)
+                self.assertNotIn(1, data_set)
+                with self.assertRaises(RuntimeError):
+                    data_set.get("Gaddata/FILL.GAD")
+                haeuser = data_set[HAEUSER_COD.upper()]
+                self.assertIs(haeuser["HAUS"][0]["Kind"], BuildingKind.BODEN)
+                self.assertEqual(data_set["Gaddata/A.GAD"], {"GADGET": {"Id": 1}})
+                with self.assertRaises(LarkError):
+                    data_set["Gaddata/BROKEN.GAD"]
+                self.assertEqual(
+                    list(data_set.errors()),
+                    [
+                        pathlib.Path("Gaddata/BROKEN.GAD"),
+                        pathlib.Path("Gaddata/FILL.GAD"),
+                    ],
+                )
+
+    def test_init_worker(self):
+        # workers create their parsers before the first file
+        scanner = functools.partial(CodGadLoader, backend=CodGadLoader.BACKEND_SCANNER)
+        dataset.init_worker((CodGadLoader, scanner))
+        try:
+            lark_loader, scanner_loader = dataset._worker_loaders
+            self.assertIsNotNone(lark_loader._lark)
+            self.assertIsNotNone(lark_loader._interpreter)
+            self.assertIsNotNone(scanner_loader._script_parser)
+            self.assertIsNone(scanner_loader._lark)
+        finally:
+            dataset._worker_loaders.clear()
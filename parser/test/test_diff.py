@@ -0,0 +1,78 @@
+import unittest
+
+from parser.game.constants import BuildingKind
+from parser.io.diff import HashedScript, PatchError, apply_patch, diff
+from parser.io.script.loader import HaeuserCodLoader
+
+SCRIPT = """
+Objekt: HAUS
+    Nummer: 0
+    Kind: BODEN
+    Gfx: 10
+    Pos: 1, 2
+    Nummer: 1
+    Kind: BERGWERK
+    Gfx: 20
+    Pos: 3, 4
+EndObj;
+"""
+
+
+class TestDiff(unittest.TestCase):
+    def setUp(self):
+        self.base = HaeuserCodLoader().parse_interpret(SCRIPT)
+        self.mod = HaeuserCodLoader().parse_interpret(
+            SCRIPT.replace("Gfx: 20", "Gfx: 21")
+            .replace("    Pos: 1, 2\n", "")
+            .replace("EndObj;", "    Nummer: 2\n    Kind: BODEN\nEndObj;")
+        )
+
+    def test_diff(self):
+        hashed = HashedScript(self.base)
+        self.assertFalse(diff(hashed, self.base))
+
+        patch = diff(hashed, self.mod)
+        self.assertEqual(patch.changed, {("HAUS", 1, "Gfx"): (20, 21)})
+        self.assertEqual(patch.removed, {("HAUS", 0, "Pos"): (1, 2)})
+        self.assertEqual(patch.added, {("HAUS", 2): {"Kind": BuildingKind.BODEN}})
+
+    def test_apply_patch(self):
+        patch = diff(self.base, self.mod)
+        patched = apply_patch(self.base, patch)
+        self.assertEqual(patched, self.mod)
+        # the base is not modified
+        self.assertEqual(self.base["HAUS"][1]["Gfx"], 20)
+        self.assertEqual(apply_patch(self.mod, diff(self.mod, self.base)), self.base)
+
+        with self.assertRaises(PatchError):
+            apply_patch(self.mod, patch)
+
+    def test_lists(self):
+        base = {"OBJ": {"x": [{"a": 1}, {"a": 2}], "y": [1, 2]}}
+        mod = {"OBJ": {"x": [{"a": 1}, {"a": 3}], "y": [1, 2, 3]}}
+        patch = diff(base, mod)
+        self.assertEqual(
+            patch.changed,
+            {("OBJ", "x", 1, "a"): (2, 3), ("OBJ", "y"): ([1, 2], [1, 2, 3])},
+        )
+        self.assertEqual(apply_patch(base, patch), mod)
+        self.assertEqual(base["OBJ"]["x"][1], {"a": 2})
+
+    def test_negative_values(self):
+        # hash(-1) == hash(-2), which must not hide differences
+        self.assertEqual(diff({"x": -1}, {"x": -2}).changed, {("x",): (-1, -2)})
+        base = {"HAUS": {1: {"Kind": -1, "Faktor": -1.0, "Pos": (-1, 5)}}}
+        mod = {"HAUS": {1: {"Kind": -2, "Faktor": -2.0, "Pos": (-2, 5)}}}
+        self.assertEqual(
+            diff(base, mod).changed,
+            {
+                ("HAUS", 1, "Kind"): (-1, -2),
+                ("HAUS", 1, "Faktor"): (-1.0, -2.0),
+                ("HAUS", 1, "Pos"): ((-1, 5), (-2, 5)),
+            },
+        )
+        # negative numbers of numbered objects
+        patch = diff({"HAUS": {-1: {"Id": 1}}}, {"HAUS": {-2: {"Id": 1}}})
+        self.assertEqual(patch.removed, {("HAUS", -1): {"Id": 1}})
+        self.assertEqual(patch.added, {("HAUS", -2): {"Id": 1}})
+        self.assertFalse(diff(base, {"HAUS": {1: dict(base["HAUS"][1])}}))
@@ -0,0 +1,22 @@
+import unittest
+
+from parser.io.script.grammar import get_lark
+from parser.io.script.loader import (
+    CodGadLoader,
+    HaeuserCodLoader,
+    FigurenCodLoader,
+)
+
+
+class TestGrammar(unittest.TestCase):
+    """
+    Confirm that the compiled parser is shared between loaders.
+    """
+
+    def test_parser_is_shared(self):
+        loaders = [CodGadLoader(), HaeuserCodLoader(), FigurenCodLoader()]
+        for loader in loaders:
+            self.assertIs(loader.lark, get_lark())
+
+    def test_options_are_part_of_key(self):
+        self.assertIsNot(get_lark(), get_lark(propagate_positions=False))
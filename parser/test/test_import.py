@@ -0,0 +1,51 @@
+import re
+import subprocess
+import sys
+import unittest
+
+import lark
+
+from parser.io.script.grammar import _lark_version
+
+# cumulative import time of a module (in microseconds) that counts as too slow
+IMPORT_BUDGET_US = 150_000
+
+
+class TestImport(unittest.TestCase):
+    def _import_times(self, statement: str) -> dict[str, int]:
+        """
+        Run a statement in a fresh interpreter with "-X importtime", return
+        the cumulative import time of each module imported.
+        """
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", statement],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        times = {}
+        for line in result.stderr.splitlines():
+            match = re.match(r"import time:\s+\d+ \|\s+(\d+) \|\s+(.*)$", line)
+            if match:
+                times[match.group(2).strip()] = int(match.group(1))
+        return times
+
+    def test_import_budget(self):
+        for module in ("parser.io.script.loader", "parser.io.cod"):
+            with self.subTest(module):
+                times = self._import_times(f"import {module}")
+                self.assertLess(times[module], IMPORT_BUDGET_US)
+                # heavy dependencies are only imported once needed
+                self.assertNotIn("lark", times)
+                self.assertNotIn("numpy", times)
+
+        # creating a loader neither imports lark nor compiles the grammar
+        times = self._import_times(
+            "from parser.io.script.loader import HaeuserCodLoader\n"
+            "import sys\n"
+            "HaeuserCodLoader()\n"
+            "assert 'Resource' not in vars(sys.modules['parser.game.constants'])"
+        )
+        self.assertNotIn("lark", times)
+        # the grammar hash does not need lark either
+        self.assertEqual(_lark_version(), lark.__version__)
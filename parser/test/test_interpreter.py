@@ -0,0 +1,532 @@
+import pathlib
+import tempfile
+import unittest
+
+from lark import ParseError
+
+from parser.game.constants import CharacterType, Character, RADIUS_HQ
+from parser.io.script.events import (
+    BEGIN_OBJECT,
+    END_OBJECT,
+    NUMBERED_OBJECT,
+    SET_PROPERTY,
+    SET_VARIABLE,
+)
+from parser.io.script.include import INCLUDE_CACHE, CircularIncludeError
+from parser.io.script.layered import LayeredDict, materialize
+from parser.io.script.loader import (
+    CodGadLoader,
+    FigurenCodLoader,
+    HaeuserCodLoader,
+)
+from parser.io.script.profiling import (
+    DECODE,
+    INTERPRET,
+    LEX,
+    PARSE,
+    POST_PROCESS,
+    Profiler,
+)
+from parser.io.script.result_cache import ResultCache
+from parser.io.script.session import EditSession
+from parser.io.script.sharding import create_executor, split_script
+
+
+class TestScriptInterpreter(unittest.TestCase):
+    """
+    Interpreter tests which do not depend on the game files.
+    """
+
+    def test_deeply_nested_objects(self):
+        depth = 2000
+        script = "Objekt: A\n" * depth + "Gfx: 1\n" + "EndObj;\n" * depth
+
+        for backend in (CodGadLoader.BACKEND_LARK, CodGadLoader.BACKEND_SCANNER):
+            with self.subTest(backend=backend):
+                obj = CodGadLoader(backend=backend).parse_interpret(script)
+                for _ in range(depth):
+                    obj = obj["A"]
+                self.assertEqual(obj, {"Gfx": 1})
+
+    def test_single_pass_matches_two_pass(self):
+        haeuser = """
+IDBODEN = 20101
+GFXBODEN = 0
+@GFXBODEN = +8
+Version: 3
+
+Objekt: HAUS
+    @Nummer: 0
+    Id: IDBODEN+0
+    Gfx: GFXBODEN
+    Kind: BODEN
+    Size: 1, 1
+    ObjFill: 0,MAXHAUS
+
+    Nummer: 1
+    Id: IDBODEN+1
+    @Gfx: +4
+    Kind: HANDWERK
+    Objekt: HAUS_PRODLIST
+        Ware: WOLLE
+        Maxlager: 1, 2, -3
+    EndObj;
+
+    GFXBODEN = GFXBODEN+10
+    @Nummer: +1
+    Gfx: GFXBODEN
+    Posoffs: 0.5
+    @Posoffs: +2
+    ObjFill: 1
+EndObj;
+"""
+        figuren = """
+Objekt: FIGUR
+    Nummer: HANDEL1
+    Rotate: 1
+    Gfx: 5
+    Nummer: SOLDAT1
+    ObjFill: HANDEL1
+    Objekt: ANIM
+        Nummer: 0
+        AnimAnz: 8
+        @Nummer: +1
+        AnimAnz: 4
+    EndObj;
+EndObj;
+"""
+        for loader_cls, script in (
+            (HaeuserCodLoader, haeuser),
+            (FigurenCodLoader, figuren),
+        ):
+            with self.subTest(loader=loader_cls.__name__):
+                self.assertEqual(
+                    loader_cls(single_pass=True).parse_interpret(script),
+                    loader_cls().parse_interpret(script),
+                )
+
+    def test_error_positions(self):
+        scripts = (
+            "Objekt: HAUS\n    Nummer: 0\n    Gfx: UNDEFINED\nEndObj;\n",
+            "Objekt: HAUS\n    Nummer: 0\n    @Posoffs: +2\nEndObj;\n",
+            "Objekt: HAUS\n    Nummer: 0\n    Gfx: Size\nEndObj;\n",
+            'Include: "X.INC"\n',
+        )
+        for script in scripts:
+            messages = []
+            for backend in (CodGadLoader.BACKEND_LARK, CodGadLoader.BACKEND_SCANNER):
+                with self.assertRaises(ParseError) as cm:
+                    CodGadLoader(backend=backend).parse_interpret(script)
+                messages.append(str(cm.exception))
+            self.assertEqual(messages[0], messages[1])
+
+    def test_ambiguous_enum_identifier(self):
+        loader = FigurenCodLoader()
+        self.assertIn("UNUSED", loader.interpreter.symbols.ambiguous)
+
+        with self.assertWarns(UserWarning):
+            obj = loader.interpreter.visit(loader.parse("Kind: UNUSED\nFigur: SOLDAT1"))
+        # the first enum in the list takes precedence
+        self.assertIs(obj["Kind"], CharacterType.UNUSED)
+        self.assertIs(obj["Figur"], Character.SOLDAT1)
+        self.assertEqual(loader.interpreter.lookup_stats["enums"], 2)
+        self.assertEqual(loader.interpreter.lookup_stats["ambiguous"], 1)
+
+    def test_layered_fill_matches_copied_fill(self):
+        script = """
+Objekt: HAUS
+    Nummer: 0
+    Gfx: 10
+    Size: 2, 2
+    ObjFill: 0,MAXHAUS
+    Nummer: 1
+    @Gfx: +4
+    Nummer: 2
+    Kind: 3
+    ObjFill: 1
+EndObj;
+"""
+        obj = CodGadLoader().parse_interpret(script)
+        obj_layered = CodGadLoader(layered_fill=True).parse_interpret(script)
+        self.assertEqual(obj, obj_layered)
+        self.assertIsInstance(obj_layered["HAUS"][2], LayeredDict)
+        self.assertEqual(materialize(obj_layered), obj)
+
+        # writes must not leak into prototypes
+        obj_layered["HAUS"][1]["Size"] = (1, 1)
+        del obj_layered["HAUS"][2]["Gfx"]
+        self.assertEqual(obj_layered["HAUS"][0]["Size"], (2, 2))
+        self.assertEqual(obj_layered["HAUS"][1]["Gfx"], 14)
+        self.assertNotIn("Gfx", obj_layered["HAUS"][2])
+        self.assertEqual(list(obj_layered["HAUS"][2]), ["Size", "Kind"])
+        self.assertEqual(len(obj_layered["HAUS"][2]), 2)
+
+        # neither must writes to prototypes (or recalled objects) leak into
+        # the objects filled from them
+        obj_layered["HAUS"][0]["Size"] = (9, 9)
+        obj_layered["HAUS"][1]["Kind"] = 7
+        self.assertEqual(obj_layered["HAUS"][1]["Size"], (1, 1))
+        self.assertEqual(obj_layered["HAUS"][2]["Size"], (2, 2))
+        self.assertEqual(obj_layered["HAUS"][2]["Kind"], 3)
+
+    def test_layered_fill_fixed_rotations(self):
+        # ships have their rotations fixed after interpreting, which must not
+        # affect characters filled from them
+        script = """
+Objekt: FIGUR
+    Nummer: HANDEL1
+    Rotate: 1
+    Gfx: 5
+    Nummer: SOLDAT1
+    ObjFill: HANDEL1
+EndObj;
+"""
+        obj = FigurenCodLoader().parse_interpret(script)
+        obj_layered = FigurenCodLoader(layered_fill=True).parse_interpret(script)
+        self.assertEqual(obj_layered, obj)
+        self.assertEqual(obj_layered["FIGUR"][Character.HANDEL1]["Rotate"], 8)
+        self.assertEqual(obj_layered["FIGUR"][Character.SOLDAT1]["Rotate"], 1)
+
+    def test_include(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_dir = pathlib.Path(tmp_dir)
+            (tmp_dir / "COMMON.INC").write_text("BASE = 100\n")
+            script = 'Include: "common.inc"\nId: BASE+1\n'
+
+            INCLUDE_CACHE.clear()
+            for _ in range(2):
+                obj = CodGadLoader().parse_interpret(script, tmp_dir / "A.GAD")
+                self.assertEqual(obj, {"Id": 101})
+            self.assertEqual(INCLUDE_CACHE.stats["misses"], 1)
+            self.assertEqual(INCLUDE_CACHE.stats["hits"], 1)
+
+            # changes to the included file invalidate the cache
+            (tmp_dir / "COMMON.INC").write_text("BASE = 2000\n")
+            obj = CodGadLoader().parse_interpret(script, tmp_dir / "A.GAD")
+            self.assertEqual(obj, {"Id": 2001})
+
+            # circular includes are reported instead of recursing endlessly
+            (tmp_dir / "B.INC").write_text('Include: "C.INC"\n')
+            (tmp_dir / "C.INC").write_text('Include: "B.INC"\n')
+            for backend in (CodGadLoader.BACKEND_LARK, CodGadLoader.BACKEND_SCANNER):
+                with self.assertRaisesRegex(
+                    CircularIncludeError, "B.INC -> C.INC -> B.INC"
+                ):
+                    CodGadLoader(backend=backend).parse_interpret(
+                        'Include: "B.INC"\n', tmp_dir / "A.GAD"
+                    )
+
+    def test_result_cache(self):
+        script = "A = 1\nId: A+1\n"
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = ResultCache(cache_dir=pathlib.Path(tmp_dir))
+            obj = CodGadLoader(result_cache=cache).parse_interpret(script)
+            obj_cached = CodGadLoader(result_cache=cache).parse_interpret(script)
+            self.assertEqual(obj, obj_cached)
+            self.assertIsNot(obj, obj_cached)
+
+            # a new cache in the same directory finds the persisted result
+            cache_reopened = ResultCache(cache_dir=pathlib.Path(tmp_dir))
+            obj_persisted = CodGadLoader(result_cache=cache_reopened).parse_interpret(
+                script
+            )
+            self.assertEqual(obj, obj_persisted)
+            self.assertEqual(cache.stats["memory_hits"], 1)
+            self.assertEqual(cache_reopened.stats["disk_hits"], 1)
+
+            # corrupt entries are misses, and are replaced
+            for path in pathlib.Path(tmp_dir).iterdir():
+                path.write_bytes(path.read_bytes()[:10])
+            cache_corrupt = ResultCache(cache_dir=pathlib.Path(tmp_dir))
+            loader = CodGadLoader(result_cache=cache_corrupt)
+            self.assertEqual(loader.parse_interpret(script), obj)
+            self.assertEqual(cache_corrupt.stats["misses"], 1)
+            self.assertEqual(
+                ResultCache(cache_dir=pathlib.Path(tmp_dir)).get(
+                    next(pathlib.Path(tmp_dir).iterdir()).name
+                ),
+                obj,
+            )
+
+    def test_compiled_program(self):
+        script = """
+Objekt: HAUS
+    Nummer: 0
+    Radius: RADIUS_HQ+2
+    Size: 2, -1
+    Rohstoff: HOLZ
+EndObj;
+"""
+        loader = HaeuserCodLoader()
+        program = loader.compile(script)
+        self.assertEqual(loader.run(program), loader.parse_interpret(script))
+
+        for radius in range(3):
+            obj = loader.run(program, {RADIUS_HQ: radius})
+            self.assertEqual(obj["HAUS"][0]["Radius"], radius + 2)
+            self.assertEqual(obj["HAUS"][0]["Size"], (2, -1))
+
+    def test_emit_round_trip(self):
+        script = """
+Objekt: HAUS
+    Nummer: 0
+    Gfx: 10
+    Size: 2, 2
+    Kind: BERGWERK
+    ObjFill: 0,MAXHAUS
+    Nummer: 1
+    @Gfx: +4
+    Objekt: HAUS_PRODLIST
+        Ware: HOLZ
+        Faktor: -0.5
+    EndObj;
+    Nummer: 2
+    Kind: 3
+    Kind: 4
+EndObj;
+"""
+        for backend in (CodGadLoader.BACKEND_LARK, CodGadLoader.BACKEND_SCANNER):
+            with self.subTest(backend=backend):
+                loader = HaeuserCodLoader(backend=backend)
+                obj = loader.parse_interpret(script)
+                emitted = loader.emit(obj)
+                self.assertIn("ObjFill", emitted)
+                self.assertEqual(loader.parse_interpret(emitted), obj)
+
+        # ObjFill cannot fill from negative numbers
+        loader = HaeuserCodLoader()
+        obj = {"HAUS": {-1: {"Gfx": 1, "Kind": 2}, 0: {"Gfx": 1, "Kind": 3}}}
+        emitted = loader.emit(obj)
+        self.assertNotIn("ObjFill", emitted)
+        self.assertEqual(loader.parse_interpret(emitted), obj)
+
+        # deep nesting is not limited by the recursion limit
+        depth = 2000
+        obj = {"Gfx": 1}
+        for _ in range(depth):
+            obj = {"A": obj}
+        obj = loader.parse_interpret(loader.emit(obj))
+        for _ in range(depth):
+            obj = obj["A"]
+        self.assertEqual(obj, {"Gfx": 1})
+
+    def test_sharded_parsing(self):
+        script = """
+BASE = 100
+Objekt: HAUS
+    Nummer: 0
+    Id: BASE
+    Gfx: 10
+    ObjFill: 0,MAXHAUS
+    @Nummer: +1
+    @BASE = +1
+    Id: BASE
+    Nummer: 5
+    Objekt: HAUS_PRODLIST
+        Ware: HOLZ
+    EndObj;
+    GFX = 20
+    @Nummer: +1
+    Gfx: GFX
+EndObj;
+Objekt: BAUINFRA
+    Nummer: 0
+    Minwohn: BASE+GFX
+EndObj;
+Version: 3
+"""
+        expected = HaeuserCodLoader().parse_interpret(script)
+        with create_executor(max_workers=2) as executor:
+            for num_shards in range(1, 6):
+                with self.subTest(num_shards=num_shards):
+                    loader = HaeuserCodLoader(executor=executor, num_shards=num_shards)
+                    self.assertEqual(loader.parse_interpret(script), expected)
+        self.assertEqual(len(split_script(script, 4)), 4)
+
+    def test_edit_session(self):
+        script = """
+BASE = 100
+Objekt: HAUS
+    Nummer: 0
+    Id: BASE
+    Gfx: 10
+    ObjFill: 0,MAXHAUS
+    @Nummer: +1
+    @Gfx: +4
+    Nummer: 2
+    Id: BASE+2
+EndObj;
+Objekt: BAUINFRA
+    Nummer: 0
+    Minwohn: 50
+EndObj;
+"""
+        session = EditSession(HaeuserCodLoader(), script)
+        result = session.result
+        bauinfra = result["BAUINFRA"]
+        self.assertEqual(result, HaeuserCodLoader().parse_interpret(script))
+
+        # only the edited block and those reading the changed variable
+        # are interpreted again
+        for old, new in (("BASE = 100", "BASE = 200"), ("Gfx: 10", "Gfx: 20")):
+            script = script.replace(old, new)
+            self.assertIs(session.update(script), result)
+            self.assertEqual(result, HaeuserCodLoader().parse_interpret(script))
+            self.assertEqual(session.stats["parsed"], 1)
+            self.assertIs(result["BAUINFRA"], bauinfra)
+        self.assertEqual(result["HAUS"][1]["Gfx"], 24)
+        self.assertEqual(result["HAUS"][2]["Id"], 202)
+
+        # errors refer to positions in the whole script
+        with self.assertRaisesRegex(ParseError, "line 11, col"):
+            session.update(script.replace("BASE+2", "UNDEFINED"))
+        self.assertEqual(result["HAUS"][2]["Id"], 202)
+
+        # references to the number do not start numbered objects
+        script = "Objekt: A\n    Nummer: 1\n    Id: Nummer\n    Nummer: 2\n    Gfx: 3\nEndObj;\n"
+        session = EditSession(CodGadLoader(), script)
+        self.assertEqual(session.result, {"A": {1: {"Id": 1}, 2: {"Gfx": 3}}})
+        script = script.replace("Gfx: 3", "Gfx: 4")
+        self.assertEqual(session.update(script), CodGadLoader().parse_interpret(script))
+
+    def test_select(self):
+        script = """
+BASE = 100
+Objekt: HAUS
+    Nummer: 0
+    Gfx: 10
+    GFX = Gfx
+    @BASE = +1
+    Id: BASE
+EndObj;
+Objekt: FIGUR
+    Nummer: 0
+    @BASE = +5
+    Id: BASE
+EndObj;
+Version: 3
+Objekt: BAUINFRA
+    Nummer: 0
+    Minwohn: BASE+GFX
+EndObj;
+"""
+        expected = HaeuserCodLoader().parse_interpret(script)
+        result = HaeuserCodLoader().parse_interpret(script, select=["BAUINFRA"])
+        self.assertEqual(list(result), ["Version", "BAUINFRA"])
+        self.assertFalse(result.is_interpreted("BAUINFRA"))
+        self.assertEqual(result["BAUINFRA"], expected["BAUINFRA"])
+        self.assertTrue(result.is_interpreted("BAUINFRA"))
+
+        result = HaeuserCodLoader().parse_interpret(script, select=["HAUS", "FIGUR"])
+        self.assertEqual(
+            dict(result), {k: expected[k] for k in ("HAUS", "FIGUR", "Version")}
+        )
+
+        # errors refer to positions in the whole script
+        result = CodGadLoader().parse_interpret(
+            script.replace("BASE+GFX", "UNDEFINED"), select=["BAUINFRA"]
+        )
+        with self.assertRaisesRegex(ParseError, "line 18, col"):
+            result["BAUINFRA"]
+
+    def test_iter_events(self):
+        script = """
+BASE = 10
+Objekt: FIGUR
+    Nummer: GAUKLER1
+    Gfx: BASE
+    Rotate: 8
+    ObjFill: 0,MAXFIGUR
+    Objekt: ANIM
+        Nummer: 0
+        AnimAnz: 8
+    EndObj;
+    @Nummer: +1
+    @Gfx: +4
+EndObj;
+"""
+        loader = FigurenCodLoader()
+        events = [e for e in loader.iter_events(script) if e.kind != SET_PROPERTY]
+        self.assertEqual(
+            [(e.kind, e.name) for e in events],
+            [
+                (SET_VARIABLE, "BASE"),
+                (BEGIN_OBJECT, "FIGUR"),
+                (BEGIN_OBJECT, "ANIM"),
+                (NUMBERED_OBJECT, "ANIM"),
+                (END_OBJECT, "ANIM"),
+                (NUMBERED_OBJECT, "FIGUR"),
+                (NUMBERED_OBJECT, "FIGUR"),
+                (END_OBJECT, "FIGUR"),
+            ],
+        )
+        anim = events[3]
+        self.assertEqual(anim.path, (("FIGUR", Character.GAUKLER1),))
+        self.assertEqual(anim.value, {"AnimAnz": 8})
+
+        # numbered objects are filled and post-processed once complete
+        figur = events[-2]
+        self.assertEqual(figur.number, Character.GAUKLER1 + 1)
+        self.assertEqual(figur.value["Gfx"], 14)
+        self.assertEqual(figur.value["ANIM"], {0: {"AnimAnz": 8}})
+        self.assertEqual(events[-3].value["Rotate"], 4)
+        self.assertEqual(events[-1].value, loader.parse_interpret(script)["FIGUR"])
+
+    def test_profiler(self):
+        script = """
+Objekt: FIGUR
+    Nummer: GAUKLER1
+    Gfx: 10
+    Rotate: 8
+    @Nummer: +1
+    @Gfx: +4
+EndObj;
+"""
+        sunk = []
+        profiler = Profiler(trace_allocations=True, sink=sunk.append)
+        loader = FigurenCodLoader(profiler=profiler)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = pathlib.Path(tmp_dir) / "figuren.gad"
+            path.write_text(script, encoding="cp1252")
+            self.assertEqual(loader.load(path), FigurenCodLoader().load(path))
+            loader.parse_interpret(script)
+
+        # loading a file is one load, including parse_interpret
+        self.assertEqual(len(sunk), 2)
+        first, second = sunk
+        self.assertEqual(first.path, path)
+        self.assertEqual(
+            list(first.phases), [DECODE, LEX, PARSE, INTERPRET, POST_PROCESS]
+        )
+        self.assertNotIn(DECODE, second.phases)
+        self.assertGreater(first.phases[PARSE].peak_bytes, 0)
+        self.assertEqual(first.rules["numbered_object"].calls, 2)
+        self.assertEqual(profiler.total.rules["numbered_object"].calls, 4)
+        self.assertEqual(profiler.total.phases[PARSE].calls, 2)
+
+        # phases belong to a load
+        with self.assertRaises(RuntimeError):
+            with profiler.phase(PARSE):
+                pass
+        with self.assertRaises(RuntimeError):
+            profiler.parse(loader.lark, script)
+
+    def test_profiler_lark_internals(self):
+        # Profiler.parse relies on internals of the pinned lark version,
+        # fail loudly rather than record nonsense if they change
+        from lark.lexer import LexerThread
+
+        loader = CodGadLoader()
+        frontend = loader.lark.parser
+        self.assertTrue(callable(getattr(frontend.lexer, "lex", None)))
+        self.assertTrue(callable(getattr(frontend.parser, "parse", None)))
+        self.assertTrue(callable(getattr(LexerThread, "from_text", None)))
+        self.assertEqual(len(loader.lark.options.start), 1)
+
+        script = "Objekt: HAUS\n    Nummer: 0\n    Id: 1\nEndObj;\n"
+        profiler = Profiler()
+        with profiler.load():
+            tree = profiler.parse(loader.lark, script)
+        self.assertEqual(tree, loader.lark.parse(script))
+        self.assertEqual(profiler.last.phases[LEX].calls, 1)
+        self.assertGreater(profiler.last.phases[LEX].seconds, 0)
@@ -0,0 +1,90 @@
+import unittest
+
+from parser.game.constants import BuildingKind, Character, Resource
+from parser.io.query import ScriptQuery
+from parser.io.script.loader import FigurenCodLoader, HaeuserCodLoader
+
+
+class TestQuery(unittest.TestCase):
+    def setUp(self):
+        script = """
+Objekt: HAUS
+    Nummer: 0
+    Kind: BODEN
+    Gfx: 0
+    AnimAnz: 4
+    Nummer: 1
+    Kind: HANDWERK
+    Gfx: 4
+    AnimAnz: 8
+    Objekt: HAUS_PRODLIST
+        Ware: WOLLE
+        Figurnr: TRAEGER
+    EndObj;
+    Objekt: HAUS_PRODLIST
+        Ware: STOFFE
+        Figurnr: SOLDAT1
+    EndObj;
+    Nummer: 2
+    Kind: BODEN
+    Gfx: 12
+    AnimAnz: 1
+EndObj;
+"""
+        haeuser = HaeuserCodLoader().parse_interpret(script)
+        figuren = {
+            "FIGUR": {Character.TRAEGER: {"Gfx": 100}, Character.SOLDAT1: {"Gfx": 200}}
+        }
+        self.query = ScriptQuery(haeuser, figuren)
+
+    def test_indexes(self):
+        haus = self.query["HAUS"]
+        self.assertEqual(haus.where("Kind", BuildingKind.BODEN), [0, 2])
+        self.assertEqual(haus.where("HAUS_PRODLIST.Ware", Resource.STOFFE), [1])
+        # enum members are not confused with their values
+        self.assertEqual(haus.where("Gfx", BuildingKind(4)), [])
+        self.assertEqual(haus.where("Gfx", 4), [1])
+        self.assertEqual(haus.between("Gfx", 4, 13), [1, 2])
+        self.assertEqual(haus.containing("Gfx", "AnimAnz", 11), [1])
+        self.assertEqual(haus.containing("Gfx", "AnimAnz", 13), [])
+
+    def test_join(self):
+        self.assertEqual(
+            self.query.join("HAUS", "HAUS_PRODLIST.Figurnr", "FIGUR"),
+            [(1, Character.TRAEGER), (1, Character.SOLDAT1)],
+        )
+        self.assertEqual(self.query.join("FIGUR", "Gfx", "HAUS", "Gfx"), [])
+
+    def test_join_relative_numbers(self):
+        haeuser = HaeuserCodLoader().parse_interpret("""
+Objekt: HAUS
+    Nummer: 0
+    Objekt: HAUS_PRODLIST
+        Ware: EISENERZ
+        Figurnr: SOLDAT2
+    EndObj;
+    Nummer: 1
+    Objekt: HAUS_PRODLIST
+        Ware: STOFFE
+        Figurnr: SOLDAT1
+    EndObj;
+EndObj;
+""")
+        # the second FIGUR is numbered by a plain integer
+        figuren = FigurenCodLoader().parse_interpret("""
+Objekt: FIGUR
+    Nummer: SOLDAT1
+    Gfx: 10
+    @Nummer: +1
+    @Gfx: +4
+EndObj;
+""")
+        self.assertIs(type(list(figuren["FIGUR"])[1]), int)
+        query = ScriptQuery(haeuser, figuren)
+        self.assertEqual(
+            query.join("HAUS", "HAUS_PRODLIST.Figurnr", "FIGUR"),
+            [(0, Character.SOLDAT2), (1, Character.SOLDAT1)],
+        )
+        # plain integers match by value only (EISENERZ is 3, like SOLDAT2),
+        # while members of other enums never match (ALLWARE and SOLDAT1 are 2)
+        self.assertEqual(query.join("HAUS", "HAUS_PRODLIST.Ware", "FIGUR"), [(0, 3)])
@@ -44,6 +44,30 @@ class TestScriptParsing(BaseTestCase):
 
         print("\n" + FIGUREN_COD + ":\n\n" + pformat(obj)[:500] + "...")
 
+    def test_single_pass_matches_two_pass(self):
+        for loader_cls, filename in (
+            (HaeuserCodLoader, HAEUSER_COD),
+            (FigurenCodLoader, FIGUREN_COD),
+        ):
+            with self.subTest("COD file", filename=filename):
+                script = read_cod(self._1602_KE_ROOT / filename)
+                obj_two_pass = loader_cls().parse_interpret(script)
+                obj_single_pass = loader_cls(single_pass=True).parse_interpret(script)
+                self.assertEqual(obj_two_pass, obj_single_pass)
+
+    def test_scanner_backend_matches_lark_backend(self):
+        for loader_cls, filename in (
+            (HaeuserCodLoader, HAEUSER_COD),
+            (FigurenCodLoader, FIGUREN_COD),
+        ):
+            with self.subTest("COD file", filename=filename):
+                script = read_cod(self._1602_KE_ROOT / filename)
+                obj_lark = loader_cls().parse_interpret(script)
+                obj_scanner = loader_cls(
+                    backend=CodGadLoader.BACKEND_SCANNER
+                ).parse_interpret(script)
+                self.assertEqual(obj_lark, obj_scanner)
+
     def test_parse_gad_scripts(self):
         for subdir in ("Gaddata", "Gadedit"):
             for path in (self._1602_KE_ROOT / subdir).iterdir():
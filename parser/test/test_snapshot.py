@@ -0,0 +1,132 @@
+import enum
+import pathlib
+import tempfile
+import unittest
+
+from parser.game.constants import BuildingKind, Resource
+from parser.io.script.loader import HaeuserCodLoader
+from parser.io.snapshot import (
+    Snapshot,
+    SnapshotError,
+    materialize_snapshot,
+    write_snapshot,
+)
+
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.path = pathlib.Path(tmp_dir.name) / "haeuser.snap"
+
+    def test_round_trip(self):
+        script = """
+Objekt: HAUS
+    Nummer: 0
+    Kind: BODEN
+    Pos: 1, 2
+    Nummer: 1
+    Kind: BERGWERK
+    Pos: 3, 4
+    Objekt: HAUS_PRODLIST
+        Ware: EISENERZ
+        Rohmenge: 1.5
+    EndObj;
+EndObj;
+"""
+        obj = HaeuserCodLoader().parse_interpret(script)
+        write_snapshot(self.path, obj)
+
+        with Snapshot(self.path) as snapshot:
+            self.assertEqual(snapshot, obj)
+            haus = snapshot["HAUS"][1]
+            self.assertIs(haus["Kind"], BuildingKind.BERGWERK)
+            self.assertIs(haus["HAUS_PRODLIST"]["Ware"], Resource.EISENERZ)
+            self.assertEqual(haus["Pos"], (3, 4))
+            with self.assertRaises(TypeError):
+                haus["Kind"] = BuildingKind.BODEN
+            self.assertEqual(materialize_snapshot(snapshot), obj)
+
+    def test_values(self):
+        Kind = enum.IntEnum("Kind", ["A", "B"])
+        obj = {
+            "OBJ": {Kind.B: {"x": [None, True, -(2**40)], "y": ("ä", 0.25)}},
+            "empty": {},
+        }
+        write_snapshot(self.path, obj)
+
+        with Snapshot(self.path) as snapshot:
+            self.assertEqual(materialize_snapshot(snapshot), obj)
+            # the enum cannot be imported, so an equivalent one is created
+            (key,) = snapshot["OBJ"]
+            self.assertEqual(key.name, "B")
+            self.assertEqual(type(key).__module__, Kind.__module__)
+            self.assertEqual(repr(key), repr(Kind.B))
+            self.assertEqual(snapshot["OBJ"][2]["y"], ("ä", 0.25))
+
+    def test_families(self):
+        # numbered objects with differing properties, stored as records
+        obj = {
+            "HAUS": {
+                0: {"Id": 1, "Pos": (1, 2)},
+                1: {"Kind": BuildingKind.BODEN, "Id": 2},
+                BuildingKind.HANDWERK: {},
+            },
+            "MIXED": {0: {"Id": 1}, 1: 5},
+        }
+        write_snapshot(self.path, obj)
+
+        with Snapshot(self.path) as snapshot:
+            self.assertEqual(snapshot, obj)
+            haus = snapshot["HAUS"]
+            self.assertEqual(list(haus), [0, 1, BuildingKind.HANDWERK])
+            self.assertIs(list(haus)[2], BuildingKind.HANDWERK)
+            self.assertNotIn(2, haus)
+            # properties iterate in the order of the columns of the family
+            self.assertEqual(list(haus[1]), ["Id", "Kind"])
+            self.assertEqual(len(haus[1]), 2)
+            self.assertIs(haus[1]["Kind"], BuildingKind.BODEN)
+            self.assertNotIn("Pos", haus[1])
+            self.assertNotIn("Size", haus[1])
+            self.assertEqual(haus[BuildingKind.HANDWERK], {})
+            self.assertEqual(snapshot["MIXED"][1], 5)
+            self.assertEqual(materialize_snapshot(snapshot), obj)
+
+    def test_lookup(self):
+        # keys with colliding hashes, and keys hashed alike
+        obj = {
+            "HAUS": {i: {"Id": i} for i in range(100)},
+            "keys": {1: "a", 2**32 + 1: "b", (1, "x"): "c", ("y",): "d", "1": "e"},
+        }
+        write_snapshot(self.path, obj)
+
+        with Snapshot(self.path) as snapshot:
+            haus = snapshot["HAUS"]
+            for i in range(100):
+                self.assertEqual(haus[i], {"Id": i})
+            self.assertNotIn(100, haus)
+            self.assertNotIn("0", haus)
+            self.assertEqual(list(haus), list(range(100)))
+            keys = snapshot["keys"]
+            for key, value in obj["keys"].items():
+                self.assertEqual(keys[key], value)
+            self.assertEqual(keys[1.0], "a")
+            self.assertNotIn(2, keys)
+            self.assertNotIn((1,), keys)
+            self.assertNotIn([1], keys)
+
+    def test_not_a_snapshot(self):
+        self.path.write_bytes(b"Objekt: HAUS")
+        with self.assertRaises(SnapshotError):
+            Snapshot(self.path)
+        self.path.write_bytes(b"")
+        with self.assertRaises(SnapshotError):
+            Snapshot(self.path)
+
+    def test_truncated(self):
+        write_snapshot(self.path, {"OBJ": {"x": "abc", "k": Resource.EISENERZ}})
+        data = self.path.read_bytes()
+        for size in (20, 40, len(data) - 20, len(data) - 1):
+            self.path.write_bytes(data[:size])
+            with self.assertRaises(SnapshotError):
+                Snapshot(self.path)